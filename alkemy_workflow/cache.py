@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+__all__ = ["JsonCache"]
+
+AW_NO_CACHE = "AW_NO_CACHE"
+
+
+def get_cache_path():
+    "Get the cache directory path"
+    return Path.home() / ".alkemy_workflow" / "cache"
+
+
+class JsonCache:
+    """
+    Persistent key/value cache stored in a JSON file (~/.alkemy_workflow/cache/<name>.json).
+    Entries older than ttl seconds are ignored (ttl None: no expiration).
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, name, ttl=None, path=None):
+        self.path = (path or get_cache_path()) / f"{name}.json"
+        self.ttl = ttl
+        self.data = None
+        self.enabled = not os.environ.get(AW_NO_CACHE)
+        self.lock = threading.RLock()
+
+    def load(self):
+        "Load the cache file"
+        with self.lock:
+            if self.data is None:
+                data = {}
+                if self.enabled:
+                    try:
+                        with self.path.open("r") as f:
+                            data = json.load(f)
+                    except (OSError, ValueError):
+                        pass
+                self.data = data
+            return self.data
+
+    def get(self, key, default=None, ttl=None):
+        "Get an entry value (default if missing or expired)"
+        entry = self.load().get(key)
+        ttl = ttl if ttl is not None else self.ttl
+        if entry is None or (ttl is not None and time.time() - entry["ts"] > ttl):
+            return default
+        return entry["value"]
+
+    def get_age(self, key):
+        "Get an entry age in seconds (None if missing)"
+        entry = self.load().get(key)
+        return None if entry is None else time.time() - entry["ts"]
+
+    def set(self, key, value):
+        "Set an entry value"
+        with self.lock:
+            self.load()[key] = {"ts": time.time(), "value": value}
+
+    def delete(self, key):
+        "Delete an entry"
+        with self.lock:
+            self.load().pop(key, None)
+
+    def clear(self):
+        "Delete all the entries"
+        with self.lock:
+            self.data = {}
+
+    def save(self):
+        "Write the cache file (atomically)"
+        if not self.enabled or self.data is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+            with os.fdopen(fd, "w") as f, self.lock:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # the cache is best effort
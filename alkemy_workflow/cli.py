@@ -2,28 +2,62 @@
 
 import os
 import sys
+import time
 import traceback
 from pathlib import Path
 import click
 import pzp
 from .exceptions import (
     ClickUpException,
+    ExportException,
     GenericWarning,
     GenericException,
 )
 from click.exceptions import MissingParameter
 from .config import Config, CLICKUP, PLANNER, AW_SKIP_AUTH
 from .utils import Workflow, VERSION
+from .query import QueryEngine, NavigationCache, LEVELS, lookahead
+from .export import Exporter, SqliteSink, JsonlSink, EXPORT_FORMATS, SQLITE
+from .profiling import profiler
+from .transport import set_transport, RECORD, REPLAY
+from .output import RecordWriter, BufferedWriter, parse_fields, OUTPUT_FORMATS, TEXT
 
 EXIT_SUCCESS = 0
 EXIT_FAILURE = 1
 EXIT_PARSER_ERROR = 2
+# Picker item type => navigation level
+PICKER_LEVELS = {"Space": "space", "Folder": "folder", "List": "list", "Task": "task"}
+# Picker item types prefetched in the background (a task costs several requests, they are opened on demand)
+PICKER_PREFETCH = ("Space", "Folder", "List")
 
 __all__ = ["main"]
 
 
-def pairwise(iterable):
-    return zip(iterable, iterable[1:] + [None])
+def output_options(fn):
+    "Add the --output and --fields options to a command"
+    fn = click.option("--fields", help="Comma separated list of fields, e.g. id,name,status.status (jsonl/csv/tsv output)")(fn)
+    fn = click.option("--output", help="Output format", type=click.Choice(OUTPUT_FORMATS), default=TEXT, show_default=True)(fn)
+    return fn
+
+
+def write_records(items, output, fields, default_fields, headers=True):
+    "Write the items as jsonl/csv/tsv records, return the number of records"
+    with BufferedWriter() as stream:
+        writer = RecordWriter(output, parse_fields(fields), default_fields, headers, stream)
+        return writer.write_all(items)
+
+
+def write_table(items, fmt, header, headers=True, separator=70):
+    "Write the items as text rows, return the number of rows"
+    count = 0
+    with BufferedWriter() as stream:
+        if headers:
+            stream.write(fmt.format(**header) + "\n")
+            stream.write("-" * separator + "\n")
+        for item in items:
+            stream.write(fmt.format(**item) + "\n")
+            count = count + 1
+    return count
 
 
 def prepare_tree(items, enabled=True):
@@ -33,7 +67,7 @@ def prepare_tree(items, enabled=True):
             yield item
     else:
         level = 0
-        for item, next_item in pairwise(items):
+        for item, next_item in lookahead(items):
             is_last = (next_item is None) or (item["type"] != next_item["type"])
             if level == 0:
                 graph = ""
@@ -47,49 +81,60 @@ def prepare_tree(items, enabled=True):
             yield item
 
 
+def prepare_walk_tree(rows):
+    "Set the tree column of the (item, level, is_last) rows of a recursive listing"
+    for item, level, is_last in rows:
+        graph = "" if level == 0 else ("└─ " if is_last else "├─ ")
+        item["tree"] = f"{' ' * level}{graph}{item.id}"
+        yield item
+
+
+def write_profile(trace_path=None):
+    "Print the profile summary (stderr), write the trace"
+    profiler.disable()
+    for line in profiler.format_summary():
+        click.echo(line, err=True)
+    if trace_path:
+        profiler.write_trace(trace_path)
+
+
+def get_navigation(item):
+    "Picker navigation key (space, folder, list, task) to open an item"
+    key = dict((level, (item.get(level) or {}).get("id")) for level in LEVELS)
+    level = PICKER_LEVELS.get(item["type"])
+    if level:
+        key[level] = item["id"]
+    return tuple(key[level] for level in LEVELS)
+
+
 def pick_task(wf, space=None, folder=None, lst=None, task=None):
     "Select a task"
-    result = wf.client.query(
-        space=space,
-        folder=folder,
-        lst=lst,
-        task=task,
-        hierarchy=True,
-    )
     fmt = "{tree:45} {label:15} {name:40}"
     header_str = fmt.format(label="Kind/Status", tree="Id", name="Title")
+    key = (space, folder, lst, task)
     last_item = None
-    while True:
-        items = prepare_tree(result, enabled=True)
-        item = pzp.pzp(
-            items,
-            format_fn=lambda item: fmt.format(**item),
-            header_str=header_str,
-            layout="reverse-list",
-        )
-        if item is None:
-            return None
-        elif item["type"] == "Space":
-            item["space"] = {"id": item["id"]}
-        elif item["type"] == "Folder":
-            item["folder"] = {"id": item["id"]}
-        elif item["type"] == "List":
-            item["list"] = {"id": item["id"]}
-        elif item["type"] == "Task":
-            if last_item == item or not item.has_subtasks():
+    with NavigationCache(wf.client) as navigation:
+        while True:
+            result = navigation.get(key)
+            # Prefetch the levels that can be opened while the user picks
+            navigation.prefetch(get_navigation(x) for x in result if x["type"] in PICKER_PREFETCH)
+            items = prepare_tree(result, enabled=True)
+            item = pzp.pzp(
+                items,
+                format_fn=lambda item: fmt.format(**item),
+                header_str=header_str,
+                layout="reverse-list",
+            )
+            if item is None:
+                return None
+            elif item["type"] == "Subtask":
                 return item.id
-            else:
-                item["task"] = {"id": item["id"]}
-        elif item["type"] == "Subtask":
-            return item.id
-        result = wf.client.query(
-            space=item.get("space", {}).get("id"),
-            folder=item.get("folder", {}).get("id"),
-            lst=item.get("list", {}).get("id"),
-            task=item.get("task", {}).get("id"),
-            hierarchy=True,
-        )
-        last_item = item
+            elif item["type"] == "Task":
+                children = navigation.get(get_navigation(item))
+                if last_item == item or not any(x["type"] == "Subtask" for x in children):
+                    return item.id
+            key = get_navigation(item)
+            last_item = item
 
 
 def get_current_task(wf):
@@ -101,6 +146,21 @@ def get_current_task(wf):
     return wf.client.get_task_by_id(task_id)
 
 
+def get_pull_request_states(wf):
+    "Get the pull request state (open, closed, merged) of each branch of the origin repository"
+    repo = wf.git.get_github_url(None)
+    if not repo or not wf.config.default_github_token:
+        return {}
+    try:
+        pull_requests = wf.github.list_pull_request(repo, state="all")
+    except GenericException:
+        return {}
+    result = {}
+    for pr in pull_requests:
+        result.setdefault(pr["head"]["ref"], "merged" if pr.get("merged_at") else pr["state"])
+    return result
+
+
 def check_task_status(task, status):
     statuses = task.get_list().get_statuses()
     if status in statuses:
@@ -134,51 +194,86 @@ def check_task_status(task, status):
     default=False,
     is_flag=True,
 )
-def cli(ctx, cwd, credentials_path, verbose):
+@click.option(
+    "--profile",
+    help="Print the time spent in HTTP requests and git subprocesses",
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--profile-trace",
+    help="Write the profile as a Chrome trace JSON file (implies --profile)",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@click.option(
+    "--record",
+    help="Record the ClickUp/GitHub requests in a cassette directory",
+    type=click.Path(file_okay=False, dir_okay=True),
+)
+@click.option(
+    "--replay",
+    help="Replay the ClickUp/GitHub requests from a cassette directory (no network)",
+    type=click.Path(exists=True, file_okay=False, dir_okay=True),
+)
+@click.option(
+    "--replay-speed",
+    help="Recorded latency multiplier (0: no latency)",
+    type=click.FloatRange(min=0),
+)
+def cli(ctx, cwd, credentials_path, verbose, profile, profile_trace, record, replay, replay_speed):
     if verbose:
         Config.set_verbose()
+    if record and replay:
+        raise click.UsageError("--record and --replay are mutually exclusive")
+    elif record:
+        set_transport(RECORD, record)
+    elif replay:
+        set_transport(REPLAY, replay, replay_speed)
+    if profile or profile_trace:
+        profiler.enable()
+        ctx.call_on_close(lambda: write_profile(profile_trace))
     ctx.obj = Workflow(cwd, credentials_path)
 
 
 @cli.command("spaces")
 @click.option("--filter", help="Filter spaces by name")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
+@output_options
 @click.pass_context
-def cmd_spaces(ctx, filter, headers):
+def cmd_spaces(ctx, filter, headers, output, fields):
     """
     List spaces
 
     Example: aw spaces --filter 'test*' --noheaders
     """
     wf = ctx.obj
-    result = wf.client.query(filter_type="Space", filter_name=filter)
+    result = QueryEngine(wf.client).iterate(filter_type="Space", filter_name=filter)
+    if output != TEXT:
+        write_records(result, output, fields, ["id", "name"], headers)
+        return
     fmt = "{id:40.40} {name:40}"
-    if headers:
-        print(fmt.format(id="Id", name="Space"))
-        print("-" * 70)
-    for item in result:
-        print(fmt.format(**item))
+    write_table(result, fmt, dict(id="Id", name="Space"), headers)
 
 
 @cli.command("folders")
 @click.option("--space", help="Space name", required=True)
 @click.option("--filter", help="Filter folders by name")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
+@output_options
 @click.pass_context
-def cmd_folders(ctx, space, filter, headers):
+def cmd_folders(ctx, space, filter, headers, output, fields):
     """
     List folders from a space
 
     Example: aw folders --space 'test' --filter 'abc*' --noheaders
     """
     wf = ctx.obj
-    result = wf.client.query(space=space, filter_type="Folder", filter_name=filter)
+    result = QueryEngine(wf.client).iterate(space=space, filter_type="Folder", filter_name=filter)
+    if output != TEXT:
+        write_records(result, output, fields, ["id", "name"], headers)
+        return
     fmt = "{id:40.40} {name:40}"
-    if headers:
-        print(fmt.format(id="Id", name="Folders"))
-        print("-" * 70)
-    for item in result:
-        print(fmt.format(**item))
+    write_table(result, fmt, dict(id="Id", name="Folders"), headers)
 
 
 @cli.command("lists")
@@ -186,8 +281,9 @@ def cmd_folders(ctx, space, filter, headers):
 @click.option("--folder", help="Folder name")
 @click.option("--filter", help="Filter lists by name")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
+@output_options
 @click.pass_context
-def cmd_lists(ctx, space, folder, filter, headers):
+def cmd_lists(ctx, space, folder, filter, headers, output, fields):
     """
     List lists from a space or folder
 
@@ -196,18 +292,17 @@ def cmd_lists(ctx, space, folder, filter, headers):
     wf = ctx.obj
     if not space and not folder:
         raise click.ClickException("Missing option '--space' or '--folder'")
-    result = wf.client.query(
+    result = QueryEngine(wf.client).iterate(
         space=space,
         folder=folder,
         filter_type="List",
         filter_name=filter,
     )
+    if output != TEXT:
+        write_records(result, output, fields, ["id", "name"], headers)
+        return
     fmt = "{id:40.40} {name:40}"
-    if headers:
-        print(fmt.format(id="Id", name="Lists"))
-        print("-" * 70)
-    for item in result:
-        print(fmt.format(**item))
+    write_table(result, fmt, dict(id="Id", name="Lists"), headers)
 
 
 @cli.command("tasks")
@@ -217,21 +312,21 @@ def cmd_lists(ctx, space, folder, filter, headers):
 @click.option("--task", help="Task id")
 @click.option("--filter", help="Filter tasks by name")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
+@output_options
 @click.pass_context
-def cmd_tasks(ctx, space, folder, list, task, filter, headers):
+def cmd_tasks(ctx, space, folder, list, task, filter, headers, output, fields):
     """
     List tasks from a list or subtask
     """
     wf = ctx.obj
     if not list and not task:
         raise click.ClickException("Missing option '--list' or '--task'")
-    result = wf.client.query(space=space, folder=folder, lst=list, task=task, filter_name=filter)
+    result = QueryEngine(wf.client).iterate(space=space, folder=folder, lst=list, task=task, filter_name=filter)
+    if output != TEXT:
+        write_records(result, output, fields, ["label", "id", "name"], headers)
+        return
     fmt = "{label:15.15} {id:40.40} {name:40}"
-    if headers:
-        print(fmt.format(id="Id", label="Status", name="Title"))
-        print("-" * 70)
-    for item in result:
-        print(fmt.format(**item))
+    write_table(result, fmt, dict(id="Id", label="Status", name="Title"), headers)
 
 
 @cli.command("ls")
@@ -242,35 +337,88 @@ def cmd_tasks(ctx, space, folder, list, task, filter, headers):
 @click.option("--filter", help="Filter tasks by name")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
 @click.option("--hierarchy/--nohierarchy", default=True, help="Show/hide hierarchy")
+@click.option("--recursive", help="List the descendants too", default=False, is_flag=True)
+@click.option("--depth", help="Maximum depth of the recursive listing", type=click.IntRange(min=1))
+@output_options
 @click.pass_context
-def cmd_ls(ctx, space, folder, list, task, filter, headers, hierarchy):
+def cmd_ls(ctx, space, folder, list, task, filter, headers, hierarchy, recursive, depth, output, fields):
     """
     List spaces --> folders --> lists --> tasks --> subtasks
 
     Example: aw ls --space 'test' --noheaders
     """
     wf = ctx.obj
-    result = wf.client.query(
-        space=space,
-        folder=folder,
-        lst=list,
-        task=task,
-        filter_name=filter,
-        hierarchy=hierarchy,
+    start_time = time.monotonic()
+    if recursive or depth is not None:
+        recursive = True
+        rows = QueryEngine(wf.client).walk(
+            space=space,
+            folder=folder,
+            lst=list,
+            task=task,
+            filter_name=filter,
+            hierarchy=hierarchy,
+            depth=depth,
+        )
+        items = prepare_walk_tree(rows)
+    else:
+        result = QueryEngine(wf.client).iterate(
+            space=space,
+            folder=folder,
+            lst=list,
+            task=task,
+            filter_name=filter,
+            hierarchy=hierarchy,
+        )
+        items = prepare_tree(result, enabled=hierarchy)
+    if output != TEXT:
+        count = write_records(items, output, fields, ["id", "type", "label", "name"], headers)
+    else:
+        fmt = "{tree:45.45} {label:15.15} {name:40}"
+        count = write_table(items, fmt, dict(label="Kind/Status", tree="Id", name="Title"), headers)
+    if recursive:
+        elapsed = time.monotonic() - start_time
+        click.echo(f"{count} items, {wf.client.get_requests_count()} requests, {elapsed:.2f}s", err=True)
+
+
+@cli.command("export")
+@click.argument("filename", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "export_format", help="Export format", type=click.Choice(EXPORT_FORMATS), default=SQLITE)
+@click.option("--space", help="Export a single space")
+@click.option("--resume/--restart", default=True, help="Resume an interrupted export/start from scratch")
+@click.option("--workers", help="Concurrent requests", type=click.IntRange(min=1), default=8, show_default=True)
+@click.pass_context
+def cmd_export(ctx, filename, export_format, space, resume, workers):
+    """
+    Export spaces, folders, lists and tasks to a SQLite database or a JSON lines file
+
+    Example: aw export snapshot.db --format sqlite
+    """
+    wf = ctx.obj
+    sink = (SqliteSink if export_format == SQLITE else JsonlSink)(filename, restart=not resume)
+    try:
+        stats = Exporter(wf.client, sink, max_workers=workers).run(space=space)
+    finally:
+        sink.close()
+    elapsed = stats["elapsed"]
+    click.echo(
+        f"{stats['rows']} rows, {stats['lists']} lists ({stats['resumed']} resumed, {len(stats['failed'])} failed), "
+        f"{stats['requests']} requests, {elapsed:.2f}s, {stats['rows'] / elapsed if elapsed else 0:.0f} rows/s",
+        err=True,
     )
-    fmt = "{tree:45.45} {label:15.15} {name:40}"
-    if headers:
-        print(fmt.format(label="Kind/Status", tree="Id", name="Title"))
-        print("-" * 70)
-    for item in prepare_tree(result, enabled=hierarchy):
-        print(fmt.format(**item))
+    if stats["failed"]:
+        for unit, error in stats["failed"].items():
+            click.echo(f"{unit}: {error}", err=True)
+        raise ExportException(f"Export incomplete ({len(stats['failed'])} failed), run the export again to resume")
 
 
 @cli.command("branch")
 @click.argument("task_id", required=False)
 @click.option("--repo", help="Remote repository URL")
+@click.option("--fast/--no-fast", default=None, help="Fetch only the base branch and create the branch from the remote")
+@click.option("--worktree", help="Create (or reuse) a dedicated worktree for the task branch", default=False, is_flag=True)
 @click.pass_context
-def cmd_branch(ctx, task_id, repo):
+def cmd_branch(ctx, task_id, repo, fast, worktree):
     """
     Open a task and create a new git branch
 
@@ -282,13 +430,16 @@ def cmd_branch(ctx, task_id, repo):
         task_id = pick_task(wf=wf)
         if task_id is None:
             raise MissingParameter(ctx=ctx, param_hint="'TASK_ID'", param_type="argument")
-    task = wf.client.get_task_by_id(task_id)
+    task = wf.client.get_task_by_id(task_id, details=True)
     if repo:
         # Create a new remote branch
         branch_already_exists = wf.github.create_branch(repo, task.branch_name)
+    elif worktree:
+        # Create a new local branch in a dedicated worktree
+        worktree_path, branch_already_exists = wf.git.create_worktree(task.branch_name)
     else:
         # Create a new local branch a switch to it
-        branch_already_exists = wf.git.create_branch(task.branch_name)
+        branch_already_exists = wf.git.create_branch(task.branch_name, fast=fast)
     # Update the task
     task.start_task(show_warnings=True)
     # Post a comment
@@ -300,6 +451,45 @@ def cmd_branch(ctx, task_id, repo):
             comment = f"Branch {task.branch_name}"
         task.post_task_comment(comment)
     click.secho(f"Branch {task.branch_name}", fg="green")
+    if worktree and not repo:
+        click.secho(f"Worktree {worktree_path}", fg="green")
+
+
+@cli.command("branches")
+@click.option("--prune", help="Delete the local branches of done tasks", default=False, is_flag=True)
+@click.option("--force", help="Delete the branches even if not merged", default=False, is_flag=True)
+@click.option("--headers/--noheaders", default=True, help="Show/hide headers")
+@click.pass_context
+def cmd_branches(ctx, prune, force, headers):
+    """
+    List local and remote branches with task status and pull request state
+
+    Example: aw branches --prune
+    """
+    wf = ctx.obj
+    branches = [x for x in wf.git.list_branches() if x["name"] != wf.config.git_base_branch]
+    for branch in branches:
+        branch["task_id"] = wf.client.get_task_from_branch(branch["name"]) if wf.client.is_task_branch(branch["name"]) else None
+    tasks = wf.client.get_tasks_by_id([x["task_id"] for x in branches if x["task_id"]])
+    pull_requests = get_pull_request_states(wf)
+    current_branch = wf.git.get_current_branch()
+    for branch in branches:
+        task = tasks.get(branch["task_id"])
+        branch["status"] = task.status if task is not None else "-"
+        branch["pr"] = pull_requests.get(branch["name"], "-")
+    fmt = "{short_name:50.50} {status:15.15} {date:10} {pr:8}"
+    write_table(branches, fmt, dict(short_name="Branch", status="Status", date="Date", pr="PR"), headers, separator=86)
+    if prune:
+        for branch in branches:
+            if branch["remote"] or branch["status"] != wf.config.clickup_status_ma or branch["name"] == current_branch:
+                continue
+            try:
+                wf.git.delete_branch(branch["name"], force=force)
+                click.secho(f"Deleted branch {branch['name']}", fg="green")
+            except GenericException as ex:
+                # Not fully merged, checked out in a worktree, ...
+                reason = str(ex).replace("git error:", "").strip()
+                click.secho(f"Warning: Branch {branch['name']} not deleted: {reason}", fg="yellow")
 
 
 @cli.command("commit")
@@ -358,8 +548,9 @@ def cmd_pr(ctx, repo, task_id):
 @click.option("--repo", help="Remote repository URL")
 @click.option("--headers/--noheaders", default=True, help="Show/hide headers")
 @click.argument("task_id", required=False)
+@output_options
 @click.pass_context
-def cmd_lr(ctx, repo, headers, task_id):
+def cmd_lr(ctx, repo, headers, task_id, output, fields):
     """
     List pull requests on repository
 
@@ -369,13 +560,11 @@ def cmd_lr(ctx, repo, headers, task_id):
     # List the pull request
     repo = repo or wf.git.get_remote_url()
     result = wf.github.list_pull_request(repo)
-
+    if output != TEXT:
+        write_records(result, output, fields, ["number", "title", "diff_url"], headers)
+        return
     fmt = "{number:6} {title:50.50} {diff_url}"
-    if headers:
-        print(fmt.format(number="Pr.num", title="Title", diff_url="Diff url"))
-        print("-" * 70)
-    for item in result:
-        print(fmt.format(**item))
+    write_table(result, fmt, dict(number="Pr.num", title="Title", diff_url="Diff url"), headers)
 
 
 @cli.command("merge")
@@ -421,8 +610,10 @@ def cmd_ma(ctx, repo, pr_nr, task_id):
 
 @cli.command("get-status")
 @click.argument("task_id", required=False)
+@click.option("--headers/--noheaders", default=True, help="Show/hide headers (csv/tsv output)")
+@output_options
 @click.pass_context
-def cmd_get_status(ctx, task_id):
+def cmd_get_status(ctx, task_id, headers, output, fields):
     """
     Get task status
 
@@ -436,6 +627,10 @@ def cmd_get_status(ctx, task_id):
             raise MissingParameter(ctx=ctx, param_hint="'TASK_ID'", param_type="argument")
     task = wf.client.get_task_by_id(task_id)
     space = task.get_space()
+    if output != TEXT:
+        record = dict(task, space=space)
+        write_records([record], output, fields, ["id", "label", "space.name", "folder.name", "list.name", "name"], headers)
+        return
     style = lambda x: click.style(x, "cyan")
     print(
         f"""\
@@ -520,6 +715,7 @@ def cmd_configure(ctx, tasks, clickup_token, github_token, tenant_id, client_id,
         click.secho("ClickUP API token verified", fg="green")
     elif tasks == PLANNER:
         wf.config.get_o365_account(interactive=True)
+        wf.client.clear_account_state()
         click.secho("O365 credentials verified", fg="green")
     if wf.config.default_github_token:
         wf.github.get_user()
@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
+import os
 import re
 import json
-import fnmatch
-import requests
+import hashlib
+import threading
 import urllib
 import click
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from functools import partial
+from .cache import JsonCache
+from .profiling import profiler
+from .transport import get_transport
+from .query import QueryEngine, LEVELS
 from .exceptions import (
     SpaceNotFound,
     FolderNotFound,
@@ -18,17 +24,38 @@ from .exceptions import (
 )
 
 BRANCH_SEPARATOR = "-"
+# Task branch: <task id>-<task name> (lowercase alphanumeric task id, with digits)
+TASK_BRANCH_RE = re.compile(r"^(?=[a-z]*[0-9])[0-9a-z]+-")
 SERVER_URL = "https://api.clickup.com/api/v2/"
+# Server URL override (e.g. a local stand-in server)
+AW_CLICKUP_URL = "AW_CLICKUP_URL"
+MAX_WORKERS = 8
+# Tasks per page of the list tasks endpoint
+PAGE_SIZE = 100
+# Space/folder/list name index time to live (seconds)
+INDEX_TTL = 24 * 60 * 60
+INDEX_CACHE = "clickup_index"
+# Fields stored in the index for each entity (and for the embedded space/folder)
+INDEX_FIELDS = ("id", "name", "hidden", "space", "folder")
+INDEX_PARENT_FIELDS = ("id", "name", "hidden")
 
 __all__ = ["ClickUpClient"]
 
 
 class ClickUpClient:
+    query_levels = LEVELS
+
     def __init__(self, config):
-        self.server = SERVER_URL
+        self.server = (os.environ.get(AW_CLICKUP_URL) or SERVER_URL).rstrip("/") + "/"
         self.config = config
         self.team_id = self.config.default_clickup_team_id
         self.workspace = None
+        self.workspace_full = False
+        self.workspace_lock = threading.Lock()
+        self.tasks = {}
+        self.index = ClickUpIndex(self)
+        self.requests_count = 0
+        self.requests_lock = threading.Lock()
 
     def send_request(self, part, method="GET", request_args=None, payload=None, **kwargs):
         "Send HTTP Request to ClickUP"
@@ -38,8 +65,12 @@ class ClickUpClient:
         request_args = request_args or dict()
         if payload is not None:
             request_args["json"] = payload
-        response = requests.request(method=method, url=url, headers=headers, **request_args)
-        # self.save_response(response)
+        with self.requests_lock:
+            self.requests_count = self.requests_count + 1
+        with profiler.span("clickup", method, part) as span:
+            response = get_transport().request(method, url, headers=headers, **request_args)
+            span.status = response.status_code
+            span.bytes = len(response.content)
         payload = response.json()
         if "err" in payload:
             if self.config.is_verbose():
@@ -47,19 +78,9 @@ class ClickUpClient:
             raise ClickUpException(payload["err"])
         return payload
 
-    def save_response(self, response):
-        rqs = response.request
-        path_url = rqs.path_url.strip("/").replace("..", "").split("?")[0] + "." + rqs.method.lower()
-        filename = Path.cwd() / "tests" / "data" / Path(*path_url.split("/"))
-        print(filename)
-        filename.parent.mkdir(parents=True, exist_ok=True)
-        with filename.open("wb") as f:
-            f.write(response.content)
-        headers_filename = filename.parent / (filename.name + ".headers")
-        with headers_filename.open("w") as f:
-            headers = dict(response.headers)
-            headers["__Status__"] = response.status_code
-            json.dump(headers, f, indent=2)
+    def get_requests_count(self):
+        "Number of requests sent"
+        return self.requests_count
 
     def get_user(self):
         return self.send_request("user")["user"]
@@ -83,15 +104,32 @@ class ClickUpClient:
         except ClickUpException:
             raise ListNotFound(f"List '{list_id}' not found")
 
-    def get_task_by_id(self, task_id):
-        "Get a task by id"
+    def get_task_by_id(self, task_id, details=False):
+        "Get a task by id (the task description is always included)"
         try:
             task_id = task_id.lstrip("#")
             data = self.send_request(f"task/{task_id}/")
-            return Task(self, data)
+            self.tasks[task_id] = Task(self, data)
+            return self.tasks[task_id]
         except ClickUpException:
             raise TaskNotFound(f"Task '{task_id}' not found")
 
+    def get_tasks_by_id(self, task_ids, max_workers=MAX_WORKERS):
+        "Get tasks by id concurrently, return a {task_id: task} dict (None for tasks not found)"
+
+        def fetch(task_id):
+            try:
+                return self.get_task_by_id(task_id)
+            except TaskNotFound:
+                return None
+
+        task_ids = list(dict.fromkeys(task_id.lstrip("#") for task_id in task_ids))
+        result = dict((task_id, self.tasks[task_id]) for task_id in task_ids if task_id in self.tasks)
+        missing = [task_id for task_id in task_ids if task_id not in result]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            result.update(zip(missing, executor.map(fetch, missing)))
+        return result
+
     def get_task(self, task_id, lst=None, space=None, folder=None):
         "Get a task by id"
         if not task_id:
@@ -99,29 +137,30 @@ class ClickUpClient:
         else:
             return self.get_task_by_id(task_id)
 
-    def get_workspace(self, index=0):
-        "Get the workspace"
-        if self.workspace is None:
-            teams = self.get_teams()
-            data = teams[index]
-            self.workspace = Workspace(self, data)
-        return self.workspace
-
-    def get_space(self, space_id_or_name):
-        "Get a space by name or id"
+    def get_workspace(self, index=0, full=False):
+        "Get the workspace (full: all the team fields, otherwise the index entry, id and name)"
+        with self.workspace_lock:
+            if self.workspace is None or (full and not self.workspace_full):
+                data = self.index.get_team(index, full=full)
+                self.workspace = Workspace(self, data)
+                self.workspace_full = full
+            return self.workspace
+
+    def get_space(self, space_id_or_name, full=True):
+        "Get a space by name or id (full: fetch the space, otherwise a name is resolved to the index entry)"
         if not space_id_or_name:
             return None
         elif space_id_or_name.isdigit():  # get by id
             return self.get_space_by_id(space_id=space_id_or_name)
         else:  # get by name
-            spaces = self.get_workspace().get_spaces()
-            try:
-                return [space for space in spaces if space.get("name") == space_id_or_name][0]
-            except Exception:
+            workspace = self.get_workspace()
+            data = self.index.find([(f"spaces/{workspace.team_id}", workspace.get_spaces)], space_id_or_name)
+            if data is None:
                 raise SpaceNotFound(f"Space '{space_id_or_name}' not found")
+            return self.get_space_by_id(space_id=data["id"]) if full else Space(self, data)
 
-    def get_folder(self, folder_id_or_name, space=None):
-        "Get a folder by name or id"
+    def get_folder(self, folder_id_or_name, space=None, full=True):
+        "Get a folder by name or id (full: fetch the folder, otherwise a name is resolved to the index entry)"
         if not folder_id_or_name:
             return None
         elif folder_id_or_name.isdigit():  # get by id
@@ -129,7 +168,7 @@ class ClickUpClient:
         elif space is None:
             raise GenericException("Please specify space")
         else:  # get by name
-            return space.get_folder_by_name(name=folder_id_or_name)
+            return space.get_folder_by_name(name=folder_id_or_name, full=full)
 
     def get_folder_by_id(self, folder_id):
         "Get a folder by id"
@@ -139,24 +178,28 @@ class ClickUpClient:
         except ClickUpException:
             raise FolderNotFound(f"Folder '{folder_id}' not found")
 
-    def get_list(self, list_id_or_name, space=None, folder=None):
-        "Get a list by name or id"
+    def get_list(self, list_id_or_name, space=None, folder=None, full=True):
+        "Get a list by name or id (full: fetch the list, otherwise a name is resolved to the index entry)"
         if not list_id_or_name:
             return None
         elif list_id_or_name.isdigit():
             return self.get_list_by_id(list_id=list_id_or_name)
         else:
-            lists = []
+            scopes = []
             if not space and not folder:
                 raise GenericException("Please specify space/folder")
             if space:
-                lists.extend(space.get_space_lists())
+                scopes.append((f"lists/space/{space.id}", space.get_space_lists))
             if folder:
-                lists.extend(folder.get_folder_lists())
-            try:
-                return [lst for lst in lists if lst.get("name") == list_id_or_name][0]
-            except Exception:
+                scopes.append((f"lists/folder/{folder.id}", folder.get_folder_lists))
+            data = self.index.find(scopes, list_id_or_name)
+            if data is None:
                 raise ListNotFound(f"List '{list_id_or_name}' not found")
+            return self.get_list_by_id(list_id=data["id"]) if full else List(self, data)
+
+    def is_id(self, level, value):
+        "True if value is an id of the level entities (tasks are always addressed by id)"
+        return level == "task" or value.isdigit()
 
     def query(
         self,
@@ -169,76 +212,83 @@ class ClickUpClient:
         hierarchy=False,
     ):
         "Get spaces/folders/lists/tasks"
-        result = []
-        # Workspace
-        if hierarchy:
-            workspace = self.get_workspace()
-            result.append(workspace)
-        # Get space
-        space = self.get_space(space)
-        if space and hierarchy:
-            result.append(space)
-        # Get folder
-        folder = self.get_folder(folder, space=space)
-        if folder and hierarchy:
-            if space is None:
-                space = Space(self, folder["space"])
-                result.append(space)
-            result.append(folder)
-        # Get list
-        lst = self.get_list(lst, space=space, folder=folder)
-        if lst and hierarchy:
-            if space is None:
-                space = Space(self, lst["space"])
-                result.append(space)
-            if folder is None and lst.get("folder") and not lst["folder"].get("hidden"):
-                folder = Folder(self, lst["folder"])
-                result.append(folder)
-            result.append(lst)
-        # Get task
-        task = self.get_task(task, lst=lst, space=space, folder=folder)
-        if task and hierarchy:
-            if space is None:
-                space = self.get_space_by_id(task["space"]["id"])
-                result.append(space)
-            if folder is None and task.get("folder") and not task["folder"].get("hidden"):
-                folder = Folder(self, task["folder"])
-                result.append(folder)
-            if lst is None and task.get("list"):
-                lst = List(self, task["list"])
-                result.append(lst)
-            result.append(task)
-        # Prepare result
-        if task:
-            # Task subtasks
-            result.extend(task.get_subtasks())
-        elif lst:
-            # List tasks
-            result.extend(lst.get_list_tasks())
-        elif folder:
-            # Folders lists
-            result.extend(folder.get_folder_lists())
-        elif space:
-            # Space folders
-            result.extend(space.get_space_folders())
-            # Space folderless lists
-            result.extend(space.get_space_lists())
-        else:
-            # Spaces
-            result.extend(self.get_workspace().get_spaces())
-        # Filter result by type
-        if filter_type:
-            result = [x for x in result if x["type"] == filter_type]
-        # Filter result by name
-        if filter_name:
-            match = lambda x: fnmatch.fnmatch(x["name"].lower(), filter_name.lower())
-            result = [x for x in result if match(x)]
-        return result
+        return QueryEngine(self).query(space, folder, lst, task, filter_type, filter_name, hierarchy)
 
     def get_task_from_branch(self, current_branch):
         "Get task ID from branch name"
         return current_branch.split("-")[0]
 
+    def is_task_branch(self, branch_name):
+        "True if the branch name starts with a task id"
+        return bool(TASK_BRANCH_RE.match(branch_name))
+
+
+class ClickUpIndex:
+    """
+    Space/folder/list name => id index (with the parent ids), persisted with a time to live.
+    Lookups by name are served from the index, which is refreshed from ClickUp on a miss.
+    The index entries are not complete entities, they are enough to address the children of a scope.
+    """
+
+    def __init__(self, client, ttl=INDEX_TTL):
+        self.client = client
+        self.cache = JsonCache(INDEX_CACHE, ttl=ttl)
+        self.refreshed = set()
+        self.teams = None
+        token = client.config.default_clickup_token or ""
+        self.account_key = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+    def get_team(self, index=0, full=False):
+        "Get the workspace (team) data (full: fetch the teams, otherwise the index entry)"
+        key = f"teams/{self.account_key}"
+        teams = self.teams if full else self.cache.get(key)
+        if teams is None or index >= len(teams):
+            teams = self.teams = self.client.get_teams()  # fetched once per run
+            self.set_entries(key, teams, ("id", "name"))
+        return teams[index]
+
+    def get_entries(self, key, fetch, refresh=False):
+        "Get the index entries of a scope, the listing (fetch) updates the index"
+        entries = None if refresh else self.cache.get(key)
+        if entries is None:
+            fetch()
+            entries = self.cache.get(key) or []
+        return entries
+
+    def set_entries(self, key, items, fields=INDEX_FIELDS):
+        "Update the index entries of a scope"
+        entries = []
+        for item in items:
+            entry = dict((k, item[k]) for k in fields if item.get(k) is not None)
+            for parent in ("space", "folder"):
+                if isinstance(entry.get(parent), dict):
+                    entry[parent] = dict((k, v) for k, v in entry[parent].items() if k in INDEX_PARENT_FIELDS)
+            entries.append(entry)
+        self.cache.set(key, entries)
+        self.cache.save()
+        self.refreshed.add(key)
+        return entries
+
+    def find(self, scopes, name):
+        "Find an entry by name in the scopes ([(key, fetch)]), refresh the index on miss"
+        for refresh in (False, True):
+            scopes = [(key, fetch) for key, fetch in scopes if not refresh or key not in self.refreshed]
+            entries = []
+            for key, fetch in scopes:
+                entries.extend(self.get_entries(key, fetch, refresh=refresh))
+            entry = self.match(entries, name)
+            if entry is not None:
+                return entry
+        return None
+
+    def match(self, entries, name):
+        "Match by name, exact case first then a case insensitive unique match"
+        for entry in entries:
+            if entry.get("name") == name:
+                return entry
+        matches = [entry for entry in entries if entry.get("name", "").lower() == name.lower()]
+        return matches[0] if len(matches) == 1 else None
+
 
 class Workspace(dict):
     def __init__(self, client, data):
@@ -251,8 +301,16 @@ class Workspace(dict):
     def get_spaces(self, archived=False):
         "Get spaces"
         result = self.client.send_request(f"team/{self.team_id}/space?archived={archived}")
+        if not archived:
+            self.client.index.set_entries(f"spaces/{self.team_id}", result["spaces"])
         return [Space(self.client, space) for space in result["spaces"]]
 
+    def get_parents(self):
+        return {}
+
+    def get_children(self, deep=False):
+        return {"Space": self.get_spaces}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
@@ -274,19 +332,20 @@ class Space(dict):
         self["type"] = "Space"
         self["label"] = self["type"]
 
-    def get_folder_by_name(self, name):
-        "Get space folder by name"
-        folders = self.get_space_folders()
-        try:
-            return [folder for folder in folders if folder.get("name") == name][0]
-        except Exception:
+    def get_folder_by_name(self, name, full=True):
+        "Get space folder by name (full: fetch the folder, otherwise the index entry)"
+        data = self.client.index.find([(f"folders/{self.id}", self.get_space_folders)], name)
+        if data is None:
             raise FolderNotFound(f"Folder '{name}' not found")
+        return self.client.get_folder_by_id(folder_id=data["id"]) if full else Folder(self.client, data)
 
     def get_space_folders(self, archived=False):
         "Get space folders"
         response = self.client.send_request(
             f"space/{self.id}/folder?archived={archived}",
         )
+        if not archived:
+            self.client.index.set_entries(f"folders/{self.id}", response["folders"])
         return [Folder(self.client, data) for data in response["folders"]]
 
     def get_space_lists(self, archived=False):
@@ -294,8 +353,16 @@ class Space(dict):
         response = self.client.send_request(
             f"space/{self.id}/list?archived={archived}",
         )
+        if not archived:
+            self.client.index.set_entries(f"lists/space/{self.id}", response["lists"])
         return [List(self.client, data) for data in response["lists"]]
 
+    def get_parents(self):
+        return {}
+
+    def get_children(self, deep=False):
+        return {"Folder": self.get_space_folders, "List": self.get_space_lists}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
@@ -321,8 +388,17 @@ class Folder(dict):
         response = self.client.send_request(
             f"folder/{self.id}/list?archived={archived}",
         )
+        if not archived:
+            self.client.index.set_entries(f"lists/folder/{self.id}", response["lists"])
         return [List(self.client, data) for data in response["lists"]]
 
+    def get_parents(self):
+        "Parents embedded in the folder data"
+        return {"space": Space(self.client, self["space"])} if self.get("space") else {}
+
+    def get_children(self, deep=False):
+        return {"List": self.get_folder_lists}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
@@ -343,13 +419,50 @@ class List(dict):
         self["type"] = "List"
         self["label"] = self["type"]
 
-    def get_list_tasks(self, include_closed=False):
-        response = self.client.send_request(f"list/{self.id}/task?include_closed={include_closed}")
-        return [Task(self.client, data) for data in response["tasks"]]
+    def get_list_tasks(self, include_closed=False, subtasks=False):
+        "Get list tasks (subtasks: fetch the subtasks too, in the same requests, attached to their parents)"
+        tasks = self.get_all_tasks(include_closed=include_closed, subtasks=subtasks)
+        if not subtasks:
+            return tasks
+        by_id = dict((task.id, task) for task in tasks)
+        result = []
+        for task in tasks:
+            task.subtasks = []
+        for task in tasks:
+            parent = by_id.get(task.get("parent"))
+            if parent is not None:
+                parent.subtasks.append(task)
+            else:
+                result.append(task)
+        return result
+
+    def get_all_tasks(self, include_closed=True, subtasks=True):
+        "Get all the list tasks and subtasks (all the pages)"
+        result = []
+        page = 0
+        query = f"subtasks=true&include_closed={include_closed}" if subtasks else f"include_closed={include_closed}"
+        while True:
+            response = self.client.send_request(f"list/{self.id}/task?{query}&page={page}")
+            result.extend(Task(self.client, data) for data in response["tasks"])
+            if response.get("last_page", len(response["tasks"]) < PAGE_SIZE):
+                return result
+            page = page + 1
 
     def get_statuses(self):
         return [x["status"] for x in self.get("statuses")]
 
+    def get_parents(self):
+        "Parents embedded in the list data"
+        result = {}
+        if self.get("space"):
+            result["space"] = Space(self.client, self["space"])
+        if self.get("folder") and not self["folder"].get("hidden"):
+            result["folder"] = Folder(self.client, self["folder"])
+        return result
+
+    def get_children(self, deep=False):
+        return {"Task": partial(self.get_list_tasks, subtasks=deep)}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
@@ -420,6 +533,8 @@ class Task(dict):
 
     def get_subtasks(self, include_closed=False):
         "Get subtasks"
+        if not include_closed and self.__dict__.get("subtasks") is not None:
+            return self.subtasks  # fetched with the list tasks
         response = self.client.send_request(f"list/{self.list['id']}/task?subtasks=true&include_closed={include_closed}")
         return [Task(self.client, data) for data in response["tasks"] if data.get("parent") == self.id]
 
@@ -427,6 +542,20 @@ class Task(dict):
         "Returns true if the task has subtasks"
         return any(self.get_subtasks(include_closed))
 
+    def get_parents(self):
+        "Parents embedded in the task data (the space is fetched, only its id is embedded)"
+        result = {}
+        if self.get("space"):
+            result["space"] = partial(self.client.get_space_by_id, self["space"]["id"])
+        if self.get("folder") and not self["folder"].get("hidden"):
+            result["folder"] = Folder(self.client, self["folder"])
+        if self.get("list"):
+            result["list"] = List(self.client, self["list"])
+        return result
+
+    def get_children(self, deep=False):
+        return {"Subtask": self.get_subtasks}
+
     @property
     def branch_name(self):
         "Branch name"
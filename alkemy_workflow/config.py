@@ -7,9 +7,10 @@ import time
 from portalocker import Lock
 from portalocker.exceptions import LockException
 from pathlib import Path
-from O365 import Account, FileSystemTokenBackend, connection  # type: ignore
+from O365 import FileSystemTokenBackend, connection  # type: ignore
 from .exceptions import ConfigException, GitException
 from .git import Git
+from .graph import ThrottlingAccount
 
 
 __all__ = ["Config"]
@@ -38,11 +39,19 @@ CREDENTIALS_KEYS = (
 CONFIG_KEYS = (
     "default_tasks",
     "git_base_branch",
+    "git_fast_branch",
+    "git_fetch_depth",
+    "git_worktree_dir",
     "clickup_status_in_progress",
     "clickup_status_pr",
     "clickup_status_ma",
 )
-O365_TOKEN_REFRESH_MAX_TRIES = 5
+TRUE_VALUES = ("1", "yes", "true", "on")
+# Max seconds to wait for another process refreshing the token
+O365_TOKEN_LOCK_TIMEOUT = 30
+# Token file check backoff (seconds)
+O365_TOKEN_LOCK_MIN_DELAY = 0.02
+O365_TOKEN_LOCK_MAX_DELAY = 0.5
 O365_SCOPES = [
     "basic",
     "sharepoint_dl",
@@ -65,6 +74,9 @@ class Config:
     default_github_token = None
     git_dir = None
     git_base_branch = DEFAULT_GIT_BASE_BRANCH
+    git_fast_branch = False
+    git_fetch_depth = None
+    git_worktree_dir = None
     clickup_status_in_progress = CLICKUP_STATUS_IN_PROGRESS
     clickup_status_pr = CLICKUP_STATUS_PR
     clickup_status_ma = CLICKUP_STATUS_MA
@@ -131,12 +143,24 @@ class Config:
         self.default_tasks = None
         self.git_dir = git.get_toplevel(self.base_path)
         self.config_path = self.git_dir / "alkemy_workflow.ini"
+        if not self.config_path.exists():
+            # Linked worktree - use the main working tree config
+            main_config_path = git.get_main_toplevel(self.base_path) / "alkemy_workflow.ini"
+            if main_config_path.exists():
+                self.config_path = main_config_path
         if self.config_path.exists():
             # Load project config
             cp = configparser.ConfigParser()
             cp.read(self.config_path)
             for config_key in CONFIG_KEYS:
                 self.retrieve_config(cp, config_key)
+            if isinstance(self.git_fast_branch, str):
+                self.git_fast_branch = self.git_fast_branch.lower() in TRUE_VALUES
+            if self.git_fetch_depth:
+                try:
+                    self.git_fetch_depth = int(self.git_fetch_depth)
+                except ValueError:
+                    raise ConfigException(f"Invalid git fetch_depth '{self.git_fetch_depth}' in {self.config_path}")
 
     def retrieve_config(self, cp, config_key):
         section, key = config_key.split("_", 1)
@@ -249,7 +273,7 @@ class Config:
             home_dir / ".alkemy_workflow",
             token_filename=f"{self.o365_tenant_id}.json",
         )
-        account = Account(
+        account = ThrottlingAccount(
             credentials,
             auth_flow_type="authorization",
             tenant_id=self.o365_tenant_id,
@@ -275,22 +299,49 @@ class LockableFileSystemTokenBackend(FileSystemTokenBackend):
         self.fs_wait = False
         super().__init__(*args, **kwargs)
 
+    def get_token_mtime(self):
+        "Get the token file modification time (None if missing)"
+        try:
+            return self.token_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
     def should_refresh_token(self, con=None):
         """
         Method for refreshing the token when there are concurrently running instances.
+        Only the process holding the lock refreshes the token, the others
+        proceed as soon as the refreshed token is written to the token file.
         """
-        for _ in range(O365_TOKEN_REFRESH_MAX_TRIES):
-            if self.token.is_access_expired:
-                try:
-                    with Lock(self.token_path, "r+", fail_when_locked=True, timeout=0):
-                        if con.refresh_token() is False:
-                            raise RuntimeError("Error refreshing token")
+        if not self.token.is_access_expired:
+            self.fs_wait = False
+            return False
+        mtime = self.get_token_mtime()
+        deadline = time.monotonic() + O365_TOKEN_LOCK_TIMEOUT
+        delay = O365_TOKEN_LOCK_MIN_DELAY
+        while True:
+            try:
+                with Lock(self.token_path, "r+", fail_when_locked=True, timeout=0):
+                    # The token could have been refreshed while waiting for the lock
+                    if self.get_token_mtime() != mtime:
+                        self.token = self.load_token()
+                    if not self.token.is_access_expired:
+                        self.fs_wait = False
+                        return False
+                    if con.refresh_token() is False:
+                        raise RuntimeError("Error refreshing token")
+                    self.fs_wait = False
                     return None
-                except LockException:
-                    self.fs_wait = True
-                    time.sleep(1)
-                    self.token = self.load_token()
-            else:
-                self.fs_wait = False
-                return False
-        raise RuntimeError("Could not access locked token file")
+            except LockException:
+                self.fs_wait = True
+            # Another process is refreshing the token - check if the token file was updated
+            current_mtime = self.get_token_mtime()
+            if current_mtime != mtime:
+                mtime = current_mtime
+                self.token = self.load_token()
+                if not self.token.is_access_expired:
+                    self.fs_wait = False
+                    return False
+            if time.monotonic() >= deadline:
+                raise RuntimeError("Could not access locked token file")
+            time.sleep(delay)
+            delay = min(delay * 2, O365_TOKEN_LOCK_MAX_DELAY)
@@ -14,6 +14,9 @@ __all__ = [
     "GitHubException",
     "ConfigException",
     "ClickUpException",
+    "ThrottlingException",
+    "ExportException",
+    "TransportException",
 ]
 
 
@@ -67,3 +70,15 @@ class ConfigException(GenericException):
 
 class ClickUpException(GenericException):
     "ClickUp exception"
+
+
+class ThrottlingException(GenericException):
+    "Request throttled by the server (too many requests)"
+
+
+class ExportException(GenericException):
+    "Export incomplete"
+
+
+class TransportException(GenericException):
+    "Record/replay transport exception"
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from pathlib import Path
+
+__all__ = ["Exporter", "SqliteSink", "JsonlSink", "EXPORT_FORMATS", "SQLITE", "JSONL"]
+
+SQLITE = "sqlite"
+JSONL = "jsonl"
+EXPORT_FORMATS = (SQLITE, JSONL)
+MAX_WORKERS = 8
+# Rows written per transaction (a transaction contains whole lists)
+BATCH_SIZE = 500
+# Checkpoint unit of the spaces/folders/lists rows
+STRUCTURE = "structure"
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    label TEXT,
+    parent_id TEXT,
+    list_id TEXT,
+    data TEXT,
+    exported_at REAL,
+    PRIMARY KEY (type, id)
+);
+CREATE INDEX IF NOT EXISTS items_list_id ON items (list_id);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    unit TEXT PRIMARY KEY,
+    rows INTEGER,
+    exported_at REAL
+);
+"""
+SQLITE_COLUMNS = ("type", "id", "name", "label", "parent_id", "list_id", "data", "exported_at")
+
+
+def get_row(item, parent_id=None, list_id=None):
+    "Export row of an entity"
+    return {
+        "type": item["type"],
+        "id": str(item["id"]),
+        "name": item.get("name"),
+        "label": item.get("label"),
+        "parent_id": parent_id,
+        "list_id": list_id,
+        "data": dict(item),
+        "exported_at": time.time(),
+    }
+
+
+class SqliteSink:
+    """
+    SQLite snapshot (items and checkpoints tables).
+    The rows and the checkpoints of the lists they belong to are written in the same transaction,
+    without checkpoints to resume the items of the previous snapshot are deleted.
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        if restart:
+            self.connection.executescript("DROP TABLE IF EXISTS items; DROP TABLE IF EXISTS checkpoints;")
+        self.connection.executescript(SQLITE_SCHEMA)
+        if not self.get_done():  # nothing to resume, start a new snapshot
+            with self.connection:
+                self.connection.execute("DELETE FROM items")
+
+    def get_done(self):
+        "Checkpointed units"
+        return set(x for x, in self.connection.execute("SELECT unit FROM checkpoints"))
+
+    def write(self, rows, units):
+        "Write the rows and checkpoint the units, in a single transaction"
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO items ({', '.join(SQLITE_COLUMNS)}) VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})",
+                [tuple(json.dumps(row[x], default=str) if x == "data" else row[x] for x in SQLITE_COLUMNS) for row in rows],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO checkpoints (unit, rows, exported_at) VALUES (?, ?, ?)",
+                [(unit, count, now) for unit, count in units.items()],
+            )
+
+    def finish(self):
+        "The export is complete, the next export starts from scratch"
+        with self.connection:
+            self.connection.execute("DELETE FROM checkpoints")
+
+    def close(self):
+        self.connection.close()
+
+
+class JsonlSink:
+    """
+    JSON lines snapshot, one row per line.
+    The checkpoint (<path>.checkpoint) contains the units written and the file size after them,
+    on resume the rows written after the last checkpoint are truncated.
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = Path(path)
+        self.checkpoint_path = self.path.with_name(self.path.name + ".checkpoint")
+        checkpoint = {"offset": 0, "units": []}
+        if not restart:
+            try:
+                with self.checkpoint_path.open("r") as f:
+                    checkpoint = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.offset = checkpoint["offset"]
+        self.units = set(checkpoint["units"])
+        self.file = self.path.open("r+b" if self.offset and self.path.exists() else "wb")
+        self.file.truncate(self.offset)
+        self.file.seek(self.offset)
+
+    def get_done(self):
+        "Checkpointed units"
+        return set(self.units)
+
+    def write(self, rows, units):
+        "Write the rows, then checkpoint the units"
+        data = "".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8")
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset = self.offset + len(data)
+        self.units.update(units)
+        self.save_checkpoint()
+
+    def save_checkpoint(self):
+        "Write the checkpoint file (atomically)"
+        fd, tmp = tempfile.mkstemp(dir=self.checkpoint_path.parent, prefix=self.checkpoint_path.name, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"offset": self.offset, "units": sorted(self.units)}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def finish(self):
+        "The export is complete, the next export starts from scratch"
+        try:
+            self.checkpoint_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.file.close()
+
+
+class Exporter:
+    """
+    Export the spaces, folders, lists and tasks of a workspace to a sink.
+
+    The spaces and folders are walked concurrently, then the tasks of each list are fetched
+    (all the pages) with a bounded worker pool. The rows of the completed lists are written
+    in batched transactions together with their checkpoints, so an interrupted export
+    resumes from the lists not written yet. Spaces, folders and lists failing to export
+    are reported and left for the next run (JSON lines readers should keep the last row
+    of each type/id, the structure rows are written again until complete).
+    """
+
+    def __init__(self, client, sink, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE):
+        self.client = client
+        self.sink = sink
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.rows = []
+        self.units = {}
+        self.stats = {"rows": 0, "lists": 0, "resumed": 0, "failed": {}, "requests": 0, "elapsed": 0}
+        self.futures = []
+
+    def run(self, space=None):
+        "Export the workspace (or a single space), return the export stats"
+        start_time = time.monotonic()
+        start_requests = self.client.get_requests_count()
+        done = self.sink.get_done()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            roots = [self.client.get_space(space)] if space else self.client.get_workspace().get_children(deep=True)["Space"]()
+            containers, lists = self.get_structure(executor, roots)
+            if STRUCTURE not in done:
+                # Checkpointed only if complete, otherwise written again by the next run
+                complete = not self.stats["failed"]
+                self.add([get_row(x, parent_id, None) for x, parent_id in containers + lists], STRUCTURE if complete else None)
+            pending = [x for x, _ in lists if f"list:{x['id']}" not in done]
+            self.stats["resumed"] = len(lists) - len(pending)
+            futures = dict((self.submit(executor, lst.get_all_tasks), lst) for lst in pending)
+            for future in as_completed(futures):
+                list_id = str(futures[future]["id"])
+                try:
+                    tasks = future.result()
+                except Exception as ex:
+                    self.stats["failed"][f"list:{list_id}"] = str(ex)
+                    continue
+                self.add([get_row(x, str(x.get("parent") or list_id), list_id) for x in tasks], f"list:{list_id}")
+                self.stats["lists"] = self.stats["lists"] + 1
+            self.flush()
+            if not self.stats["failed"]:
+                self.sink.finish()
+        finally:
+            for future in self.futures:  # not started yet (shutdown cancel_futures requires Python 3.9)
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.flush()  # keep the completed lists on interruption
+            self.stats["requests"] = self.client.get_requests_count() - start_requests
+            self.stats["elapsed"] = time.monotonic() - start_time
+        return self.stats
+
+    def get_structure(self, executor, roots):
+        "Walk the spaces and folders concurrently, return the containers and the lists as (item, parent id)"
+        containers = [(x, None) for x in roots]
+        lists = []
+        pending = dict((self.submit(executor, fetch), root) for root in roots for fetch in root.get_children().values())
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                parent = pending.pop(future)
+                try:
+                    items = future.result()
+                except Exception as ex:
+                    self.stats["failed"][f"{parent['type'].lower()}:{parent['id']}"] = str(ex)
+                    continue
+                for item in items:
+                    if item["type"] == "List":
+                        lists.append((item, str(parent["id"])))
+                    else:
+                        containers.append((item, str(parent["id"])))
+                        pending.update((self.submit(executor, fetch), item) for fetch in item.get_children().values())
+        return containers, lists
+
+    def submit(self, executor, fn):
+        "Submit a fetch (cancelled if the export is interrupted)"
+        future = executor.submit(fn)
+        self.futures.append(future)
+        return future
+
+    def add(self, rows, unit=None):
+        "Add the rows of a unit, write a batch when full"
+        self.rows.extend(rows)
+        if unit is not None:
+            self.units[unit] = len(rows)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        "Write the pending rows and checkpoint their units"
+        rows, units = self.rows, self.units
+        self.rows = []
+        self.units = {}
+        if rows or units:
+            self.sink.write(rows, units)
+            self.stats["rows"] = self.stats["rows"] + len(rows)
@@ -1,24 +1,223 @@
 #!/usr/bin/env python
 
+import os
+import re
 import subprocess
 from pathlib import Path
 from .exceptions import GitException
+from .profiling import profiler
 
 
-__all__ = ["Git"]
+__all__ = ["Git", "SubprocessGitBackend", "FileSystemGitBackend"]
+
+AW_GIT_BACKEND = "AW_GIT_BACKEND"
+SUBPROCESS_BACKEND = "subprocess"
+FILESYSTEM_BACKEND = "filesystem"
+DEFAULT_BACKEND = FILESYSTEM_BACKEND
+# Environment variables changing how git locates the repository
+GIT_ENVIRON = ("GIT_DIR", "GIT_WORK_TREE", "GIT_COMMON_DIR", "GIT_CONFIG", "GIT_CONFIG_GLOBAL", "GIT_CONFIG_SYSTEM")
+
+
+class BackendNotSupported(Exception):
+    "The repository layout is not supported by the backend"
+
+
+class SubprocessGitBackend:
+    "Read-only git queries executed by the git command"
+
+    def __init__(self, git):
+        self.git = git
+
+    def get_current_branch(self, git_dir=None):
+        "Get current branch"
+        return self.git.run("rev-parse", "--abbrev-ref", "HEAD", git_dir=git_dir)
+
+    def get_toplevel(self, git_dir=None):
+        "Get the path of the top-level directory of the working tree"
+        return Path(self.git.run("rev-parse", "--show-toplevel", git_dir=git_dir))
+
+    def get_remote_url(self, remote="origin", git_dir=None):
+        "Get remote url"
+        try:
+            return self.git.run("remote", "get-url", remote, git_dir=git_dir)
+        except GitException:
+            return None
+
+    def get_main_toplevel(self, git_dir=None):
+        "Get the path of the main working tree (differs from the top-level directory in linked worktrees)"
+        return Path(self.git.run("rev-parse", "--path-format=absolute", "--git-common-dir", git_dir=git_dir)).parent
+
+
+class FileSystemGitBackend(SubprocessGitBackend):
+    """
+    Read-only git queries answered by reading .git/HEAD, the refs
+    and .git/config directly, without forking git.
+    Falls back to the git command for layouts it doesn't understand.
+    """
+
+    def get_current_branch(self, git_dir=None):
+        "Get current branch"
+        try:
+            repo_dir = self.find_repository(git_dir)
+            return read_head(repo_dir)
+        except BackendNotSupported:
+            return super().get_current_branch(git_dir=git_dir)
+
+    def get_toplevel(self, git_dir=None):
+        "Get the path of the top-level directory of the working tree"
+        try:
+            self.find_repository(git_dir)
+            return self.worktree
+        except BackendNotSupported:
+            return super().get_toplevel(git_dir=git_dir)
+
+    def get_remote_url(self, remote="origin", git_dir=None):
+        "Get remote url"
+        try:
+            repo_dir = self.find_repository(git_dir)
+            config = read_config(get_common_dir(repo_dir) / "config")
+        except BackendNotSupported:
+            return super().get_remote_url(remote=remote, git_dir=git_dir)
+        return config.get(f'remote "{remote}"', {}).get("url")
+
+    def get_main_toplevel(self, git_dir=None):
+        "Get the path of the main working tree (differs from the top-level directory in linked worktrees)"
+        try:
+            repo_dir = self.find_repository(git_dir)
+        except BackendNotSupported:
+            return super().get_main_toplevel(git_dir=git_dir)
+        return get_common_dir(repo_dir).parent
+
+    def find_repository(self, git_dir=None):
+        "Find the repository (.git) directory, set the worktree path"
+        if any(key in os.environ for key in GIT_ENVIRON):
+            raise BackendNotSupported()
+        start = git_dir or (self.git.config and self.git.config.git_dir) or Path.cwd()
+        start = Path(start).resolve()
+        if not start.is_dir():
+            raise GitException(f"git error: cannot change to '{start}'")
+        for path in [start] + list(start.parents):
+            dot_git = path / ".git"
+            if dot_git.is_dir():
+                repo_dir = dot_git
+            elif dot_git.is_file():  # worktree or submodule
+                repo_dir = read_gitdir_file(dot_git)
+            else:
+                continue
+            if not (repo_dir / "HEAD").is_file():
+                raise BackendNotSupported()
+            config = read_config(get_common_dir(repo_dir) / "config")
+            core = config.get("core", {})
+            if core.get("bare") == "true" or "worktree" in core or core.get("repositoryformatversion", "0") != "0":
+                raise BackendNotSupported()
+            self.worktree = path
+            return repo_dir
+        raise GitException("git error: not a git repository (or any of the parent directories): .git")
+
+
+def read_gitdir_file(path):
+    "Read a .git file (gitdir: <path>)"
+    content = path.read_text().strip()
+    if not content.startswith("gitdir:"):
+        raise BackendNotSupported()
+    repo_dir = Path(content[len("gitdir:") :].strip())
+    if not repo_dir.is_absolute():
+        repo_dir = path.parent / repo_dir
+    return repo_dir.resolve()
+
+
+def get_common_dir(repo_dir):
+    "Get the directory holding config and shared refs (differs from repo_dir for linked worktrees)"
+    commondir = repo_dir / "commondir"
+    if not commondir.is_file():
+        return repo_dir
+    common_dir = Path(commondir.read_text().strip())
+    if not common_dir.is_absolute():
+        common_dir = repo_dir / common_dir
+    return common_dir.resolve()
+
+
+def read_head(repo_dir):
+    "Get the short name of the branch HEAD points to ('HEAD' if detached)"
+    head = (repo_dir / "HEAD").read_text().strip()
+    if not head.startswith("ref:"):
+        return "HEAD"  # detached
+    ref = head[len("ref:") :].strip()
+    if not ref.startswith("refs/heads/"):
+        raise BackendNotSupported()
+    return ref[len("refs/heads/") :]
+
+
+def read_config(path):
+    "Parse a git config file into a {section: {key: value}} dict"
+    result = {}
+    section = None
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        raise BackendNotSupported()
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        match = re.match(r'^\[\s*([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]$', line)
+        if match:
+            name, subsection = match.groups()
+            section = name.lower() if subsection is None else f'{name.lower()} "{subsection}"'
+            if name.lower() in ("include", "includeif") or name.lower().startswith("includeif"):
+                raise BackendNotSupported()  # included files are not supported
+            result.setdefault(section, {})
+            continue
+        if section is None or line.endswith("\\") or "[" == line[0]:
+            raise BackendNotSupported()
+        key, _, value = line.partition("=")
+        key = key.strip().lower()
+        value = value.strip()
+        if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+            value = value[1:-1]
+        if key == "insteadof" or key == "pushinsteadof":
+            raise BackendNotSupported()  # url rewriting is not supported
+        result[section][key] = value
+    return result
 
 
 class Git:
-    def __init__(self, config):
+    def __init__(self, config, backend=None):
         self.config = config
+        self.cache = {}
+        self.backend = backend or self.get_backend()
+
+    def get_backend(self):
+        "Get the backend for read-only queries (AW_GIT_BACKEND environment variable)"
+        name = os.environ.get(AW_GIT_BACKEND, DEFAULT_BACKEND)
+        if name == SUBPROCESS_BACKEND:
+            return SubprocessGitBackend(self)
+        elif name == FILESYSTEM_BACKEND:
+            return FileSystemGitBackend(self)
+        else:
+            raise GitException(f"Invalid git backend '{name}'. Valid values are {SUBPROCESS_BACKEND} and {FILESYSTEM_BACKEND}")
+
+    def cached(self, key, fn, *args, **kwargs):
+        "Memoize the result of a read-only query"
+        if key not in self.cache:
+            self.cache[key] = fn(*args, **kwargs)
+        return self.cache[key]
+
+    def invalidate(self):
+        "Clear memoized results (after a mutating operation)"
+        self.cache.clear()
 
     def run(self, *args, git_dir=None):
         git_dir = git_dir or (self.config and self.config.git_dir) or None
+        name = f"git {args[0]}" if args else "git"
         if git_dir:
             args = ["git", "-C", git_dir] + list(args)
         else:
             args = ["git"] + list(args)
-        completed_process = subprocess.run(args, capture_output=True)
+        with profiler.span("git", name) as span:
+            completed_process = subprocess.run(args, capture_output=True)
+            span.status = completed_process.returncode
+            span.bytes = len(completed_process.stdout)
         if completed_process.returncode != 0:
             stdout = completed_process.stdout.decode("utf-8")
             stderr = completed_process.stderr.decode("utf-8")
@@ -28,7 +227,10 @@ class Git:
     def run_gh(self, *args, git_dir=None):
         git_dir = git_dir or (self.config and self.config.git_dir) or None
         args = ["gh"] + list(args)
-        completed_process = subprocess.run(args, capture_output=True, cwd=git_dir)
+        with profiler.span("git", " ".join(args[:3])) as span:
+            completed_process = subprocess.run(args, capture_output=True, cwd=git_dir)
+            span.status = completed_process.returncode
+            span.bytes = len(completed_process.stdout)
         if completed_process.returncode != 0:
             stdout = completed_process.stdout.decode("utf-8")
             stderr = completed_process.stderr.decode("utf-8")
@@ -37,49 +239,166 @@ class Git:
 
     def get_current_branch(self):
         "Get current branch"
-        return self.run("rev-parse", "--abbrev-ref", "HEAD")
+        return self.cached("current_branch", self.backend.get_current_branch)
 
     def get_toplevel(self, git_dir=None):
         "Get the path of the top-level directory of the working tree"
-        return Path(self.run("rev-parse", "--show-toplevel", git_dir=git_dir))
+        if git_dir is None and not (self.config and self.config.git_dir):
+            # Depends on the current working directory, don't memoize
+            return self.backend.get_toplevel()
+        return self.cached(("toplevel", str(git_dir)), self.backend.get_toplevel, git_dir=git_dir)
 
     def get_remote_url(self):
         "Get remote url"
-        try:
-            return self.run("remote", "get-url", "origin")
-        except GitException:
-            return None
+        return self.cached("remote_url", self.backend.get_remote_url)
+
+    def get_main_toplevel(self, git_dir=None):
+        "Get the path of the main working tree"
+        return self.backend.get_main_toplevel(git_dir=git_dir)
 
     def checkout(self, *args):
         "Switch branch"
+        self.invalidate()
         return self.run("checkout", *args)
 
     def pull(self):
         "Fetch from remote(if any)"
         if self.get_remote_url():
+            self.invalidate()
             return self.run("pull")
 
     def push(self, *args):
         "Update remote"
+        self.invalidate()
         return self.run("push", *args)
 
-    def create_branch(self, branch_name, base_branch=None):
-        "Create a new branch a switch to it"
-        base_branch = base_branch or self.config.git_base_branch
-        branch_already_exists = False
-        self.checkout(base_branch)
-        self.pull()
+    def is_shallow(self):
+        "Return true if the repository is a shallow clone"
+        return self.cached("shallow", self.run, "rev-parse", "--is-shallow-repository") == "true"
+
+    def fetch_branch(self, branch_name, depth=None, remote="origin"):
+        "Fetch a single branch from the remote (no tags), depth limited only in shallow clones (a full clone stays full)"
+        args = ["fetch", "--no-tags"]
+        if depth and self.is_shallow():
+            args.append(f"--depth={depth}")
+        self.invalidate()
+        return self.run(*args, remote, f"+refs/heads/{branch_name}:refs/remotes/{remote}/{branch_name}")
+
+    def branch_exists(self, branch_name):
+        "Return true if the local branch exists"
         try:
-            self.checkout("-b", branch_name)
+            self.run("rev-parse", "--verify", "--quiet", f"refs/heads/{branch_name}")
+            return True
         except GitException:
-            branch_already_exists = True
+            return False
+
+    def create_branch_from_remote(self, branch_name, base_branch, depth=None):
+        "Create a new branch from the remote base branch and switch to it, fetching only the base branch"
+        if self.branch_exists(branch_name):
             self.checkout(branch_name)
+            return True
+        self.fetch_branch(base_branch, depth=depth)
+        self.checkout("--no-track", "-b", branch_name, f"origin/{base_branch}")
+        return False
+
+    def create_branch(self, branch_name, base_branch=None, fast=None):
+        "Create a new branch a switch to it"
+        base_branch = base_branch or self.config.git_base_branch
+        fast = self.config.git_fast_branch if fast is None else fast
+        branch_already_exists = None
+        if fast and self.get_remote_url():
+            try:
+                branch_already_exists = self.create_branch_from_remote(
+                    branch_name, base_branch, depth=self.config.git_fetch_depth
+                )
+            except GitException:
+                pass  # fallback to checkout and pull
+        if branch_already_exists is None:
+            branch_already_exists = False
+            self.checkout(base_branch)
+            self.pull()
+            try:
+                self.checkout("-b", branch_name)
+            except GitException:
+                branch_already_exists = True
+                self.checkout(branch_name)
         try:
             self.push("--set-upstream", "origin", branch_name)
         except GitException:
             pass
         return branch_already_exists
 
+    def list_worktrees(self):
+        "List the worktrees (path, head and branch)"
+        result = []
+        for block in self.run("worktree", "list", "--porcelain").split("\n\n"):
+            worktree = {"path": None, "head": None, "branch": None}
+            for line in block.splitlines():
+                key, _, value = line.partition(" ")
+                if key == "worktree":
+                    worktree["path"] = Path(value)
+                elif key == "HEAD":
+                    worktree["head"] = value
+                elif key == "branch" and value.startswith("refs/heads/"):
+                    worktree["branch"] = value[len("refs/heads/") :]
+            if worktree["path"]:
+                result.append(worktree)
+        return result
+
+    def get_worktree_dir(self):
+        "Get the directory containing the task worktrees"
+        main_toplevel = self.get_main_toplevel()
+        if self.config.git_worktree_dir:
+            return (main_toplevel / Path(self.config.git_worktree_dir).expanduser()).resolve()
+        return main_toplevel.parent / f"{main_toplevel.name}.worktrees"
+
+    def create_worktree(self, branch_name, base_branch=None):
+        "Create (or reuse) a worktree for a branch, return the worktree path and true if the branch already exists"
+        base_branch = base_branch or self.config.git_base_branch
+        for worktree in self.list_worktrees():
+            if worktree["branch"] == branch_name:
+                return worktree["path"], True
+        path = self.get_worktree_dir() / branch_name
+        self.invalidate()
+        if self.branch_exists(branch_name):
+            self.run("worktree", "add", str(path), branch_name)
+            return path, True
+        start_point = base_branch
+        if self.get_remote_url():
+            try:
+                self.fetch_branch(base_branch, depth=self.config.git_fetch_depth)
+                start_point = f"origin/{base_branch}"
+            except GitException:
+                pass  # create from the local base branch
+        self.run("worktree", "add", "--no-track", "-b", branch_name, str(path), start_point)
+        try:
+            self.run("push", "--set-upstream", "origin", branch_name, git_dir=path)
+        except GitException:
+            pass
+        return path, False
+
+    def delete_branch(self, branch_name, force=False):
+        "Delete a local branch"
+        self.invalidate()
+        return self.run("branch", "-D" if force else "-d", branch_name)
+
+    def list_branches(self):
+        "List local and remote branches with their last commit date"
+        fmt = "%(refname)%00%(refname:short)%00%(committerdate:short)"
+        output = self.run("for-each-ref", f"--format={fmt}", "refs/heads", "refs/remotes")
+        result = []
+        for line in output.splitlines():
+            ref, short_name, date = line.split("\0")
+            if ref.startswith("refs/heads/"):
+                remote = None
+                name = ref[len("refs/heads/") :]
+            else:
+                remote, _, name = ref[len("refs/remotes/") :].partition("/")
+                if name == "HEAD":
+                    continue
+            result.append({"ref": ref, "short_name": short_name, "remote": remote, "name": name, "date": date})
+        return result
+
     def get_github_url(self, branch_name, remote_url=None):
         "Get link to github (if origin is github)"
         url = remote_url or self.get_remote_url()
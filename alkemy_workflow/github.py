@@ -1,25 +1,50 @@
 #!/usr/bin/env python
 
+import os
 import json
 import urllib
-import requests
-from pathlib import Path
+from requests.utils import parse_header_links
 from .exceptions import GitHubException
+from .profiling import profiler
+from .transport import get_transport
 
 REPO_BASE_URL = "https://github.com/"
 SERVER_URL = "https://api.github.com/"
+# Server URL override (e.g. a local stand-in server)
+AW_GITHUB_URL = "AW_GITHUB_URL"
 
 __all__ = ["GitHubClient"]
 
 
+def get_next_link(response):
+    "Next page URL (Link header), None on the last page"
+    for link in parse_header_links(response.headers.get("Link") or ""):
+        if link.get("rel") == "next":
+            return link["url"]
+    return None
+
+
 class GitHubClient:
     def __init__(self, config):
-        self.server = SERVER_URL
+        self.server = (os.environ.get(AW_GITHUB_URL) or SERVER_URL).rstrip("/") + "/"
         self.config = config
 
     def send_request(self, part, method="GET", request_args=None, payload=None, **kwargs):
         "Send HTTP Request to GitHub"
+        return self.get_response(part.format(**kwargs), method, request_args, payload)[0]
+
+    def send_list_request(self, part, **kwargs):
+        "Send HTTP Request to a GitHub list endpoint, return the items of all the pages"
+        result = []
         part = part.format(**kwargs)
+        while part:
+            items, response = self.get_response(part)
+            result.extend(items)
+            part = get_next_link(response)
+        return result
+
+    def get_response(self, part, method="GET", request_args=None, payload=None):
+        "Send HTTP Request to GitHub (part: path or absolute URL), return the payload and the response"
         url = urllib.parse.urljoin(self.server, part)
         headers = {
             "Accept": "application/vnd.github+json",
@@ -28,8 +53,10 @@ class GitHubClient:
         request_args = request_args or dict()
         if payload is not None:
             request_args["json"] = payload
-        response = requests.request(method=method, url=url, headers=headers, **request_args)
-        # self.save_response(response)
+        with profiler.span("github", method, part) as span:
+            response = get_transport().request(method, url, headers=headers, **request_args)
+            span.status = response.status_code
+            span.bytes = len(response.content)
         payload = response.json()
         if self.config.is_verbose():
             print(json.dumps(payload, indent=2))
@@ -39,21 +66,7 @@ class GitHubClient:
                 raise GitHubException(f"GitHub error: {payload['message']}\n{errors}")
             else:
                 raise GitHubException(f"GitHub error: {payload['message']}")
-        return payload
-
-    def save_response(self, response):
-        rqs = response.request
-        path_url = rqs.path_url.strip("/").replace("..", "").split("?")[0] + "." + rqs.method.lower()
-        filename = Path.cwd() / "tests" / "data" / Path(*path_url.split("/"))
-        print(filename)
-        filename.parent.mkdir(parents=True, exist_ok=True)
-        with filename.open("wb") as f:
-            f.write(response.content)
-        headers_filename = filename.parent / (filename.name + ".headers")
-        with headers_filename.open("w") as f:
-            headers = dict(response.headers)
-            headers["__Status__"] = response.status_code
-            json.dump(headers, f, indent=2)
+        return payload, response
 
     def extract_repo(self, repo_url):
         if not repo_url.startswith(REPO_BASE_URL):
@@ -99,10 +112,12 @@ class GitHubClient:
         payload = {"title": title, "head": branch_name, "base": base_branch}
         return self.send_request(f"repos/{repo}/pulls", method="POST", payload=payload)
 
-    def list_pull_request(self, repo_url):
-        "List pull request"
+    def list_pull_request(self, repo_url, state=None):
+        "List pull request (state: open, closed or all)"
         repo = self.extract_repo(repo_url)
-        return self.send_request(f"repos/{repo}/pulls")
+        if state:
+            return self.send_list_request(f"repos/{repo}/pulls?state={state}&per_page=100")
+        return self.send_list_request(f"repos/{repo}/pulls?per_page=100")
 
     def merge_pull_request(self, repo_url, pr_nr, base_branch=None):
         "Create a new pull request"
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+import time
+import threading
+from requests.exceptions import HTTPError
+from O365 import Account, connection  # type: ignore
+from .exceptions import ThrottlingException
+from .profiling import profiler
+
+MAX_BATCH_SIZE = 20
+STATUS_FAILED_DEPENDENCY = 424
+STATUS_TOO_MANY_REQUESTS = 429
+STATUS_SERVICE_UNAVAILABLE = 503
+THROTTLING_STATUS = (STATUS_TOO_MANY_REQUESTS, STATUS_SERVICE_UNAVAILABLE)
+THROTTLING_MAX_RETRIES = 5
+THROTTLING_MAX_WAIT = 60
+IDEMPOTENT_METHODS = ("get", "head", "options", "put", "delete")
+
+__all__ = ["GraphBatch", "GraphRequest", "GraphResponse", "ThrottlingAccount", "ThrottlingConnection"]
+
+
+def get_retry_after(headers, attempt):
+    "Seconds to wait before retrying a throttled request (Retry-After header or exponential backoff)"
+    try:
+        wait = float((headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        wait = 2**attempt
+    return min(max(wait, 0), THROTTLING_MAX_WAIT)
+
+
+def is_retryable(method, status_code):
+    "True if a throttled request can be retried (429 was not processed, 503 only for idempotent methods)"
+    return status_code == STATUS_TOO_MANY_REQUESTS or (
+        status_code == STATUS_SERVICE_UNAVAILABLE and method.lower() in IDEMPOTENT_METHODS
+    )
+
+
+class ThrottlingConnection(connection.Connection):
+    "O365 connection honouring Microsoft Graph throttling (429/503 with Retry-After)"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests_count = 0
+        self.requests_lock = threading.Lock()
+
+    def get_session(self, *args, **kwargs):
+        session = super().get_session(*args, **kwargs)
+        # Throttling responses are retried by _internal_request
+        for adapter in session.adapters.values():
+            retry = getattr(adapter, "max_retries", None)
+            if retry is not None and retry.status_forcelist:
+                status_forcelist = [x for x in retry.status_forcelist if x not in THROTTLING_STATUS]
+                adapter.max_retries = retry.new(status_forcelist=status_forcelist)
+        return session
+
+    def refresh_token(self, *args, **kwargs):
+        with profiler.span("graph", "token refresh"):
+            return super().refresh_token(*args, **kwargs)
+
+    def _internal_request(self, session_obj, url, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            request_kwargs = dict(kwargs)
+            if "headers" in request_kwargs:
+                request_kwargs["headers"] = dict(request_kwargs["headers"])
+            with self.requests_lock:
+                self.requests_count = self.requests_count + 1
+            try:
+                with profiler.span("graph", method.upper(), url) as span:
+                    try:
+                        response = super()._internal_request(session_obj, url, method, *args, **request_kwargs)
+                    except HTTPError as ex:
+                        span.status = getattr(ex.response, "status_code", None)
+                        raise
+                    span.status = response.status_code
+                    span.bytes = len(response.content or b"")
+                return response
+            except HTTPError as ex:
+                status_code = getattr(ex.response, "status_code", None)
+                if status_code not in THROTTLING_STATUS:
+                    raise
+                if not is_retryable(method, status_code) or attempt >= THROTTLING_MAX_RETRIES:
+                    raise ThrottlingException(f"Microsoft Graph request throttled ({status_code}): {url}") from ex
+                time.sleep(get_retry_after(ex.response.headers, attempt))
+                attempt = attempt + 1
+
+
+class ThrottlingAccount(Account):
+    "O365 account using the throttling aware connection"
+
+    connection_constructor = ThrottlingConnection
+
+
+class GraphResponse:
+    "Response to a request sent in a JSON batch"
+
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 300
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code in THROTTLING_STATUS:
+            raise ThrottlingException(f"Microsoft Graph request throttled ({self.status_code})")
+        if not self.ok:
+            message = (self.body or {}).get("error", {}).get("message", "") if isinstance(self.body, dict) else ""
+            raise HTTPError(f"{self.status_code} Graph error: {message}", response=self)
+
+
+class GraphRequest:
+    "A request waiting in a JSON batch"
+
+    def __init__(self, request_id, method, url, body=None, headers=None, depends_on=None, callback=None):
+        self.id = request_id
+        self.method = method.upper()
+        self.url = url
+        self.body = body
+        self.headers = dict(headers or {})
+        self.depends_on = list(depends_on or [])
+        self.callback = callback
+        self.response = None
+
+    def to_json(self, batch_ids):
+        "Batch request item, dependencies outside the batch (already executed) are dropped"
+        data = {"id": self.id, "method": self.method, "url": self.url}
+        headers = dict(self.headers)
+        if self.body is not None:
+            data["body"] = self.body
+            headers.setdefault("Content-Type", "application/json")
+        if headers:
+            data["headers"] = headers
+        depends_on = [x for x in self.depends_on if x in batch_ids]
+        if depends_on:
+            data["dependsOn"] = depends_on
+        return data
+
+
+class GraphBatch:
+    """
+    Collect independent Microsoft Graph requests and send them as JSON batches
+    ($batch, up to 20 requests each). Responses are routed back to the requests
+    (and to their callbacks) when the batch is executed.
+    """
+
+    def __init__(self, con, service_url):
+        self.con = con
+        self.service_url = service_url
+        self.requests = []
+
+    def add(self, method, url, body=None, headers=None, depends_on=None, callback=None):
+        "Add a request (url absolute or relative to the service url), return the GraphRequest"
+        if url.startswith(self.service_url):
+            url = url[len(self.service_url) :]
+        if not url.startswith("/"):
+            url = "/" + url
+        depends_on = [x.id if isinstance(x, GraphRequest) else x for x in (depends_on or [])]
+        request = GraphRequest(str(len(self.requests) + 1), method, url, body, headers, depends_on, callback)
+        self.requests.append(request)
+        return request
+
+    def get(self, url, **kwargs):
+        return self.add("GET", url, **kwargs)
+
+    def patch(self, url, body, **kwargs):
+        return self.add("PATCH", url, body=body, **kwargs)
+
+    def execute(self):
+        "Send the pending requests"
+        pending, self.requests = self.requests, []
+        by_id = dict((request.id, request) for request in pending)
+        for i in range(0, len(pending), MAX_BATCH_SIZE):
+            chunk = []
+            for request in pending[i : i + MAX_BATCH_SIZE]:
+                failed = [x for x in request.depends_on if x in by_id and by_id[x].response is not None and not by_id[x].response]
+                if failed:  # a dependency executed in a previous batch failed
+                    request.response = GraphResponse(STATUS_FAILED_DEPENDENCY)
+                else:
+                    chunk.append(request)
+            attempt = 0
+            while chunk:
+                self.send(chunk)
+                # Retry the throttled requests
+                throttled_ids = set(x.id for x in chunk if is_retryable(x.method, x.response.status_code))
+                throttled = [
+                    x
+                    for x in chunk
+                    if x.id in throttled_ids
+                    or (x.response.status_code == STATUS_FAILED_DEPENDENCY and throttled_ids.intersection(x.depends_on))
+                ]
+                if not throttled_ids or attempt >= THROTTLING_MAX_RETRIES:
+                    break
+                time.sleep(max(get_retry_after(x.response.headers, attempt) for x in throttled if x.id in throttled_ids))
+                for request in throttled:
+                    request.response = None
+                chunk = throttled
+                attempt = attempt + 1
+        for request in pending:
+            if request.callback is not None:
+                request.callback(request.response)
+        return pending
+
+    def send(self, chunk):
+        "Send a single $batch request"
+        batch_ids = set(request.id for request in chunk)
+        payload = {"requests": [request.to_json(batch_ids) for request in chunk]}
+        response = self.con.post(self.service_url + "$batch", data=payload)
+        by_id = dict((request.id, request) for request in chunk)
+        for item in response.json().get("responses", []):
+            request = by_id.get(item.get("id"))
+            if request is not None:
+                request.response = GraphResponse(item.get("status", 500), item.get("headers"), item.get("body"))
+        for request in chunk:
+            if request.response is None:
+                request.response = GraphResponse(500)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
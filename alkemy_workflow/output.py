@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import csv
+import sys
+import json
+import time
+import threading
+
+__all__ = ["RecordWriter", "BufferedWriter", "parse_fields", "get_field", "OUTPUT_FORMATS", "TEXT", "JSONL", "CSV", "TSV"]
+
+TEXT = "text"
+JSONL = "jsonl"
+CSV = "csv"
+TSV = "tsv"
+OUTPUT_FORMATS = (TEXT, JSONL, CSV, TSV)
+# Output buffering: flush when the buffer is full or after the interval (seconds)
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.1
+
+
+def parse_fields(fields):
+    "Parse a comma separated list of fields"
+    if not fields:
+        return None
+    return [x.strip() for x in fields.split(",") if x.strip()]
+
+
+def get_field(item, path):
+    "Get a field value, nested fields and list items are separated by dots (e.g. status.status, assignees.0.id)"
+    value = item
+    for key in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit():
+            value = value[int(key)] if int(key) < len(value) else None
+        else:
+            return None
+    return value
+
+
+class BufferedWriter:
+    """
+    Buffered text stream, the rows are written in large chunks instead of one write per row.
+    The first row is written immediately and the buffered rows are flushed at most interval seconds
+    after they are written (by a timer while no other row arrives), so slow streaming listings still show progress.
+    """
+
+    def __init__(self, stream=None, size=BUFFER_SIZE, interval=FLUSH_INTERVAL):
+        self.stream = stream or sys.stdout
+        self.size = size
+        self.interval = interval
+        self.buffer = []
+        self.length = 0
+        self.last_flush = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.buffer.append(text)
+            self.length = self.length + len(text)
+            elapsed = time.monotonic() - self.last_flush if self.last_flush is not None else None
+            if elapsed is None or self.length >= self.size or elapsed >= self.interval:
+                self.write_buffer()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.interval - elapsed, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.write_buffer()
+
+    def write_buffer(self):
+        "Write the buffered rows (lock held)"
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer:
+            self.stream.write("".join(self.buffer))
+            self.buffer = []
+            self.length = 0
+        self.stream.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RecordWriter:
+    """
+    Write entities as JSON lines, CSV or TSV records, one record per entity.
+    JSON lines records contain all the entity fields (unless fields are selected),
+    CSV/TSV records the selected fields (default_fields if not selected).
+    """
+
+    def __init__(self, output_format, fields=None, default_fields=None, headers=True, stream=None):
+        self.output_format = output_format
+        self.stream = stream or sys.stdout
+        self.writer = None
+        if output_format == JSONL:
+            self.fields = fields
+        else:
+            self.fields = fields or list(default_fields or ["id", "name"])
+            dialect = "excel-tab" if output_format == TSV else "excel"
+            self.writer = csv.writer(self.stream, dialect=dialect, lineterminator="\n")
+            if headers:
+                self.writer.writerow(self.fields)
+
+    def write(self, item):
+        "Write a record"
+        if self.writer is None:
+            record = item if self.fields is None else dict((field, get_field(item, field)) for field in self.fields)
+            self.stream.write(json.dumps(record, default=str) + "\n")
+        else:
+            self.writer.writerow([self.format_value(get_field(item, field)) for field in self.fields])
+
+    def write_all(self, items):
+        "Write the records, return the number of records"
+        count = 0
+        for item in items:
+            self.write(item)
+            count = count + 1
+        return count
+
+    def format_value(self, value):
+        "CSV/TSV value, nested values as JSON"
+        if value is None:
+            return ""
+        elif isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        return value
@@ -1,10 +1,19 @@
 #!/usr/bin/env pytholick
 
 import re
-import fnmatch
 from datetime import datetime
 import click
+import threading
+from functools import partial
+
+try:
+    from functools import cached_property
+except ImportError:
+    from backports.cached_property import cached_property
 from requests.exceptions import HTTPError
+from .graph import GraphBatch
+from .query import QueryEngine
+from .cache import JsonCache
 from .exceptions import (
     SpaceNotFound,
     ListNotFound,
@@ -14,6 +23,26 @@ from .exceptions import (
 
 BRANCH_SEPARATOR = "-"
 TASK_ID_LENGTH = 28
+# Plan tasks delta query (beta endpoint, relative to the protocol url)
+DELTA_PATH = "beta/planner/plans/{plan_id}/tasks/delta"
+# Plan tasks synced less than DELTA_MAX_AGE seconds ago are served from the local copy
+DELTA_MAX_AGE = 30
+STATUS_GONE = 410
+STATUS_NOT_FOUND = 404
+# Fields requested for each entity ($select)
+TASK_SELECT = "id,title,planId,bucketId,assignments,startDateTime,dueDateTime,percentComplete,createdDateTime,orderHint"
+PLAN_SELECT = "id,title,owner,container,createdDateTime"
+BUCKET_SELECT = "id,name,orderHint,planId"
+DETAILS_SELECT = "id,description"
+# Team/plan index time to live (seconds)
+INDEX_TTL = 24 * 60 * 60
+TEAM_ID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+# Account state (current user, organization) time to live (seconds)
+ACCOUNT_TTL = 7 * 24 * 60 * 60
+ACCOUNT_CACHE = "planner_account"
+PLAN_ID_RE = re.compile(r"^[A-Za-z0-9_-]{28}$")
+# Task branch: <task id>-<task name> (task id with digits)
+TASK_BRANCH_RE = re.compile(r"^(?=[A-Za-z_-]{0,27}[0-9])[A-Za-z0-9_-]{28}-")
 
 __all__ = ["PlannerClient"]
 
@@ -27,39 +56,229 @@ __all__ = ["PlannerClient"]
 
 
 class PlannerClient:
+    query_levels = ("space", "list", "task")  # no folders
+
     def __init__(self, config):
         self.config = config
-        self.account = config.get_o365_account(False)
-        self.teams = self.account.teams()
-        self.planner = self.account.planner()
         self.organization = None
+        self.organization_lock = threading.Lock()
+        self.tasks = {}
+        self.bucket_registry = BucketRegistry()
+        self.plans = {}
+        self.plans_lock = threading.Lock()
+        self.user = None
+        self.task_store = TaskStore(self)
+        self.account_cache = JsonCache(ACCOUNT_CACHE, ttl=ACCOUNT_TTL)
+        self.account_key = f"{config.o365_tenant_id}/{config.o365_client_id}"
+        self.index = PlannerIndex(self)
+        self.account_lock = threading.Lock()
+
+    @cached_property
+    def account(self):
+        "O365 account (created on first use, once also when queried concurrently)"
+        with self.account_lock:
+            return self.__dict__.get("account") or self.config.get_o365_account(False)
+
+    @cached_property
+    def teams(self):
+        return self.account.teams()
+
+    @cached_property
+    def planner(self):
+        return self.account.planner()
+
+    def get_account_state(self, key):
+        "Get a value of the account state cached across runs"
+        return self.account_cache.get(self.account_key, {}).get(key)
+
+    def set_account_state(self, key, value):
+        "Set a value of the account state cached across runs"
+        state = dict(self.account_cache.get(self.account_key, {}))
+        state[key] = value
+        self.account_cache.set(self.account_key, state)
+        self.account_cache.save()
+
+    def clear_account_state(self):
+        "Forget the cached account state (e.g. after a new authentication)"
+        self.account_cache.delete(self.account_key)
+        self.account_cache.save()
+
+    def get_requests_count(self):
+        "Number of requests sent"
+        if "account" not in self.__dict__:
+            return 0
+        return getattr(self.account.con, "requests_count", 0)
 
     def get_user(self):
-        user = self.account.get_current_user()
-        return {"id": user.object_id}
+        if self.user is None:
+            self.user = self.get_account_state("user")
+        if self.user is None:
+            user = self.account.get_current_user()
+            self.set_user({"id": user.object_id})
+        return self.user
+
+    def prefetch_user(self, batch):
+        "Add the current user request to a batch (if not already known)"
+        if self.user is None:
+            self.user = self.get_account_state("user")
+        if self.user is None:
+            batch.get("me?$select=id", callback=self.set_user_response)
+
+    def set_user(self, user):
+        self.user = user
+        self.set_account_state("user", user)
+
+    def set_user_response(self, response):
+        if response:
+            self.set_user({"id": response.json()["id"]})
+
+    def batch(self):
+        "Create a Microsoft Graph JSON batch"
+        return GraphBatch(self.account.con, self.account.protocol.service_url)
+
+    def get_values(self, response):
+        "Get the items of a collection response, following the next links"
+        response.raise_for_status()
+        data = response.json()
+        result = list(data.get("value", []))
+        while data.get("@odata.nextLink"):
+            data = self.account.con.get(data["@odata.nextLink"]).json()
+            result.extend(data.get("value", []))
+        return result
+
+    def is_found(self, response):
+        "True if a batch response contains the entity, False if not found (404), raise on the other errors (e.g. throttling)"
+        if response.status_code == STATUS_NOT_FOUND:
+            return False
+        response.raise_for_status()
+        return True
+
+    def build(self, constructor, data, parent=None):
+        "Build an O365 object from Graph data"
+        parent = parent or self.planner
+        return constructor(parent=parent, **{parent._cloud_data_key: data})
 
     def get_team_by_id(self, team_id):
-        "Get a team by id"
-        teams = self.get_organization().get_teams()
-        try:
-            return [team for team in teams if team.get("id") == team_id][0]
-        except Exception:
+        "Get a team by id (checked against the teams fetched by this run, a team deleted or not accessible is not found)"
+        data = self.index.find_team(lambda team: team["id"] == team_id, fresh=True)
+        if data is None:
             raise SpaceNotFound(f"Space '{team_id}' not found")
+        return self.build_team(data)
+
+    def build_team(self, data):
+        "Build a team from the index data"
+        return Team(self, self.build(self.teams.team_constructor, data, parent=self.teams))
 
     def get_plan_by_id(self, plan_id):
         "Get a plan by id"
+        plan = self.load_plans([plan_id])[0]
+        if plan is None:
+            raise ListNotFound(f"List '{plan_id}' not found")
+        return plan
+
+    def load_plans(self, plan_ids):
+        "Get plans by id, fetching the unknown plans and their buckets in a single batch (None for plans not found)"
+        missing = [plan_id for plan_id in dict.fromkeys(plan_ids) if plan_id not in self.plans]
+        if missing:
+            with self.batch() as batch:
+                requests = [
+                    (
+                        batch.get(f"planner/plans/{plan_id}?$select={PLAN_SELECT}"),
+                        batch.get(f"planner/plans/{plan_id}/buckets?$select={BUCKET_SELECT}"),
+                    )
+                    for plan_id in missing
+                ]
+            for plan_request, buckets_request in requests:
+                if not self.is_found(plan_request.response):
+                    continue
+                plan = self.register_plan(self.build(self.planner.plan_constructor, plan_request.response.json()))
+                if buckets_request.response:
+                    buckets = [
+                        self.build(plan.plan.bucket_constructor, data, parent=plan.plan)
+                        for data in self.get_values(buckets_request.response)
+                    ]
+                    self.bucket_registry.set_buckets(plan["id"], buckets)
+        return [self.plans.get(plan_id) for plan_id in plan_ids]
+
+    def list_plan_tasks(self, plan):
+        "List the plan tasks (O365 tasks), incrementally synced with delta queries"
         try:
-            return Plan(self, self.planner.get_plan_by_id(plan_id))
+            tasks = self.task_store.sync(plan["id"])
         except HTTPError:
-            raise ListNotFound(f"List '{plan_id}' not found")
+            return plan.plan.list_tasks() or []  # delta query not available
+        return [self.build(self.planner.task_constructor, data) for data in tasks]
+
+    def get_plans_by_team(self, teams):
+        "Get the plans of several teams in batched requests, return a {team_id: [plans]} dict"
+        with self.batch() as batch:
+            requests = [(team["id"], batch.get(f"groups/{team['id']}/planner/plans?$select={PLAN_SELECT}")) for team in teams]
+        result = {}
+        for team_id, request in requests:
+            plans = [self.build(self.planner.plan_constructor, data) for data in self.get_values(request.response)]
+            self.index.set_plans(team_id, plans)
+            result[team_id] = [self.register_plan(plan) for plan in plans]
+        return result
 
-    def get_task_by_id(self, task_id, plan=None):
-        "Get a task by id"
+    def move_tasks(self, tasks, status, ordered=False):
+        "Move tasks to the status bucket in batched requests (ordered: one after the other), return the moved tasks"
+        with self.batch() as batch:
+            for task in tasks:
+                self.bucket_registry.prefetch(task.plan, batch)
+        moved = []
+        with self.batch() as batch:
+            previous = None
+            for task in tasks:
+                bucket_id = task.plan.get_bucket_id(status)
+                if not bucket_id:
+                    continue
+                previous = batch.patch(
+                    f"planner/tasks/{task.id}",
+                    {"bucketId": bucket_id},
+                    headers={"If-Match": task.task._etag},
+                    depends_on=[previous] if ordered and previous else None,
+                    callback=partial(task.set_status, status, bucket_id, moved),
+                )
+        return moved
+
+    def register_plan(self, plan):
+        "Get the Plan for an O365 plan, reusing the instance already known for the same plan id"
+        with self.plans_lock:
+            if plan.object_id not in self.plans:
+                self.plans[plan.object_id] = Plan(self, plan)
+            return self.plans[plan.object_id]
+
+    def get_task_by_id(self, task_id, plan=None, details=False):
+        "Get a task by id (details: include the task details, e.g. the description)"
         try:
             task_id = task_id.lstrip("#")
-            return Task(self, self.planner.get_task_by_id(task_id), plan=plan)
+            url = f"{self.account.protocol.service_url}planner/tasks/{task_id}?$select={TASK_SELECT}"
+            if details:
+                url = url + "&$expand=details"
+            data = self.account.con.get(url).json()
         except HTTPError:
             raise TaskNotFound(f"Task '{task_id}' not found")
+        self.tasks[task_id] = Task(self, self.build(self.planner.task_constructor, data), plan=plan, details=data.get("details"))
+        return self.tasks[task_id]
+
+    def get_tasks_by_id(self, task_ids):
+        "Get tasks by id in batched requests, return a {task_id: task} dict (None for tasks not found)"
+        task_ids = list(dict.fromkeys(task_id.lstrip("#") for task_id in task_ids))
+        result = dict((task_id, self.tasks.get(task_id)) for task_id in task_ids)
+        missing = [task_id for task_id in task_ids if result[task_id] is None]
+        if missing:
+            with self.batch() as batch:
+                requests = [(task_id, batch.get(f"planner/tasks/{task_id}?$select={TASK_SELECT}")) for task_id in missing]
+            tasks = [
+                (task_id, self.build(self.planner.task_constructor, request.response.json()))
+                for task_id, request in requests
+                if self.is_found(request.response)
+            ]
+            self.load_plans([task.plan_id for _, task in tasks])
+            for task_id, task in tasks:
+                plan = self.plans.get(task.plan_id)
+                if plan is not None:
+                    result[task_id] = self.tasks[task_id] = Task(self, task, plan=plan)
+        return result
 
     def get_task(self, task_id, plan=None, team=None):
         "Get a task by id"
@@ -70,52 +289,75 @@ class PlannerClient:
 
     def get_organization(self, index=0):
         "Get the organization"
-        if self.organization is None:
-            data = {
-                "id": "workspace",
-                "name": "Organization",
-            }
-            try:
-                url = self.account.protocol.service_url + "organization"
-                content = self.account.con.get(url).json()
-                data["id"] = content["value"][index]["id"]
-                data["name"] = content["value"][index]["displayName"]
-            except Exception:
-                pass
-            self.organization = Organization(self, data)
-        return self.organization
-
-    def get_space(self, space_id_or_name):
-        "Get a team by name or id"
+        with self.organization_lock:
+            if self.organization is None:
+                data = self.get_account_state("organization")
+                if data is None:
+                    data = {
+                        "id": "workspace",
+                        "name": "Organization",
+                    }
+                    try:
+                        url = self.account.protocol.service_url + "organization"
+                        content = self.account.con.get(url).json()
+                        data["id"] = content["value"][index]["id"]
+                        data["name"] = content["value"][index]["displayName"]
+                        self.set_account_state("organization", data)
+                    except Exception:
+                        pass
+                self.organization = Organization(self, data)
+            return self.organization
+
+    def get_workspace(self, index=0, full=False):
+        "Get the organization (id and name, full is not relevant)"
+        return self.get_organization(index)
+
+    def get_space(self, space_id_or_name, full=True):
+        "Get a team by name or id (id and name, full is not relevant)"
         return self.get_team(space_id_or_name)
 
     def get_team(self, team_id_or_name):
         "Get a team by name or id"
         if not team_id_or_name:
             return None
-        else:  # get by name/id
-            teams = self.get_organization().get_teams()
-            try:
-                return [team for team in teams if team.get("name") == team_id_or_name or team.get("id") == team_id_or_name][0]
-            except Exception:
+        elif TEAM_ID_RE.match(team_id_or_name):  # get by id
+            return self.get_team_by_id(team_id_or_name)
+        else:  # get by name
+            data = self.index.find_team(lambda team: team["displayName"] == team_id_or_name)
+            if data is None:
                 raise SpaceNotFound(f"Space '{team_id_or_name}' not found")
+            return self.build_team(data)
 
     def get_plan(self, plan_id_or_name, team=None):
         "Get a list by name or id"
         if not plan_id_or_name:
             return None
-        try:
-            return self.get_plan_by_id(plan_id_or_name)
-        except ListNotFound:
-            if not team:
-                raise GenericException("Please specify space")
+        if PLAN_ID_RE.match(plan_id_or_name):  # get by id
             try:
-                plan_id = [
-                    plan.object_id for plan in team.get_plans() if plan.title.lower().strip() == plan_id_or_name.lower().strip()
-                ][0]
-                return self.get_plan_by_id(plan_id)
-            except Exception:
-                raise ListNotFound(f"List '{plan_id_or_name}' not found")
+                return self.get_plan_by_id(plan_id_or_name)
+            except ListNotFound:
+                if not team:
+                    raise
+        if not team:
+            raise GenericException("Please specify space")
+        # get by name
+        name = plan_id_or_name.lower().strip()
+        data = self.index.find_plan(team["id"], lambda plan: plan["title"].lower().strip() == name)
+        if data is None:
+            raise ListNotFound(f"List '{plan_id_or_name}' not found")
+        return self.get_plan_by_id(data["id"])
+
+    def get_list(self, list_id_or_name, space=None, folder=None, full=True):
+        "Get a plan by name or id (the plans are always fetched, full is not relevant)"
+        return self.get_plan(list_id_or_name, team=space)
+
+    def is_id(self, level, value):
+        "True if value looks like an id of the level entities (tasks are always addressed by id)"
+        if level == "space":
+            return bool(TEAM_ID_RE.match(value))
+        elif level == "list":
+            return bool(PLAN_ID_RE.match(value))
+        return True
 
     def query(
         self,
@@ -128,64 +370,206 @@ class PlannerClient:
         hierarchy=False,
     ):
         "Get spaces/folders/lists/tasks"
-        result = []
-        # Organization
-        if hierarchy:
-            organization = self.get_organization()
-            result.append(organization)
-        # Get team
-        team = self.get_team(space)
-        if team and hierarchy:
-            result.append(team)
-        # Get plan
-        plan = self.get_plan(lst, team=team)
-        if plan and hierarchy:
-            if team is None:
-                team = plan.get_team()
-                result.append(team)
-            result.append(plan)
-        # Get task
-        task = self.get_task(task, plan=plan, team=team)
-        if task and hierarchy:
-            append_plan = False
-            append_team = False
-            if plan is None:
-                plan = task.get_plan()
-                append_plan = True
-            if team is None:
-                team = task.get_team()
-                append_team = True
-            if append_team:
-                result.append(team)
-            if append_plan:
-                result.append(plan)
-            result.append(task)
-        # Prepare result
-        if task:
-            # Task subtasks
-            result.append(task)
-        elif plan:
-            # List tasks
-            result.extend(plan.get_tasks())
-        elif team:
-            # Plans
-            result.extend(team.get_plans())
-        else:
-            # Teams
-            result.extend(self.get_organization().get_teams())
-        # Filter result by type
-        if filter_type:
-            result = [x for x in result if x["type"] == filter_type]
-        # Filter result by name
-        if filter_name:
-            match = lambda x: fnmatch.fnmatch(x["name"].lower(), filter_name.lower())
-            result = [x for x in result if match(x)]
-        return result
+        return QueryEngine(self).query(space, folder, lst, task, filter_type, filter_name, hierarchy)
 
     def get_task_from_branch(self, current_branch):
         "Get task ID from branch name"
         return current_branch[0:TASK_ID_LENGTH]
 
+    def is_task_branch(self, branch_name):
+        "True if the branch name starts with a task id"
+        return bool(TASK_BRANCH_RE.match(branch_name))
+
+
+class PlannerIndex:
+    """
+    Team and plan name/id index of the account (tenant/client), persisted with a time to live.
+    Lookups are served from the index, which is refreshed from Graph on a miss.
+    """
+
+    def __init__(self, client, ttl=INDEX_TTL):
+        self.client = client
+        self.cache = JsonCache("planner_index", ttl=ttl)
+        self.refreshed = set()
+
+    def get_key(self, name):
+        "Cache key of the account"
+        return f"{self.client.account_key}/{name}"
+
+    def get_teams(self, refresh=False):
+        "Get the teams index data (id, displayName)"
+        key = self.get_key("teams")
+        teams = None if refresh else self.cache.get(key)
+        if teams is None:
+            self.set_teams(self.client.teams.get_my_teams())
+            teams = self.cache.get(key)
+        return teams
+
+    def set_teams(self, teams):
+        "Update the teams index"
+        key = self.get_key("teams")
+        self.cache.set(key, [{"id": team.object_id, "displayName": team.display_name} for team in teams])
+        self.cache.save()
+        self.refreshed.add(key)
+
+    def find_team(self, match, fresh=False):
+        "Find a team, refresh the index on miss (fresh: refresh before the lookup, once per run)"
+        key = self.get_key("teams")
+        for refresh in (True,) if fresh and key not in self.refreshed else (False, True):
+            if refresh and key in self.refreshed:
+                break
+            for team in self.get_teams(refresh=refresh):
+                if match(team):
+                    return team
+        return None
+
+    def get_plans(self, team_id, refresh=False):
+        "Get the team plans index data (id, title)"
+        key = self.get_key(f"plans/{team_id}")
+        plans = None if refresh else self.cache.get(key)
+        if plans is None:
+            self.set_plans(team_id, self.client.planner.list_group_plans(team_id))
+            plans = self.cache.get(key)
+        return plans
+
+    def set_plans(self, team_id, plans):
+        "Update the team plans index"
+        key = self.get_key(f"plans/{team_id}")
+        self.cache.set(key, [{"id": plan.object_id, "title": plan.title} for plan in plans])
+        self.cache.save()
+        self.refreshed.add(key)
+
+    def find_plan(self, team_id, match):
+        "Find a team plan, refresh the index on miss"
+        for refresh in (False, True):
+            if refresh and self.get_key(f"plans/{team_id}") in self.refreshed:
+                break
+            for plan in self.get_plans(team_id, refresh=refresh):
+                if match(plan):
+                    return plan
+        return None
+
+
+class TaskStore:
+    """
+    Local copy of the plan tasks, kept in sync with Graph delta queries.
+    The delta link is stored per plan, so later syncs only download the changes.
+    The changes made by the client are merged into the copy, which is synced again on the next access.
+    """
+
+    def __init__(self, client, max_age=DELTA_MAX_AGE):
+        self.client = client
+        self.max_age = max_age
+        self.cache = JsonCache("planner_tasks")
+
+    def sync(self, plan_id):
+        "Sync the local copy of the plan tasks, return the tasks data"
+        entry = self.cache.get(plan_id)
+        age = self.cache.get_age(plan_id)
+        if entry is not None and not entry.get("expired") and age is not None and age < self.max_age:
+            return list(entry["tasks"].values())
+        try:
+            entry = self.fetch_changes(plan_id, entry)
+        except HTTPError as ex:
+            if entry is None or getattr(ex.response, "status_code", None) != STATUS_GONE:
+                raise
+            entry = self.fetch_changes(plan_id, None)  # delta link expired, full sync
+        self.cache.set(plan_id, entry)
+        self.cache.save()
+        return list(entry["tasks"].values())
+
+    def fetch_changes(self, plan_id, entry):
+        "Apply the changes since the last sync (everything if entry is None)"
+        if entry is None:
+            entry = {"delta_link": None, "tasks": {}}
+        tasks = dict(entry["tasks"])
+        url = entry["delta_link"] or self.client.account.protocol.protocol_url + DELTA_PATH.format(plan_id=plan_id)
+        delta_link = None
+        while url:
+            data = self.client.account.con.get(url).json()
+            for item in data.get("value", []):
+                if "@removed" in item:
+                    tasks.pop(item["id"], None)
+                else:
+                    tasks.setdefault(item["id"], {}).update(item)
+            url = data.get("@odata.nextLink")
+            delta_link = data.get("@odata.deltaLink", delta_link)
+        return {"delta_link": delta_link, "tasks": tasks}
+
+    def update(self, plan_id, task_id, changes):
+        "Merge the changes of a task updated by the client"
+        with self.cache.lock:
+            entry = self.cache.get(plan_id)
+            if entry is None:
+                return
+            tasks = dict(entry["tasks"])
+            if task_id in tasks:
+                tasks[task_id] = dict(tasks[task_id], **changes)
+            self.cache.set(plan_id, dict(entry, tasks=tasks, expired=True))
+            self.cache.save()
+
+
+class BucketRegistry:
+    "Plan buckets (statuses), fetched once and shared between the Plan instances with the same id"
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_buckets(self, plan, refresh=False):
+        "Get the plan buckets"
+        with self.lock:
+            buckets = None if refresh else self.buckets.get(plan["id"])
+        if buckets is None:  # fetched outside of the lock, the plans can be loaded concurrently
+            buckets = plan.plan.list_buckets() or []
+            self.set_buckets(plan["id"], buckets)
+        return buckets
+
+    def set_buckets(self, plan_id, buckets):
+        "Set the plan buckets"
+        with self.lock:
+            self.buckets[plan_id] = buckets
+
+    def prefetch(self, plan, batch):
+        "Add the plan buckets request to a batch (if not already known)"
+        if plan["id"] not in self.buckets:
+            batch.get(f"planner/plans/{plan['id']}/buckets?$select={BUCKET_SELECT}", callback=partial(self.set_batch_buckets, plan))
+
+    def set_batch_buckets(self, plan, response):
+        if response:
+            buckets = [
+                plan.plan.bucket_constructor(parent=plan.plan, **{plan.plan._cloud_data_key: data})
+                for data in plan.client.get_values(response)
+            ]
+            self.set_buckets(plan["id"], buckets)
+
+    def invalidate(self, plan_id=None):
+        "Forget the buckets of a plan (all plans if plan_id is None)"
+        with self.lock:
+            if plan_id is None:
+                self.buckets.clear()
+            else:
+                self.buckets.pop(plan_id, None)
+
+    def lookup(self, plan, fn):
+        "Lookup a bucket, refresh the plan buckets on miss"
+        result = fn(self.get_buckets(plan))
+        if result is None:
+            result = fn(self.get_buckets(plan, refresh=True))
+        return result
+
+    def get_bucket_id(self, plan, name):
+        "Get bucket id by name"
+        return self.lookup(plan, lambda buckets: dict((x.name, x.object_id) for x in buckets).get(name))
+
+    def get_bucket_name(self, plan, bucket_id):
+        "Get bucket name by id"
+        return self.lookup(plan, lambda buckets: dict((x.object_id, x.name) for x in buckets).get(bucket_id))
+
+    def get_statuses(self, plan):
+        "Get bucket names, in order"
+        return [x.name for x in sorted(self.get_buckets(plan), key=lambda x: x.order_hint, reverse=True)]
+
 
 class Organization(dict):
     def __init__(self, client, data):
@@ -195,9 +579,22 @@ class Organization(dict):
         self["type"] = "Workspace"
         self["label"] = self["type"]
 
-    def get_teams(self, archived=False):
-        "Get teams"
-        return [Team(self.client, team) for team in self.client.teams.get_my_teams()]
+    def get_teams(self, archived=False, plans=False):
+        "Get teams (plans: fetch the plans of all the teams in batched requests)"
+        teams = self.client.teams.get_my_teams()
+        self.client.index.set_teams(teams)
+        result = [Team(self.client, team) for team in teams]
+        if plans and result:
+            plans_by_team = self.client.get_plans_by_team(result)
+            for team in result:
+                team.plans = plans_by_team[team["id"]]
+        return result
+
+    def get_parents(self):
+        return {}
+
+    def get_children(self, deep=False):
+        return {"Space": partial(self.get_teams, plans=deep)}
 
     def __getattr__(self, name):
         if name in self:
@@ -215,7 +612,8 @@ class Organization(dict):
 class Team(dict):
     def __init__(self, client, team):
         self.client = client
-        self.update(team.__dict__)
+        self.team = team
+        self.plans = None  # prefetched by the organization
         self["id"] = team.object_id
         self["name"] = team.display_name
         self["type"] = "Space"
@@ -223,16 +621,29 @@ class Team(dict):
 
     def get_plans(self, archived=False):
         "Get plans"
-        return [Plan(self.client, plan) for plan in self.client.planner.list_group_plans(self["id"])]
+        if self.plans is not None:
+            return self.plans
+        plans = self.client.planner.list_group_plans(self["id"])
+        self.client.index.set_plans(self["id"], plans)
+        return [self.client.register_plan(plan) for plan in plans]
+
+    def get_parents(self):
+        return {}
+
+    def get_children(self, deep=False):
+        return {"List": self.get_plans}
 
     def __getattr__(self, name):
         if name in self:
             return self[name]
-        else:
-            raise AttributeError(f"No such attribute: {name}")
+        # Lazy access to the underlying O365 object
+        team = self.__dict__.get("team")
+        if team is not None and not name.startswith("_") and hasattr(team, name):
+            return getattr(team, name)
+        raise AttributeError(f"No such attribute: {name}")
 
     def __eq__(self, other) -> bool:
-        return other is not None and isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+        return other is not None and isinstance(other, self.__class__) and self["id"] == other["id"]
 
     def __ne__(self, other) -> bool:
         return not self.__eq__(other)
@@ -242,52 +653,77 @@ class Plan(dict):
     def __init__(self, client, plan):
         self.client = client
         self.plan = plan
-        self.update(plan.__dict__)
         self["id"] = plan.object_id
-        self["name"] = plan.title
+        self["name"] = self["title"] = plan.title
+        self["group_id"] = plan.group_id
         self["type"] = "List"
         self["label"] = self["type"]
-        self.buckets = dict([(x.object_id, x.name) for x in self.plan.list_buckets()])
 
     def get_tasks(self, include_closed=False):
-        return [Task(self.client, task, plan=self) for task in self.plan.list_tasks()]
+        return [Task(self.client, task, plan=self) for task in self.client.list_plan_tasks(self)]
+
+    def get_all_tasks(self, include_closed=True):
+        "Get all the plan tasks"
+        return self.get_tasks(include_closed=include_closed)
+
+    @property
+    def buckets(self):
+        "Bucket id => name"
+        return dict((x.object_id, x.name) for x in self.client.bucket_registry.get_buckets(self))
 
     def get_statuses(self):
-        return [x.name for x in sorted(self.plan.list_buckets(), key=lambda x: x.order_hint, reverse=True)]
+        return self.client.bucket_registry.get_statuses(self)
 
     def get_bucket_id(self, status):
-        buckets = dict((x.name, x.object_id) for x in self.plan.list_buckets())
-        return buckets.get(status)
+        return self.client.bucket_registry.get_bucket_id(self, status)
+
+    def get_bucket_name(self, bucket_id):
+        return self.client.bucket_registry.get_bucket_name(self, bucket_id)
 
     def get_team(self):
         return self.client.get_team_by_id(self["group_id"])
 
+    def get_parents(self):
+        "The team is looked up in the index"
+        return {"space": self.get_team}
+
+    def get_children(self, deep=False):
+        return {"Task": self.get_tasks}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
-        else:
-            raise AttributeError(f"No such attribute: {name}")
+        # Lazy access to the underlying O365 object
+        plan = self.__dict__.get("plan")
+        if plan is not None and not name.startswith("_") and hasattr(plan, name):
+            return getattr(plan, name)
+        raise AttributeError(f"No such attribute: {name}")
 
     def __eq__(self, other) -> bool:
-        return other is not None and isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+        return other is not None and isinstance(other, self.__class__) and self["id"] == other["id"]
 
     def __ne__(self, other) -> bool:
         return not self.__eq__(other)
 
 
 class Task(dict):
-    def __init__(self, client, task, plan=None):
+    def __init__(self, client, task, plan=None, details=None):
         self.client = client
         self.task = task
-        self.update(task.__dict__)
+        self.details = details
         self["id"] = task.object_id
         self["task_id"] = task.object_id
-        self["name"] = task.title
+        self["name"] = self["title"] = task.title
+        self["plan_id"] = task.plan_id
+        self["bucket_id"] = task.bucket_id
+        self["assignments"] = task.assignments or {}
+        self["start_date_time"] = task.start_date_time
+        self["percent_complete"] = task.percent_complete
         self["type"] = "Task"
         if plan is None:
             plan = self.client.get_plan_by_id(self["plan_id"])
         self["plan"] = plan
-        self["label"] = self["status"] = plan.buckets[self.bucket_id]
+        self["label"] = self["status"] = plan.get_bucket_name(self.bucket_id) or "-"
         self["folder"] = {"name": "-"}
         self["list"] = {"name": plan.title}
         self["assignees"] = list(self.assignments.keys())
@@ -318,16 +754,39 @@ class Task(dict):
             response = self.task.con.patch(url, data=data, headers={"If-Match": self.task._etag, "Prefer": "return=representation"})
             if not response:
                 return False
+            changes = dict(data)
+            try:
+                changes.update(response.json())  # updated task (return=representation)
+            except ValueError:
+                pass
+            self.client.task_store.update(self["plan_id"], self["id"], changes)
             return True
 
+    def set_status(self, status, bucket_id, moved, response):
+        "Set the task status after a batched bucket move"
+        if response:
+            self["label"] = self["status"] = status
+            self["bucket_id"] = bucket_id
+            self.client.task_store.update(self["plan_id"], self["id"], {"bucketId": bucket_id})
+            moved.append(self)
+
+    def get_details(self):
+        "Get the task details (already loaded if the task was fetched with details)"
+        data = self.__dict__.get("details")
+        if data is None:
+            url = f"{self.client.account.protocol.service_url}planner/tasks/{self['id']}/details?$select={DETAILS_SELECT}"
+            data = self.client.account.con.get(url).json()
+        return self.task.task_details_constructor(parent=self.task, **{self.task._cloud_data_key: data})
+
     def post_task_comment(self, comment_text):
         "Add a comment in the task description"
-        details = self.task.get_details()
+        details = self.get_details()
         if details.description:
             description = f"{details.description}\n{comment_text}"
         else:
             description = comment_text
         details.update(description=description)
+        self.details = None
 
     def start_task(self, show_warnings=False):
         "Start working on a task"
@@ -336,6 +795,10 @@ class Task(dict):
         # Start date
         if not self.get("start_date_time"):
             task_update["start_date_time"] = datetime.utcnow()
+        # Fetch the current user and the plan buckets in a single batch
+        with self.client.batch() as batch:
+            self.client.prefetch_user(batch)
+            self.client.bucket_registry.prefetch(self.plan, batch)
         # Task assignee
         current_user = self.client.get_user()
         if current_user["id"] not in self.assignments.keys():
@@ -397,14 +860,25 @@ class Task(dict):
         "Get list (plan)"
         return self.get_plan()
 
+    def get_parents(self):
+        "The plan is embedded, the team is looked up in the index"
+        return {"space": self.get_team, "list": self.get_plan()}
+
+    def get_children(self, deep=False):
+        # No subtasks, a task query returns the task itself
+        return {} if deep else {"Task": lambda: [self]}
+
     def __getattr__(self, name):
         if name in self:
             return self[name]
-        else:
-            raise AttributeError(f"No such attribute: {name}")
+        # Lazy access to the underlying O365 object
+        task = self.__dict__.get("task")
+        if task is not None and not name.startswith("_") and hasattr(task, name):
+            return getattr(task, name)
+        raise AttributeError(f"No such attribute: {name}")
 
     def __eq__(self, other) -> bool:
-        return other is not None and isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+        return other is not None and isinstance(other, self.__class__) and self["id"] == other["id"]
 
     def __ne__(self, other) -> bool:
         return not self.__eq__(other)
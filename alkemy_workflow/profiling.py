@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import math
+import time
+import threading
+import urllib.parse
+from contextlib import contextmanager
+
+__all__ = ["Profiler", "Span", "profiler", "get_template"]
+
+# Critical path spans shown (the slowest)
+CRITICAL_PATH_LIMIT = 15
+# Path segments containing a digit are ids (ClickUp/Graph ids, task ids, branch names), except API versions
+ID_SEGMENT_RE = re.compile(r"^(?!v\d+(\.\d+)*$)(?=.*\d)[^/]+$")
+
+
+def get_template(url):
+    "URL template: no scheme/host/query string, ids replaced by {id} (e.g. list/{id}/task)"
+    path = urllib.parse.urlparse(url).path.strip("/")
+    return "/".join("{id}" if ID_SEGMENT_RE.match(x) else x for x in path.split("/"))
+
+
+def get_percentile(values, percentile):
+    "Nearest-rank percentile"
+    values = sorted(values)
+    return values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
+
+
+class Span:
+    "A timed operation (HTTP request, subprocess)"
+
+    def __init__(self, category, name):
+        self.category = category
+        self.name = name
+        self.status = None
+        self.bytes = 0
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def endpoint(self):
+        return f"{self.category} {self.name}"
+
+
+class Profiler:
+    """
+    Collect the spans of the HTTP requests and subprocesses of a command.
+    Disabled by default (the spans are timed but not recorded).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def enable(self):
+        "Start recording"
+        with self.lock:
+            self.enabled = True
+            self.spans = []
+            self.start_time = time.perf_counter()
+
+    def disable(self):
+        "Stop recording"
+        self.enabled = False
+
+    @contextmanager
+    def span(self, category, name, url=None):
+        "Time an operation, url (if any) is templated and appended to the name"
+        span = Span(category, f"{name} {get_template(url)}" if url is not None and self.enabled else name)
+        try:
+            yield span
+        except BaseException as ex:
+            if span.status is None:
+                span.status = type(ex).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            if self.enabled:
+                with self.lock:
+                    self.spans.append(span)
+
+    def get_summary(self):
+        "Count, total time, p95 time and bytes per endpoint, slowest first"
+        endpoints = {}
+        for span in self.spans:
+            endpoints.setdefault(span.endpoint, []).append(span)
+        result = [
+            {
+                "endpoint": endpoint,
+                "count": len(spans),
+                "total": sum(x.duration for x in spans),
+                "p95": get_percentile([x.duration for x in spans], 95),
+                "bytes": sum(x.bytes or 0 for x in spans),
+            }
+            for endpoint, spans in endpoints.items()
+        ]
+        return sorted(result, key=lambda x: x["total"], reverse=True)
+
+    def get_critical_path(self):
+        "Spans the command waited for: from the last to end, the span ending last before the previous one started"
+        result = []
+        spans = sorted(self.spans, key=lambda x: x.end)
+        limit = math.inf
+        while spans:
+            spans = [x for x in spans if x.end <= limit]
+            if not spans:
+                break
+            span = spans.pop()
+            result.append(span)
+            limit = span.start
+        return list(reversed(result))
+
+    def format_summary(self):
+        "Summary lines"
+        wall = time.perf_counter() - self.start_time
+        lines = [f"Profile: {len(self.spans)} spans, {wall:.2f}s", ""]
+        fmt = "{endpoint:60.60} {count:>6} {total:>9} {p95:>9} {bytes:>10}"
+        lines.append(fmt.format(endpoint="Endpoint", count="Count", total="Total", p95="p95", bytes="Bytes"))
+        lines.append("-" * 98)
+        for row in self.get_summary():
+            lines.append(fmt.format(**dict(row, total=f"{row['total']:.3f}s", p95=f"{row['p95']:.3f}s")))
+        critical_path = self.get_critical_path()
+        waited = sum(x.duration for x in critical_path)
+        lines.append("")
+        lines.append(f"Critical path: {waited:.2f}s of {wall:.2f}s waiting for {len(critical_path)} spans")
+        slowest = sorted(critical_path, key=lambda x: x.duration)[-CRITICAL_PATH_LIMIT:]
+        for span in sorted(slowest, key=lambda x: x.start):
+            lines.append(f"  {span.start - self.start_time:8.3f}s {span.duration:8.3f}s  {span.endpoint} ({span.status})")
+        return lines
+
+    def get_trace(self):
+        "Chrome trace (chrome://tracing, Perfetto) of the spans"
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start - self.start_time) * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": {"status": span.status, "bytes": span.bytes},
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_trace(self, path):
+        "Write the Chrome trace JSON file"
+        with open(path, "w") as f:
+            json.dump(self.get_trace(), f, default=str)
+
+
+profiler = Profiler()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+
+import re
+import fnmatch
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+__all__ = ["QueryEngine", "NavigationCache", "TreeWalker", "LEVELS", "lookahead"]
+
+# Hierarchy levels, from the top
+LEVELS = ("space", "folder", "list", "task")
+MAX_WORKERS = 8
+# Background prefetch of the picker levels
+PREFETCH_WORKERS = 4
+PREFETCH_LIMIT = 20
+
+
+class QueryEngine:
+    """
+    Backend-agnostic query planner.
+
+    A query (space, folder, list, task, filters, hierarchy) is turned into the fetches
+    it actually needs: entities given by id are fetched concurrently, entities given by name
+    wait for their parents, parents already embedded in a fetched entity are not fetched again,
+    and the fetches that can only produce filtered out types are skipped.
+    Residual filters are applied to the result in a single pass.
+
+    The backend (ClickUpClient, PlannerClient) implements the primitive fetches:
+    query_levels, is_id(level, value), get_workspace(full), get_space(value, full),
+    get_folder(value, space, full), get_list(value, space, folder, full), get_task(value).
+    The entities that are not rendered (the parent scopes of a name lookup, the target of a query
+    without hierarchy) are resolved with full=False: a name can then be resolved to an id without fetching the entity.
+    The entities implement get_parents() ({level: entity or fetch function})
+    and get_children(deep) ({type: fetch function}, deep: the children will be walked too).
+    """
+
+    def __init__(self, backend, max_workers=MAX_WORKERS):
+        self.backend = backend
+        self.max_workers = max_workers
+
+    def query(
+        self,
+        space=None,
+        folder=None,
+        lst=None,
+        task=None,
+        filter_type=None,
+        filter_name=None,
+        hierarchy=False,
+    ):
+        "Get spaces/folders/lists/tasks"
+        return list(self.iterate(space, folder, lst, task, filter_type, filter_name, hierarchy))
+
+    def iterate(
+        self,
+        space=None,
+        folder=None,
+        lst=None,
+        task=None,
+        filter_type=None,
+        filter_name=None,
+        hierarchy=False,
+    ):
+        "Get spaces/folders/lists/tasks lazily, the items are yielded as soon as they are fetched"
+        match = self.matcher(filter_type, filter_name)
+        for _, item in self.execute(space, folder, lst, task, filter_type, hierarchy):
+            if match(item):
+                yield item
+
+    def walk(
+        self,
+        space=None,
+        folder=None,
+        lst=None,
+        task=None,
+        filter_type=None,
+        filter_name=None,
+        hierarchy=False,
+        depth=None,
+    ):
+        "Get spaces/folders/lists/tasks and their descendants (up to depth levels), yield (item, level, is_last) in tree order"
+        match = self.matcher(filter_type, filter_name)
+        deep = depth is None or depth > 1
+        rows = self.execute(space, folder, lst, task, filter_type, hierarchy, deep=deep)
+        level = 0
+        for is_ancestor, item in rows:
+            if not is_ancestor:
+                # First child, the remaining children are walked lazily
+                children = itertools.chain([item], (x for _, x in rows))
+                walker = TreeWalker(max_workers=self.max_workers, depth=depth)
+                yield from walker.walk((x for x in children if match(x)), level=level)
+                break
+            elif match(item):
+                yield item, level, True
+                level = level + 1
+
+    def execute(self, space=None, folder=None, lst=None, task=None, filter_type=None, hierarchy=False, deep=False):
+        "Fetch the hierarchy (from the workspace to the target, if enabled) and the target children, yield (is_ancestor, item)"
+        args = dict(
+            (level, value)
+            for level, value in zip(LEVELS, (space, folder, lst, task))
+            if value and level in self.backend.query_levels
+        )
+        levels = [level for level in LEVELS if level in args]
+        target = levels[-1] if levels else None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            workspace = executor.submit(self.backend.get_workspace, full=hierarchy) if hierarchy or target is None else None
+            resolved = self.resolve_all(executor, args, self.get_dependencies(args, target), full=hierarchy)
+            entity = resolved[target] if target else workspace.result()
+            # Children of the target (independent fetches)
+            children = [
+                executor.submit(fetch)
+                for item_type, fetch in entity.get_children(deep=deep).items()
+                if not filter_type or item_type == filter_type
+            ]
+            # Hierarchy, from the workspace to the target
+            if hierarchy:
+                ancestors = [workspace] + self.get_ancestors(executor, args, resolved, entity, target)
+                for item in ancestors:
+                    yield True, item.result() if isinstance(item, Future) else item
+                if target:
+                    yield True, entity
+            for future in children:
+                for item in future.result():
+                    yield False, item
+
+    def get_dependencies(self, args, target):
+        "Levels to be resolved before the target can be fetched, {level: [parent levels]}"
+        dependencies = {}
+        pending = [target] if target else []
+        while pending:
+            level = pending.pop()
+            if self.backend.is_id(level, args[level]):
+                dependencies[level] = []  # fetched by id, no parents required
+            else:
+                dependencies[level] = [x for x in LEVELS[: LEVELS.index(level)] if x in args]
+                pending.extend(x for x in dependencies[level] if x not in dependencies)
+        return dependencies
+
+    def resolve_all(self, executor, args, dependencies, full=True):
+        "Resolve the levels, the levels whose parents are already resolved concurrently"
+        resolved = {}
+        while len(resolved) < len(dependencies):
+            ready = [
+                level
+                for level in LEVELS
+                if level in dependencies and level not in resolved and all(x in resolved for x in dependencies[level])
+            ]
+            futures = [(level, executor.submit(self.resolve, level, args[level], resolved, full)) for level in ready]
+            for level, future in futures:
+                resolved[level] = future.result()
+        return resolved
+
+    def resolve(self, level, value, resolved, full=True):
+        "Fetch a level entity by id or name"
+        if level == "space":
+            return self.backend.get_space(value, full=full)
+        elif level == "folder":
+            return self.backend.get_folder(value, space=resolved.get("space"), full=full)
+        elif level == "list":
+            return self.backend.get_list(value, space=resolved.get("space"), folder=resolved.get("folder"), full=full)
+        else:
+            return self.backend.get_task(value)
+
+    def get_ancestors(self, executor, args, resolved, entity, target):
+        "Get the target ancestors (entities or futures), reusing the parents embedded in the target"
+        result = []
+        parents = entity.get_parents() if target else {}
+        for level in LEVELS[: LEVELS.index(target)] if target else []:
+            parent = parents.get(level)
+            if level in resolved:
+                parent = resolved[level]
+            elif level in args:
+                # Requested but not required to fetch the target
+                if parent is None or callable(parent) or args[level] not in (parent.get("id"), parent.get("name")):
+                    parent = executor.submit(self.resolve, level, args[level], resolved)
+            elif callable(parent):
+                parent = executor.submit(parent)
+            if parent is not None:
+                result.append(parent)
+        return result
+
+    def matcher(self, filter_type=None, filter_name=None):
+        "Get a function matching the items by type and name (fnmatch pattern, case insensitive)"
+        pattern = re.compile(fnmatch.translate(filter_name.lower())) if filter_name else None
+        return lambda x: (
+            x is not None
+            and (not filter_type or x["type"] == filter_type)
+            and (pattern is None or pattern.match(x["name"].lower()) is not None)
+        )
+
+    def filter(self, items, filter_type=None, filter_name=None):
+        "Filter the items by type and name in a single pass"
+        match = self.matcher(filter_type, filter_name)
+        return [x for x in items if match(x)]
+
+
+def lookahead(iterable):
+    "Yield (item, next_item) pairs, next_item is None for the last item"
+    iterator = iter(iterable)
+    for item in iterator:
+        for next_item in iterator:
+            yield item, next_item
+            item = next_item
+        yield item, None
+
+
+class TreeWalker:
+    """
+    Walk the hierarchy below some items with a bounded worker pool.
+    The children are fetched breadth-first as soon as their parent is known,
+    the rows are yielded in tree order as soon as each branch is complete.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, depth=None):
+        self.max_workers = max_workers
+        self.depth = depth
+        self.pending = {}
+        self.closed = False
+
+    def walk(self, items, level=0):
+        "Yield (item, level, is_last) for the items (any iterable) and their descendants"
+        self.closed = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self.executor = executor
+            try:
+                yield from self.rows(self.scheduled(items, 1), level)
+            finally:
+                self.closed = True
+                for futures in list(self.pending.values()):
+                    for future in futures:
+                        future.cancel()
+
+    def scheduled(self, items, depth):
+        "Start fetching the children of each item as soon as it is known"
+        for item in items:
+            self.schedule([item], depth)
+            yield item
+
+    def schedule(self, items, depth):
+        "Start fetching the children of the items"
+        if self.closed or (self.depth is not None and depth >= self.depth):
+            return
+        for item in items:
+            fetches = item.get_children(deep=True).values()
+            self.pending[id(item)] = [self.executor.submit(self.fetch, fetch, depth) for fetch in fetches]
+
+    def fetch(self, fetch, depth):
+        children = fetch()
+        self.schedule(children, depth + 1)  # before returning, so the rows always find the pending fetches
+        return children
+
+    def rows(self, items, level):
+        for item, next_item in lookahead(items):
+            yield item, level, next_item is None
+            futures = self.pending.pop(id(item), [])
+            children = [x for future in futures for x in future.result()]
+            if children:
+                yield from self.rows(children, level + 1)
+
+
+class NavigationCache:
+    """
+    Hierarchy query results keyed by (space, folder, list, task), for interactive navigation.
+    The levels the user may open next are prefetched in the background (bounded concurrency).
+    """
+
+    def __init__(self, client, max_workers=PREFETCH_WORKERS, limit=PREFETCH_LIMIT):
+        self.client = client
+        self.limit = limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def fetch(self, key):
+        space, folder, lst, task = key
+        return self.client.query(space=space, folder=folder, lst=lst, task=task, hierarchy=True)
+
+    def get(self, key):
+        "Get the query result, waiting for the prefetch if already running"
+        with self.lock:
+            future = self.results.get(key)
+            if future is not None and future.cancel():  # still queued, fetch now
+                future = None
+            if future is None:
+                future = self.results[key] = Future()
+                future.set_running_or_notify_cancel()
+                pending = True
+            else:
+                pending = False
+        if pending:
+            try:
+                future.set_result(self.fetch(key))
+            except Exception as ex:
+                future.set_exception(ex)
+        try:
+            return future.result()
+        except Exception:
+            with self.lock:
+                self.results.pop(key, None)  # don't cache the failures
+            raise
+
+    def prefetch(self, keys):
+        "Prefetch in the background (the prefetches not started yet are replaced)"
+        with self.lock:
+            for key, future in list(self.results.items()):
+                if future.cancel():
+                    del self.results[key]
+            for key in list(dict.fromkeys(keys))[: self.limit]:
+                if key not in self.results:
+                    self.results[key] = self.executor.submit(self.fetch, key)
+
+    def close(self):
+        "Stop the pending prefetches"
+        with self.lock:
+            for future in self.results.values():
+                future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+import requests
+from pathlib import Path
+from requests.structures import CaseInsensitiveDict
+from .exceptions import TransportException
+
+__all__ = [
+    "get_transport",
+    "set_transport",
+    "LiveTransport",
+    "RecordingTransport",
+    "ReplayTransport",
+    "Cassette",
+    "TRANSPORT_MODES",
+    "LIVE",
+    "RECORD",
+    "REPLAY",
+]
+
+AW_TRANSPORT = "AW_TRANSPORT"
+AW_CASSETTE = "AW_CASSETTE"
+AW_REPLAY_SPEED = "AW_REPLAY_SPEED"
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+TRANSPORT_MODES = (LIVE, RECORD, REPLAY)
+CASSETTE_FILE = "interactions.jsonl"
+
+transports = {}
+transports_lock = threading.Lock()
+
+
+def set_transport(mode, cassette=None, speed=None):
+    "Select the transport (AW_TRANSPORT, AW_CASSETTE, AW_REPLAY_SPEED environment variables)"
+    os.environ[AW_TRANSPORT] = mode
+    if cassette is not None:
+        os.environ[AW_CASSETTE] = str(cassette)
+    if speed is not None:
+        os.environ[AW_REPLAY_SPEED] = str(speed)
+
+
+def get_transport():
+    "Get the transport selected by the environment variables (shared by the clients)"
+    mode = os.environ.get(AW_TRANSPORT) or LIVE
+    cassette = os.environ.get(AW_CASSETTE)
+    speed = os.environ.get(AW_REPLAY_SPEED)
+    key = (mode, cassette, speed)
+    with transports_lock:
+        if key not in transports:
+            if mode == LIVE:
+                transports[key] = LiveTransport()
+            elif mode not in TRANSPORT_MODES:
+                raise TransportException(f"Invalid transport '{mode}'. Valid values are {', '.join(TRANSPORT_MODES)}")
+            elif not cassette:
+                raise TransportException(f"Missing cassette directory ({AW_CASSETTE} environment variable)")
+            elif mode == RECORD:
+                transports[key] = RecordingTransport(Cassette(cassette))
+            else:
+                try:
+                    speed = float(speed) if speed else 1.0
+                except ValueError:
+                    raise TransportException(f"Invalid replay speed '{speed}'")
+                transports[key] = ReplayTransport(Cassette(cassette), speed)
+        return transports[key]
+
+
+class Cassette:
+    """
+    Recorded request/response pairs (<path>/interactions.jsonl, one interaction per line).
+    The request headers (credentials) are not recorded.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.filename = self.path / CASSETTE_FILE
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+
+    @classmethod
+    def get_key(cls, method, url, payload=None):
+        "Interaction key: method, url (with the query string) and JSON body"
+        body = json.dumps(payload, sort_keys=True) if payload is not None else ""
+        return hashlib.sha1(f"{method.upper()} {url}\n{body}".encode("utf-8")).hexdigest()
+
+    def load(self):
+        "Load the interactions (in recording order)"
+        result = []
+        try:
+            with self.filename.open("r") as f:
+                for line in f:
+                    if line.strip():
+                        result.append(json.loads(line))
+        except OSError as ex:
+            raise TransportException(f"Cassette not found: {self.filename}") from ex
+        return result
+
+    def append(self, method, url, payload, response, latency):
+        "Record an interaction"
+        try:
+            content, encoding = response.content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            content, encoding = base64.b64encode(response.content).decode("ascii"), "base64"
+        interaction = {
+            "key": self.get_key(method, url, payload),
+            "method": method.upper(),
+            "url": url,
+            "payload": payload,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "content": content,
+            "encoding": encoding,
+            "latency": latency,
+            "offset": time.monotonic() - self.start_time - latency,
+        }
+        with self.lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with self.filename.open("a") as f:
+                f.write(json.dumps(interaction, default=str) + "\n")
+
+
+class ReplayResponse:
+    "Recorded response"
+
+    def __init__(self, interaction):
+        self.url = interaction["url"]
+        self.status_code = interaction["status"]
+        self.headers = CaseInsensitiveDict(interaction["headers"])
+        if interaction.get("encoding") == "base64":
+            self.content = base64.b64decode(interaction["content"])
+        else:
+            self.content = interaction["content"].encode("utf-8")
+        self.encoding = "utf-8"
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    @property
+    def text(self):
+        return str(self.content, self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class LiveTransport:
+    "HTTP requests"
+
+    def request(self, method, url, **kwargs):
+        return requests.request(method=method, url=url, **kwargs)
+
+
+class RecordingTransport(LiveTransport):
+    "HTTP requests, recorded (with their latency) in a cassette"
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+
+    def request(self, method, url, **kwargs):
+        start_time = time.perf_counter()
+        response = super().request(method, url, **kwargs)
+        self.cassette.append(method, url, kwargs.get("json"), response, time.perf_counter() - start_time)
+        return response
+
+
+class ReplayTransport:
+    """
+    Responses served from a cassette, no network.
+    Repeated requests get the recorded responses in order (the last one when exhausted).
+    A request whose body was not recorded (e.g. a timestamp in the payload) gets the next unused
+    response recorded for the same method and url.
+    Each response is delayed by the recorded latency multiplied by speed (0: no delay).
+    """
+
+    def __init__(self, cassette, speed=1.0):
+        self.cassette = cassette
+        self.speed = speed
+        self.interactions = cassette.load()
+        self.by_key = {}
+        self.by_request = {}
+        for position, interaction in enumerate(self.interactions):
+            self.by_key.setdefault(interaction["key"], []).append(position)
+            self.by_request.setdefault((interaction["method"], interaction["url"]), []).append(position)
+        self.used = set()
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        key = self.cassette.get_key(method, url, kwargs.get("json"))
+        with self.lock:
+            positions = self.by_key.get(key) or self.by_request.get((method.upper(), url))
+            if not positions:
+                raise TransportException(f"Request not recorded in the cassette: {method.upper()} {url}")
+            position = next((x for x in positions if x not in self.used), positions[-1])
+            self.used.add(position)
+        interaction = self.interactions[position]
+        if self.speed:
+            time.sleep(interaction["latency"] * self.speed)
+        return ReplayResponse(interaction)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import click
+from .suite import Suite, compare, REPEAT, THRESHOLD, MEMORY_THRESHOLD
+
+
+@click.command()
+@click.option("--scale", help="Workspace size, fraction of 50 spaces/2,000 lists/100k tasks", type=float, default=1.0)
+@click.option("--repeat", help="Timed runs of each benchmark (best of)", type=click.IntRange(min=1), default=REPEAT)
+@click.option("--filter", "pattern", help="Run the benchmarks matching the pattern, e.g. 'query.*'")
+@click.option("--memory/--nomemory", default=True, help="Measure the peak memory (tracemalloc)")
+@click.option("--save", help="Save the results (JSON) as a baseline", type=click.Path(dir_okay=False, writable=True))
+@click.option("--baseline", help="Compare with a baseline (JSON)", type=click.Path(exists=True, dir_okay=False))
+@click.option("--threshold", help="Allowed slowdown over the baseline", type=float, default=THRESHOLD, show_default=True)
+@click.option("--memory-threshold", help="Allowed peak memory growth over the baseline", type=float, default=MEMORY_THRESHOLD)
+def main(scale, repeat, pattern, memory, save, baseline, threshold, memory_threshold):
+    "Entity and query layer benchmarks on a synthetic workspace"
+    suite = Suite(scale=scale, repeat=repeat, memory=memory)
+    click.echo(f"Workspace: {suite.sizes['spaces']} spaces, {suite.sizes['lists']} lists, {suite.sizes['tasks']} tasks")
+    fmt = "{name:45} {time:>12} {peak:>12}"
+    click.echo(fmt.format(name="Benchmark", time="Time", peak="Peak"))
+    click.echo("-" * 71)
+    results = suite.run(pattern)
+    for name, result in results.items():
+        peak = f"{result['peak'] / 1024 / 1024:.1f}MB" if "peak" in result else "-"
+        click.echo(fmt.format(name=name, time=f"{result['time'] * 1000:.1f}ms", peak=peak))
+    if save:
+        with open(save, "w") as f:
+            json.dump({"sizes": suite.sizes, "results": results}, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            reference = json.load(f)
+        if reference.get("sizes") != suite.sizes:
+            raise click.ClickException(f"The baseline was measured on a different workspace size: {reference.get('sizes')}")
+        regressions = compare(results, reference["results"], threshold, memory_threshold)
+        for regression in regressions:
+            click.secho(f"Regression: {regression}", fg="red", err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
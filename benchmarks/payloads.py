@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+import random
+
+__all__ = ["ClickUpPayloads", "PlannerPayloads"]
+
+TEAM_ID = "90000001"
+STATUSES = ("to do", "in_progress", "review", "done")
+WORDS = ("api", "backlog", "billing", "dashboard", "deploy", "docs", "login", "migration", "report", "search", "sync", "ui")
+
+
+def get_name(rnd, prefix, i):
+    return f"{prefix} {i} {rnd.choice(WORDS)} {rnd.choice(WORDS)}"
+
+
+class ClickUpPayloads:
+    """
+    Synthetic ClickUp workspace: spaces, folders, lists (in folders and folderless)
+    and tasks with subtasks, served by path like the ClickUp API.
+    """
+
+    def __init__(self, spaces=50, lists=2000, tasks=100000, folders_per_space=4, subtasks_ratio=0.2, seed=0):
+        rnd = random.Random(seed)
+        self.team = {"id": TEAM_ID, "name": "Benchmark Team", "members": []}
+        self.spaces = []
+        self.folders = []
+        self.lists = []
+        self.tasks = []
+        self.routes = {"team": {"teams": [self.team]}}
+        lists_per_space = max(1, lists // spaces)
+        tasks_per_list = max(1, tasks // (lists_per_space * spaces))
+        statuses = [{"status": x, "type": "custom", "orderindex": i} for i, x in enumerate(STATUSES)]
+        for s in range(spaces):
+            space = {"id": str(10000000 + s), "name": get_name(rnd, "Space", s), "private": False, "statuses": statuses}
+            self.spaces.append(space)
+            space_ref = {"id": space["id"], "name": space["name"], "access": True}
+            folders = []
+            for f in range(folders_per_space):
+                folder = {
+                    "id": str(20000000 + s * folders_per_space + f),
+                    "name": get_name(rnd, "Folder", f),
+                    "hidden": False,
+                    "space": dict(space_ref),
+                    "archived": False,
+                }
+                folders.append(folder)
+            folderless = []
+            by_folder = dict((x["id"], []) for x in folders)
+            for i in range(lists_per_space):
+                folder = folders[i % (folders_per_space + 1)] if i % (folders_per_space + 1) < folders_per_space else None
+                lst = {
+                    "id": str(30000000 + s * lists_per_space + i),
+                    "name": get_name(rnd, "List", i),
+                    "space": dict(space_ref),
+                    "folder": (
+                        {"id": folder["id"], "name": folder["name"], "hidden": False, "access": True}
+                        if folder
+                        else {"id": f"h{space['id']}", "name": "hidden", "hidden": True, "access": True}
+                    ),
+                    "statuses": statuses,
+                    "archived": False,
+                }
+                (by_folder[folder["id"]] if folder else folderless).append(lst)
+                self.lists.append(lst)
+                self.add_tasks(rnd, lst, tasks_per_list, subtasks_ratio)
+            for folder in folders:
+                folder["lists"] = by_folder[folder["id"]]
+                self.routes[f"folder/{folder['id']}"] = folder
+                self.routes[f"folder/{folder['id']}/list"] = {"lists": by_folder[folder["id"]]}
+            self.folders.extend(folders)
+            self.routes[f"space/{space['id']}"] = space
+            self.routes[f"space/{space['id']}/folder"] = {"folders": folders}
+            self.routes[f"space/{space['id']}/list"] = {"lists": folderless}
+        self.routes[f"team/{TEAM_ID}/space"] = {"spaces": self.spaces}
+
+    def add_tasks(self, rnd, lst, count, subtasks_ratio):
+        "Add the tasks of a list (some of them subtasks of the previous tasks)"
+        tasks = []
+        for i in range(count):
+            parents = [x for x in tasks[-10:] if x["parent"] is None]
+            parent = rnd.choice(parents)["id"] if parents and rnd.random() < subtasks_ratio else None
+            task = {
+                "id": f"{int(lst['id']):x}t{i:x}",
+                "custom_id": None,
+                "name": get_name(rnd, "Task", i),
+                "status": {"status": rnd.choice(STATUSES), "type": "custom"},
+                "parent": parent,
+                "assignees": [],
+                "tags": [],
+                "date_created": "1655914370489",
+                "list": {"id": lst["id"], "name": lst["name"], "access": True},
+                "folder": {"id": lst["folder"]["id"], "name": lst["folder"]["name"], "hidden": lst["folder"]["hidden"]},
+                "space": {"id": lst["space"]["id"]},
+            }
+            tasks.append(task)
+            self.routes[f"task/{task['id']}"] = task
+        self.tasks.extend(tasks)
+        self.routes[f"list/{lst['id']}"] = lst
+        self.routes[f"list/{lst['id']}/task"] = {"tasks": tasks, "last_page": True}
+
+    def send_request(self, part, method="GET", request_args=None, payload=None, **kwargs):
+        "ClickUpClient.send_request replacement (in memory, the payloads are not copied)"
+        path, _, query = part.format(**kwargs).partition("?")
+        response = self.routes.get(path.strip("/"))
+        if response is None:
+            raise KeyError(f"Route not found: {part}")
+        if path.endswith("/task") and "subtasks=true" not in query:
+            response = dict(response, tasks=[x for x in response["tasks"] if x["parent"] is None])
+        return response
+
+
+class PlannerPayloads:
+    "Synthetic Microsoft Graph payloads: teams, plans, buckets and tasks"
+
+    def __init__(self, teams=50, plans=2000, tasks=100000, seed=0):
+        rnd = random.Random(seed)
+        self.teams = [{"id": f"00000000-0000-0000-0000-{i:012d}", "displayName": get_name(rnd, "Team", i)} for i in range(teams)]
+        self.plans = []
+        self.buckets = {}
+        self.tasks = []
+        plans_per_team = max(1, plans // teams)
+        tasks_per_plan = max(1, tasks // (plans_per_team * teams))
+        for team in self.teams:
+            for p in range(plans_per_team):
+                plan_id = f"plan{len(self.plans):08d}"
+                self.plans.append({"id": plan_id, "title": get_name(rnd, "Plan", p), "owner": team["id"]})
+                self.buckets[plan_id] = [
+                    {"id": f"{plan_id}b{i}", "name": name, "planId": plan_id, "orderHint": str(len(STATUSES) - i)}
+                    for i, name in enumerate(STATUSES)
+                ]
+                for t in range(tasks_per_plan):
+                    self.tasks.append(
+                        {
+                            "id": f"{plan_id}t{t:06d}",
+                            "title": get_name(rnd, "Task", t),
+                            "planId": plan_id,
+                            "bucketId": f"{plan_id}b{rnd.randrange(len(STATUSES))}",
+                            "assignments": {},
+                            "percentComplete": 0,
+                            "startDateTime": None,
+                        }
+                    )
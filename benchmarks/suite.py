@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import time
+import fnmatch
+import itertools
+import tracemalloc
+from functools import partial
+from types import SimpleNamespace
+from O365.connection import MSGraphProtocol
+from O365.planner import Planner
+from alkemy_workflow import cli
+from alkemy_workflow.cli import prepare_tree, pick_task
+from alkemy_workflow.clickup import ClickUpClient, Space, List, Task
+from alkemy_workflow.planner import PlannerClient, Plan, Task as PlannerTask
+from alkemy_workflow.query import QueryEngine
+from .payloads import ClickUpPayloads, PlannerPayloads
+
+__all__ = ["Suite", "compare", "SIZES"]
+
+# Full size synthetic workspace
+SIZES = {"spaces": 50, "lists": 2000, "tasks": 100000}
+REPEAT = 3
+# Allowed slowdown/memory growth over the baseline (0.25: +25%)
+THRESHOLD = 0.25
+MEMORY_THRESHOLD = 0.25
+# Picker navigations (workspace -> space -> folder -> list) measured
+NAVIGATIONS = 10
+
+
+def make_clickup_client(payloads):
+    "ClickUp client served by the synthetic payloads"
+    config = SimpleNamespace(default_clickup_team_id=None, default_clickup_token="benchmark", is_verbose=lambda: False)
+    client = ClickUpClient(config)
+    client.send_request = payloads.send_request
+    client.index.cache.enabled = False  # don't touch the persistent name index
+    return client
+
+
+def make_planner_client(payloads):
+    "Planner client (no connection) with the synthetic plan buckets"
+    config = SimpleNamespace(o365_tenant_id="benchmark", o365_client_id="benchmark")
+    client = PlannerClient(config)
+    for cache in (client.account_cache, client.index.cache, client.task_store.cache):
+        cache.enabled = False
+    client.__dict__["planner"] = Planner(con=None, protocol=MSGraphProtocol())
+    for plan_id, buckets in payloads.buckets.items():
+        client.bucket_registry.set_buckets(plan_id, [client.build(client.planner.bucket_constructor, x) for x in buckets])
+    return client
+
+
+class ScriptedPicker:
+    "pzp.pzp replacement picking the items by name"
+
+    def __init__(self, names):
+        self.names = iter(names)
+
+    def __call__(self, items, **kwargs):
+        name = next(self.names, None)
+        return next((x for x in items if x["name"] == name), None)
+
+
+class Suite:
+    """
+    Entity and query layer benchmarks on a synthetic workspace (scale: fraction of SIZES).
+    Each benchmark is timed (best of repeat runs) and its peak memory measured with tracemalloc (separate run).
+    """
+
+    def __init__(self, scale=1.0, repeat=REPEAT, memory=True):
+        self.sizes = dict((key, max(1, int(value * scale))) for key, value in SIZES.items())
+        self.repeat = repeat
+        self.memory = memory
+        self.clickup = ClickUpPayloads(**self.sizes)
+        self.planner = PlannerPayloads(teams=self.sizes["spaces"], plans=self.sizes["lists"], tasks=self.sizes["tasks"])
+        self.benchmarks = self.get_benchmarks()
+        # Entities of the prepare_tree/filter benchmarks, built before measuring
+        client = make_clickup_client(self.clickup)
+        self.tasks = [Task(client, x) for x in self.clickup.tasks]
+        # Hierarchy listing: workspace, space, folder, list and all the top level tasks
+        ancestors = QueryEngine(client).query(lst=self.clickup.lists[0]["id"], hierarchy=True)
+        self.tree = [x for x in ancestors if x["type"] != "Task"] + [x for x in self.tasks if x["type"] == "Task"]
+
+    def get_benchmarks(self):
+        "{name: function}"
+        result = {
+            "clickup.entities.space": self.bench_clickup_spaces,
+            "clickup.entities.list": self.bench_clickup_lists,
+            "clickup.entities.task": self.bench_clickup_tasks,
+            "planner.entities.plan": self.bench_planner_plans,
+            "planner.entities.task": self.bench_planner_tasks,
+            "prepare_tree": self.bench_prepare_tree,
+            "filter.name": partial(self.bench_filter, None, "*task 1*"),
+            "filter.type_name": partial(self.bench_filter, "Subtask", "*sync*"),
+            "pick_task": self.bench_pick_task,
+        }
+        # Query with each filter combination, on the workspace, all the spaces and all the lists
+        levels = {"workspace": ("Space", "space*1*"), "space": ("List", "list*1*"), "list": ("Task", "task*1*")}
+        for level, (filter_type, filter_name) in levels.items():
+            for with_type, with_name, hierarchy in itertools.product((False, True), repeat=3):
+                suffix = [x for x, enabled in (("type", with_type), ("name", with_name), ("hierarchy", hierarchy)) if enabled]
+                name = ".".join(["query", level] + suffix)
+                result[name] = partial(
+                    self.bench_query, level, filter_type if with_type else None, filter_name if with_name else None, hierarchy
+                )
+        return result
+
+    def run(self, pattern=None):
+        "Run the benchmarks (names matching the pattern), return {name: {time, peak}}"
+        results = {}
+        for name, fn in self.benchmarks.items():
+            if pattern and not fnmatch.fnmatch(name, pattern):
+                continue
+            results[name] = {"time": self.measure_time(fn)}
+            if self.memory:
+                results[name]["peak"] = self.measure_memory(fn)
+        return results
+
+    def measure_time(self, fn):
+        "Best of the runs (seconds)"
+        timings = []
+        for _ in range(self.repeat):
+            start_time = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start_time)
+        return min(timings)
+
+    def measure_memory(self, fn):
+        "Peak memory allocated by a run (bytes)"
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            fn()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def bench_clickup_spaces(self):
+        client = make_clickup_client(self.clickup)
+        return [Space(client, x) for x in self.clickup.spaces]
+
+    def bench_clickup_lists(self):
+        client = make_clickup_client(self.clickup)
+        return [List(client, x) for x in self.clickup.lists]
+
+    def bench_clickup_tasks(self):
+        client = make_clickup_client(self.clickup)
+        return [Task(client, x) for x in self.clickup.tasks]
+
+    def bench_planner_plans(self):
+        client = make_planner_client(self.planner)
+        return [Plan(client, client.build(client.planner.plan_constructor, x)) for x in self.planner.plans]
+
+    def bench_planner_tasks(self):
+        client = make_planner_client(self.planner)
+        plans = dict((x["id"], Plan(client, client.build(client.planner.plan_constructor, x))) for x in self.planner.plans)
+        return [
+            PlannerTask(client, client.build(client.planner.task_constructor, x), plan=plans[x["planId"]])
+            for x in self.planner.tasks
+        ]
+
+    def bench_query(self, level, filter_type, filter_name, hierarchy):
+        client = make_clickup_client(self.clickup)
+        if level == "workspace":
+            targets = [{}]
+        elif level == "space":
+            targets = [{"space": x["id"]} for x in self.clickup.spaces]
+        else:
+            targets = [{"lst": x["id"]} for x in self.clickup.lists]
+        engine = QueryEngine(client)
+        return [engine.query(filter_type=filter_type, filter_name=filter_name, hierarchy=hierarchy, **x) for x in targets]
+
+    def bench_prepare_tree(self):
+        return list(prepare_tree(self.tree))
+
+    def bench_filter(self, filter_type, filter_name):
+        return QueryEngine(None).filter(self.tasks, filter_type=filter_type, filter_name=filter_name)
+
+    def bench_pick_task(self):
+        "Navigate workspace -> space -> folder -> list and back to the workspace"
+        client = make_clickup_client(self.clickup)
+        names = []
+        for folder in self.clickup.folders[:NAVIGATIONS]:
+            space = next(x for x in self.clickup.spaces if x["id"] == folder["space"]["id"])
+            lst = folder["lists"][0]["name"] if folder["lists"] else None
+            names.extend([space["name"], folder["name"], lst, "Benchmark Team"])
+        names.append(None)
+        pzp = cli.pzp.pzp
+        cli.pzp.pzp = ScriptedPicker(names)
+        try:
+            return pick_task(SimpleNamespace(client=client))
+        finally:
+            cli.pzp.pzp = pzp
+
+
+def compare(results, baseline, threshold=THRESHOLD, memory_threshold=MEMORY_THRESHOLD):
+    "Regressions over the baseline, as messages"
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric, limit in (("time", threshold), ("peak", memory_threshold)):
+            value, reference_value = result.get(metric), reference.get(metric)
+            if value is not None and reference_value and value > reference_value * (1 + limit):
+                regressions.append(f"{name}: {metric} {value:.6g} > {reference_value:.6g} (+{value / reference_value - 1:.0%})")
+    return regressions
@@ -3,12 +3,22 @@
 import os
 import json
 import subprocess
+from contextlib import ExitStack
+from types import SimpleNamespace
 from pathlib import Path
 import pytest
 import urllib.parse
 import requests
 from requests.structures import CaseInsensitiveDict
+from O365.connection import MSGraphProtocol
+from O365.planner import Planner
+from O365.teams import Teams
 from alkemy_workflow.utils import Config
+from alkemy_workflow.clickup import ClickUpClient, AW_CLICKUP_URL
+from alkemy_workflow.github import AW_GITHUB_URL
+from alkemy_workflow.planner import PlannerClient
+from alkemy_workflow.transport import AW_TRANSPORT
+from .server import StandInServer, running
 
 ENV = {
     "GIT_AUTHOR_NAME": "test test",
@@ -105,3 +115,157 @@ def git_env(monkeypatch):
 def clickup_token_env(monkeypatch):
     monkeypatch.setenv("AW_TASKS", "clickup")
     monkeypatch.setenv("CLICKUP_TOKEN", X20)
+
+
+def count_requests(client):
+    client.requests = []
+    send_request = client.send_request
+
+    def counting_send_request(part, *args, **kwargs):
+        client.requests.append(part.split("?")[0])
+        return send_request(part, *args, **kwargs)
+
+    client.send_request = counting_send_request
+    return client
+
+
+@pytest.fixture
+def client(git_path_credentials_config, mock_response, monkeypatch):
+    monkeypatch.chdir(git_path_credentials_config)
+    return count_requests(ClickUpClient(Config()))
+
+
+@pytest.fixture
+def stand_in(git_path_credentials_config, monkeypatch):
+    "Start a stand-in server (StandInServer arguments), the ClickUp/GitHub clients created after it use it"
+    monkeypatch.chdir(git_path_credentials_config)
+    monkeypatch.setenv(AW_TRANSPORT, "")
+    monkeypatch.setenv("AW_NO_CACHE", "1")
+    with ExitStack() as stack:
+
+        def start(**kwargs):
+            server = stack.enter_context(running(StandInServer(**kwargs)))
+            monkeypatch.setenv(AW_CLICKUP_URL, server.clickup_url)
+            monkeypatch.setenv(AW_GITHUB_URL, server.url)
+            return server
+
+        yield start
+
+
+class GraphResponse:
+    "Microsoft Graph response of the fake connection"
+
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = json.dumps(body).encode("utf-8") if body is not None else b""
+
+    @property
+    def ok(self):
+        return 200 <= self.status_code < 400
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("No content")
+        return self.body
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Graph error", response=self)
+
+
+class FakeGraph:
+    """
+    O365 connection stand-in serving Microsoft Graph payloads by path (no version prefix, no query string),
+    e.g. {"planner/plans/p1": {...}, "PATCH planner/tasks/t1": (204, None)}.
+    A route value is a payload (200), a (status, payload) tuple or a list of them (served in order, the last repeated).
+    $select is applied to the payloads and $batch requests are dispatched to the routes.
+    """
+
+    def __init__(self, routes=None):
+        self.routes = dict(routes or {})
+        self.requests = []
+        self.requests_count = 0
+        self.batches = []
+
+    def respond(self, method, url, data=None):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path.strip("/")
+        if path.startswith("v1.0/"):
+            path = path[len("v1.0/") :]
+        self.requests.append(f"{method.upper()} {path}")
+        self.requests_count = self.requests_count + 1
+        route = self.routes.get(path if method.upper() == "GET" else f"{method.upper()} {path}")
+        if isinstance(route, list):
+            route = route.pop(0) if len(route) > 1 else route[0]
+        if route is None:
+            return GraphResponse(404, {"error": {"code": "NotFound", "message": "Not found"}})
+        status, body = route if isinstance(route, tuple) else (200, route)
+        select = urllib.parse.parse_qs(parts.query).get("$select")
+        if select and isinstance(body, dict):
+            fields = select[0].split(",")
+
+            def slim(item):
+                return dict((k, v) for k, v in item.items() if k in fields or k.startswith("@"))
+
+            body = dict(body, value=[slim(x) for x in body["value"]]) if "value" in body else slim(body)
+        return GraphResponse(status, body)
+
+    def request(self, method, url, data=None, **kwargs):
+        response = self.respond(method, url, data)
+        response.raise_for_status()
+        return response
+
+    def get(self, url, params=None, **kwargs):
+        return self.request("GET", url)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request("PATCH", url, data)
+
+    def post(self, url, data=None, **kwargs):
+        if not url.endswith("$batch"):
+            return self.request("POST", url, data)
+        self.requests_count = self.requests_count + 1
+        self.batches.append(data["requests"])
+        service_url = url[: -len("$batch")]
+        responses = []
+        for item in data["requests"]:
+            response = self.respond(item["method"], service_url + item["url"].lstrip("/"), item.get("body"))
+            responses.append({"id": item["id"], "status": response.status_code, "headers": {}, "body": response.body})
+        return GraphResponse(200, {"responses": responses})
+
+
+class FakeAccount:
+    "O365 account stand-in using a FakeGraph connection"
+
+    def __init__(self, graph):
+        self.con = graph
+        self.protocol = MSGraphProtocol()
+        self.main_resource = ""
+
+    def planner(self):
+        return Planner(parent=self)
+
+    def teams(self):
+        return Teams(parent=self)
+
+
+@pytest.fixture
+def graph(git_path_credentials_config, monkeypatch):
+    "Fake Microsoft Graph (FakeGraph), the planner_client fixture uses it"
+    monkeypatch.chdir(git_path_credentials_config)
+    monkeypatch.setenv("AW_NO_CACHE", "1")
+    return FakeGraph()
+
+
+@pytest.fixture
+def planner_client(graph):
+    "PlannerClient connected to the fake Microsoft Graph"
+    config = SimpleNamespace(o365_tenant_id="tenant_id", o365_client_id="client_id", clickup_status_in_progress="in progress")
+    client = PlannerClient(config)
+    client.__dict__["account"] = FakeAccount(graph)
+    return client
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+import json
+import time
+import random
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import click
+
+__all__ = ["StandInServer", "DataBackend", "DatasetBackend", "running", "CLICKUP_PREFIX"]
+
+DATA_PATH = Path(__file__).parent / "data"
+# ClickUp endpoints are under /api/v2/, GitHub endpoints at the root
+CLICKUP_PREFIX = "api/v2/"
+# Tasks per page of the ClickUp list tasks endpoint, default/max items per page of the GitHub list endpoints
+PAGE_SIZE = 100
+GITHUB_PAGE_SIZE = 30
+GITHUB_MAX_PAGE_SIZE = 100
+# Requests per window allowed by the rate limit (ClickUp: 100 per minute per token)
+RATE_LIMIT = 100
+RATE_WINDOW = 60
+CLICKUP_NOT_FOUND = {"err": "Route not found", "ECODE": "APP_001"}
+CLICKUP_RATE_LIMITED = {"err": "Rate limit reached", "ECODE": "APP_002"}
+GITHUB_NOT_FOUND = {"message": "Not Found"}
+GITHUB_RATE_LIMITED = {"message": "API rate limit exceeded"}
+
+
+class DataBackend:
+    "Responses read from the tests/data tree (<path>.<method> files, like MockResponse)"
+
+    def __init__(self, path=DATA_PATH):
+        self.path = Path(path)
+
+    def get(self, method, path):
+        "Response payload, None if not found"
+        filepath = self.path / Path(*(path.strip("/") + "." + method.lower()).replace("..", "").split("/"))
+        try:
+            with filepath.open("rb") as f:
+                return json.load(f)
+        except OSError:
+            return None
+
+
+class DatasetBackend:
+    """
+    Synthetic ClickUp workspace (benchmarks.payloads.ClickUpPayloads),
+    the requests not covered by the dataset (user, GitHub, updates) are served by the fallback backend.
+    """
+
+    def __init__(self, payloads, fallback=None):
+        self.payloads = payloads
+        self.fallback = fallback
+
+    def get(self, method, path):
+        "Response payload, None if not found"
+        path = path.strip("/")
+        if method == "GET" and path.startswith(CLICKUP_PREFIX):
+            response = self.payloads.routes.get(path[len(CLICKUP_PREFIX) :].strip("/"))
+            if response is not None:
+                return response
+        return self.fallback.get(method, path) if self.fallback is not None else None
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the ClickUp v2 and GitHub REST APIs (HTTP/1.1, keep-alive, a thread per connection).
+
+    latency: seconds added to each response (plus a random jitter)
+    page_size: tasks per page of the ClickUp list tasks endpoint
+    throttle_rate: fraction of the requests rejected with 429
+    rate_limit, rate_window: requests allowed per token per window (seconds), reported in the
+        X-RateLimit-Limit/Remaining/Reset headers, the requests over the limit are rejected with 429
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        backend=None,
+        latency=0,
+        jitter=0,
+        page_size=PAGE_SIZE,
+        throttle_rate=0,
+        rate_limit=None,
+        rate_window=RATE_WINDOW,
+        seed=None,
+        verbose=False,
+    ):
+        super().__init__(address, StandInHandler)
+        self.backend = backend or DataBackend()
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.verbose = verbose
+        self.random = random.Random(seed)
+        self.windows = {}
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "connections": 0, "throttled": 0, "active": 0, "peak": 0}
+
+    @property
+    def url(self):
+        "Server root URL (GitHub)"
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def clickup_url(self):
+        "ClickUp API URL"
+        return self.url + CLICKUP_PREFIX
+
+    def count(self, name, value=1):
+        "Update a counter (and the peak of concurrent requests)"
+        with self.lock:
+            self.stats[name] = self.stats[name] + value
+            self.stats["peak"] = max(self.stats["peak"], self.stats["active"])
+
+    def get_delay(self):
+        "Response latency (seconds)"
+        with self.lock:
+            return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def check_rate_limit(self, token):
+        "Count a request of the token, return (rate limit headers, throttled)"
+        now = time.time()
+        with self.lock:
+            injected = bool(self.throttle_rate) and self.random.random() < self.throttle_rate
+            if not self.rate_limit:
+                return {}, injected
+            start, count = self.windows.get(token, (now, 0))
+            if now - start >= self.rate_window:
+                start, count = now, 0
+            count = count + 1
+            self.windows[token] = (start, count)
+        reset = int(start + self.rate_window)
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(0, self.rate_limit - count)),
+            "X-RateLimit-Reset": str(reset),
+        }
+        return headers, injected or count > self.rate_limit
+
+    def paginate(self, path, query, payload):
+        "Return the requested page of the list endpoints (payload, headers)"
+        if path.startswith(CLICKUP_PREFIX):
+            if not isinstance(payload, dict) or not isinstance(payload.get("tasks"), list):
+                return payload, {}
+            tasks = payload["tasks"]
+            if query.get("subtasks", [""])[0] != "true":
+                tasks = [x for x in tasks if not x.get("parent")]
+            page = int(query.get("page", ["0"])[0])
+            start = page * self.page_size
+            end = start + self.page_size
+            return dict(payload, tasks=tasks[start:end], last_page=end >= len(tasks)), {}
+        if not isinstance(payload, list):
+            return payload, {}
+        per_page = min(int(query.get("per_page", [GITHUB_PAGE_SIZE])[0]), GITHUB_MAX_PAGE_SIZE)
+        page = max(1, int(query.get("page", ["1"])[0]))
+        headers = {}
+        if page * per_page < len(payload):
+            next_query = urllib.parse.urlencode(dict([(k, v[0]) for k, v in query.items()] + [("page", page + 1)]))
+            headers["Link"] = f'<{self.url}{path}?{next_query}>; rel="next"'
+        return payload[(page - 1) * per_page : page * per_page], headers
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    "Stand-in server request handler"
+
+    protocol_version = "HTTP/1.1"
+    server_version = "aw-stand-in"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def do_GET(self):
+        self.handle_api_request()
+
+    do_POST = do_PUT = do_PATCH = do_DELETE = do_GET
+
+    def handle_api_request(self):
+        self.server.count("requests")
+        self.server.count("active")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            parts = urllib.parse.urlsplit(self.path)
+            path = parts.path.strip("/")
+            query = urllib.parse.parse_qs(parts.query)
+            clickup = path.startswith(CLICKUP_PREFIX)
+            delay = self.server.get_delay()
+            if delay:
+                time.sleep(delay)
+            headers, throttled = self.server.check_rate_limit(self.headers.get("Authorization"))
+            if throttled:
+                self.server.count("throttled")
+                headers["Retry-After"] = str(max(1, int(headers.get("X-RateLimit-Reset", 0)) - int(time.time())))
+                self.send_json(429, CLICKUP_RATE_LIMITED if clickup else GITHUB_RATE_LIMITED, headers)
+                return
+            payload = self.server.backend.get(self.command, path)
+            if payload is None:
+                self.send_json(404, CLICKUP_NOT_FOUND if clickup else GITHUB_NOT_FOUND, headers)
+                return
+            payload, page_headers = self.server.paginate(path, query, payload)
+            self.send_json(200, payload, dict(headers, **page_headers))
+        finally:
+            self.server.count("active", -1)
+
+    def send_json(self, status, payload, headers):
+        "Send a JSON response"
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+@contextmanager
+def running(server):
+    "Serve in a background thread, shut down on exit"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="Listen address")
+@click.option("--port", default=8000, show_default=True, help="Listen port")
+@click.option("--data", "data_path", default=str(DATA_PATH), show_default=True, help="Data tree (<path>.<method> files)")
+@click.option("--scale", type=float, help="Serve a synthetic ClickUp workspace (fraction of the benchmark full size)")
+@click.option("--latency", default=0.0, show_default=True, help="Response latency (seconds)")
+@click.option("--jitter", default=0.0, show_default=True, help="Random latency added (seconds)")
+@click.option("--page-size", default=PAGE_SIZE, show_default=True, help="Tasks per page")
+@click.option("--throttle-rate", default=0.0, show_default=True, help="Fraction of the requests rejected with 429")
+@click.option("--rate-limit", type=int, help=f"Requests allowed per window (e.g. {RATE_LIMIT})")
+@click.option("--rate-window", default=RATE_WINDOW, show_default=True, help="Rate limit window (seconds)")
+@click.option("--seed", type=int, help="Random seed")
+@click.option("--verbose", is_flag=True, default=False, help="Log the requests")
+def main(host, port, data_path, scale, latency, jitter, page_size, throttle_rate, rate_limit, rate_window, seed, verbose):
+    "Run the ClickUp/GitHub stand-in server"
+    backend = DataBackend(data_path)
+    if scale is not None:
+        from benchmarks.payloads import ClickUpPayloads
+        from benchmarks.suite import SIZES
+
+        sizes = dict((key, max(1, int(value * scale))) for key, value in SIZES.items())
+        backend = DatasetBackend(ClickUpPayloads(**sizes, seed=seed or 0), fallback=backend)
+    server = StandInServer(
+        (host, port),
+        backend,
+        latency=latency,
+        jitter=jitter,
+        page_size=page_size,
+        throttle_rate=throttle_rate,
+        rate_limit=rate_limit,
+        rate_window=rate_window,
+        seed=seed,
+        verbose=verbose,
+    )
+    click.echo(f"export AW_CLICKUP_URL={server.clickup_url}")
+    click.echo(f"export AW_GITHUB_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        click.echo(json.dumps(server.stats), err=True)
+
+
+if __name__ == "__main__":
+    main()
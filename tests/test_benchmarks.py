@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+
+from benchmarks.suite import Suite, compare
+
+
+class TestBenchmarks:
+    def test_smoke(self):
+        suite = Suite(scale=0.001, repeat=1)
+        results = suite.run()
+        assert set(results) == set(suite.benchmarks)
+        assert all(x["time"] >= 0 and x["peak"] >= 0 for x in results.values())
+        assert len(suite.bench_query("list", "Task", None, False)) == suite.sizes["lists"]
+
+    def test_compare(self):
+        baseline = {"a": {"time": 1.0, "peak": 100}, "b": {"time": 1.0, "peak": 100}}
+        results = {"a": {"time": 1.2, "peak": 100}, "b": {"time": 1.5, "peak": 200}, "c": {"time": 9.0}}
+        assert compare(results, baseline, threshold=0.25, memory_threshold=0.5) == [
+            "b: time 1.5 > 1 (+50%)",
+            "b: peak 200 > 100 (+100%)",
+        ]
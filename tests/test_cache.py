@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+import time
+from pathlib import Path
+from alkemy_workflow.cache import JsonCache
+
+
+class TestJsonCache:
+    def test_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        cache = JsonCache("test")
+        assert cache.get("a") is None
+        cache.set("a", {"b": 1})
+        cache.save()
+        assert (tmp_path / ".alkemy_workflow" / "cache" / "test.json").exists()
+        cache = JsonCache("test")
+        assert cache.get("a") == {"b": 1}
+        cache.delete("a")
+        assert cache.get("a", "default") == "default"
+
+    def test_ttl(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        cache = JsonCache("test", ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        monkeypatch.setattr(time, "time", lambda: cache.data["a"]["ts"] + 120)
+        assert cache.get("a") is None
+        assert cache.get("a", ttl=300) == 1
+
+    def test_disabled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        monkeypatch.setenv("AW_NO_CACHE", "1")
+        cache = JsonCache("test")
+        cache.set("a", 1)
+        cache.save()
+        assert not (tmp_path / ".alkemy_workflow" / "cache" / "test.json").exists()
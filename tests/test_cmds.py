@@ -2,9 +2,10 @@
 
 import os
 import io
+import requests
 from alkemy_workflow.cli import main, EXIT_SUCCESS, EXIT_FAILURE, EXIT_PARSER_ERROR
 from alkemy_workflow.utils import Workflow
-from .commons import clickup_token_env, git_env, git_path, git_path_credentials_config, mock_response
+from .commons import clickup_token_env, git_env, git_path, git_path_credentials_config, mock_response, MockResponse
 
 
 class TestCmds:
@@ -216,3 +217,60 @@ class TestCmds:
         assert main(["aw", "branch", "99abcd99"]) == EXIT_FAILURE
         assert main(["aw", "branch", "99abcd99", "--repo", "https://github.com/OWNER/REPO"]) == EXIT_SUCCESS
         assert main(["aw", "commit"]) == EXIT_FAILURE
+
+    def test_branches(self, git_path_credentials_config, mock_response, monkeypatch, capsys):
+        monkeypatch.chdir(git_path_credentials_config)
+        assert main(["aw", "branch", "99abcd99"]) == EXIT_SUCCESS
+        capsys.readouterr()
+        assert main(["aw", "branches"]) == EXIT_SUCCESS
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[0].split() == ["Branch", "Status", "Date", "PR"] and lines[1] == "-" * 86
+        assert lines[2].startswith("99abcd99-workflow-tool-tests")
+        assert main(["aw", "branches", "--noheaders", "--prune"]) == EXIT_SUCCESS
+        wf = Workflow()
+        assert "99abcd99-workflow-tool-tests" in [x["name"] for x in wf.git.list_branches()]
+
+    def test_branches_prune_error(self, git_env, git_path_credentials_config, mock_response, monkeypatch, capsys):
+        monkeypatch.chdir(git_path_credentials_config)
+        with open(git_path_credentials_config / "alkemy_workflow.ini", "a") as f:
+            f.write("[clickup]\nstatus_ma = to do\n")
+        wf = Workflow()
+        wf.git.run("worktree", "add", str(git_path_credentials_config / "wt"), "-b", "99abcd99-workflow-tool-tests")
+        assert main(["aw", "branches", "--noheaders", "--prune"]) == EXIT_SUCCESS
+        # git's reason is reported (checked out in a worktree, not "not fully merged")
+        out = capsys.readouterr().out
+        assert "Branch 99abcd99-workflow-tool-tests not deleted:" in out and "checked out at" in out
+        assert "99abcd99-workflow-tool-tests" in [x["name"] for x in wf.git.list_branches()]
+
+    def test_branches_task_pattern(self, git_path_credentials_config, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        urls = []
+
+        def mock_request(method, url, **kwargs):
+            urls.append(url)
+            return MockResponse(method, url)
+
+        monkeypatch.setattr(requests, "request", mock_request)
+        wf = Workflow()
+        for name in ("feature/x", "release-1", "99abcd99-workflow-tool-tests"):
+            wf.git.run("branch", name)
+        assert main(["aw", "branches"]) == EXIT_SUCCESS
+        # Only the task branches are resolved
+        assert [x for x in urls if "/task/" in x] == ["https://api.clickup.com/api/v2/task/99abcd99/"]
+
+    def test_branch_worktree(self, git_env, git_path_credentials_config, mock_response, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        assert main(["aw", "branch", "99abcd99", "--worktree"]) == EXIT_SUCCESS
+        assert main(["aw", "branch", "99abcd99", "--worktree"]) == EXIT_SUCCESS
+        wf = Workflow()
+        assert wf.git.get_current_branch() == "main"
+        worktree_path = wf.git.get_worktree_dir() / "99abcd99-workflow-tool-tests"
+        assert worktree_path.is_dir()
+        monkeypatch.chdir(worktree_path)
+        wf = Workflow()
+        assert wf.config.git_dir == worktree_path.resolve()
+        assert wf.git.get_current_branch() == "99abcd99-workflow-tool-tests"
+        with open(worktree_path / "x", "w") as f:
+            f.write("x\n")
+        wf.git.run("add", "x")
+        assert main(["aw", "commit"]) == EXIT_SUCCESS
@@ -83,3 +83,19 @@ class TestCmdsLs:
         assert main(["aw", "ls", "--folder", "20000001", "--list", "Backlog"]) == EXIT_SUCCESS
         assert main(["aw", "ls", "--list", "Backlog"]) == EXIT_FAILURE
         assert main(["aw", "ls", "--list", "30000001"]) == EXIT_SUCCESS
+
+    def test_ls_recursive(self, git_path_credentials_config, mock_response, monkeypatch, capsys):
+        monkeypatch.chdir(git_path_credentials_config)
+        assert main(["aw", "ls", "--list", "30000001", "--recursive"]) == EXIT_SUCCESS
+        assert main(["aw", "ls", "--space", "R&D", "--depth", "1", "--noheaders"]) == EXIT_SUCCESS
+        captured = capsys.readouterr()
+        assert "  └─ 20000001" in captured.out
+        assert "requests" in captured.err
+
+    def test_ls_output(self, git_path_credentials_config, mock_response, monkeypatch, capsys):
+        monkeypatch.chdir(git_path_credentials_config)
+        assert main(["aw", "spaces", "--output", "csv"]) == EXIT_SUCCESS
+        assert main(["aw", "tasks", "--list", "30000001", "--output", "jsonl", "--fields", "id,status.status"]) == EXIT_SUCCESS
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[:2] == ["id,name", "10000001,R&D"]
+        assert lines[5] == '{"id": "32ppkv2", "status.status": "in_progress"}'
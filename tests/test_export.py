@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import json
+import sqlite3
+from alkemy_workflow.cli import main, EXIT_FAILURE
+from alkemy_workflow.export import Exporter, SqliteSink, JsonlSink, get_row
+from .commons import git_path, git_path_credentials_config, mock_response, client
+
+
+class TestExport:
+    def test_export_sqlite(self, client, tmp_path):
+        path = tmp_path / "snapshot.db"
+        sink = SqliteSink(path)
+        stats = Exporter(client, sink).run(space="10000001")
+        sink.close()
+        # No tasks fixture for the list 30000002
+        assert stats["lists"] == 1 and list(stats["failed"]) == ["list:30000002"]
+        with sqlite3.connect(path) as connection:
+            counts = dict(connection.execute("SELECT type, count(*) FROM items GROUP BY type"))
+            units = set(x for x, in connection.execute("SELECT unit FROM checkpoints"))
+        assert counts["Space"] == 1 and counts["Folder"] == 1 and counts["List"] == 2
+        assert counts["Task"] == 33
+        assert units == {"structure", "list:30000001"}
+        # Resume: only the failed list is fetched again
+        client.requests = []
+        sink = SqliteSink(path)
+        stats = Exporter(client, sink).run(space="10000001")
+        sink.close()
+        assert stats["resumed"] == 1 and stats["rows"] == 0
+        assert "list/30000001/task" not in client.requests
+        assert "list/30000002/task" in client.requests
+
+    def test_sqlite_new_snapshot(self, tmp_path):
+        path = tmp_path / "snapshot.db"
+        sink = SqliteSink(path)
+        sink.write([get_row({"type": "Task", "id": "deleted", "name": "Deleted"}, "l1", "l1")], {"list:l1": 1})
+        sink.close()
+        # Interrupted: resumed, the rows are kept
+        sink = SqliteSink(path)
+        assert sink.connection.execute("SELECT count(*) FROM items").fetchone()[0] == 1
+        sink.finish()
+        sink.close()
+        # Completed: the next export is a new snapshot (rows deleted in ClickUp are not kept)
+        sink = SqliteSink(path)
+        assert sink.connection.execute("SELECT count(*) FROM items").fetchone()[0] == 0
+        sink.close()
+
+    def test_export_jsonl(self, client, tmp_path):
+        path = tmp_path / "snapshot.jsonl"
+        sink = JsonlSink(path)
+        Exporter(client, sink, batch_size=10).run(space="10000001")
+        sink.close()
+        lines = path.read_text().splitlines()
+        assert len(lines) == 4 + 33
+        assert json.loads(lines[-1])["list_id"] == "30000001"
+        # Rows written after the last checkpoint (interrupted export) are discarded on resume
+        with path.open("a") as f:
+            f.write('{"partial": ')
+        JsonlSink(path).close()
+        assert path.read_text().splitlines() == lines
+        JsonlSink(path, restart=True).close()
+        assert path.read_text() == ""
+
+    def test_export_cmd(self, git_path_credentials_config, mock_response, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        assert main(["aw", "export", "snapshot.jsonl", "--format", "jsonl"]) == EXIT_FAILURE
+        assert (git_path_credentials_config / "snapshot.jsonl.checkpoint").exists()
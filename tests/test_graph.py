@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+from alkemy_workflow import graph as graph_module
+from alkemy_workflow.graph import GraphBatch, MAX_BATCH_SIZE, STATUS_FAILED_DEPENDENCY
+from .commons import FakeGraph
+
+SERVICE_URL = "https://graph.microsoft.com/v1.0/"
+
+
+class TestGraphBatch:
+    def test_chunks_responses(self):
+        graph = FakeGraph(dict((f"planner/tasks/t{i}", {"id": f"t{i}"}) for i in range(0, 25, 2)))
+        responses = {}
+        with GraphBatch(graph, SERVICE_URL) as batch:
+            requests = [
+                batch.get(f"{SERVICE_URL}planner/tasks/t{i}", callback=lambda response, i=i: responses.update({i: response}))
+                for i in range(25)
+            ]
+        assert [len(x) for x in graph.batches] == [MAX_BATCH_SIZE, 5]
+        assert graph.batches[0][0]["url"] == "/planner/tasks/t0"
+        assert [x.response.status_code for x in requests] == [200 if i % 2 == 0 else 404 for i in range(25)]
+        assert requests[24].response.json() == {"id": "t24"}
+        assert responses[3] is requests[3].response and not responses[3]
+
+    def test_depends_on(self):
+        graph = FakeGraph({"PATCH planner/tasks/t0": (204, None)})
+        batch = GraphBatch(graph, SERVICE_URL)
+        first = batch.patch("planner/tasks/t0", {"bucketId": "b1"}, headers={"If-Match": "etag"})
+        second = batch.patch("planner/tasks/t1", {"bucketId": "b1"}, depends_on=[first])
+        for i in range(MAX_BATCH_SIZE - 2):
+            batch.get(f"planner/tasks/x{i}")
+        # Next chunk, depending on a failed request of the first chunk: not sent
+        third = batch.patch("planner/tasks/t2", {"bucketId": "b1"}, depends_on=[second])
+        batch.execute()
+        request = graph.batches[0][1]
+        assert request["dependsOn"] == [first.id] and request["headers"]["Content-Type"] == "application/json"
+        assert graph.batches[0][0]["headers"]["If-Match"] == "etag"
+        assert first.response.status_code == 204 and second.response.status_code == 404
+        assert third.response.status_code == STATUS_FAILED_DEPENDENCY
+        assert len(graph.batches) == 1
+
+    def test_throttled_retry(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr(graph_module.time, "sleep", delays.append)
+        throttled = (429, {"error": {"code": "TooManyRequests", "message": "Too many requests"}})
+        graph = FakeGraph({"planner/tasks/t0": [throttled, {"id": "t0"}], "planner/tasks/t1": {"id": "t1"}})
+        with GraphBatch(graph, SERVICE_URL) as batch:
+            requests = [batch.get("planner/tasks/t0"), batch.get("planner/tasks/t1")]
+        assert [x.response.json()["id"] for x in requests] == ["t0", "t1"]
+        # Only the throttled request is sent again
+        assert [len(x) for x in graph.batches] == [2, 1] and len(delays) == 1
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import io
+import json
+import time
+from alkemy_workflow.output import RecordWriter, BufferedWriter, get_field, parse_fields, JSONL, CSV, TSV
+
+ITEMS = [
+    {"id": "1", "name": "First, task", "status": {"status": "to do"}, "assignees": [{"id": 9}]},
+    {"id": "2", "name": "Second", "status": {"status": "done"}, "assignees": []},
+]
+
+
+class TestOutput:
+    def test_get_field(self):
+        assert get_field(ITEMS[0], "status.status") == "to do"
+        assert get_field(ITEMS[0], "assignees.0.id") == 9
+        assert get_field(ITEMS[1], "assignees.0.id") is None
+        assert get_field(ITEMS[0], "missing.field") is None
+        assert parse_fields("id, name,,status.status") == ["id", "name", "status.status"]
+
+    def test_jsonl(self):
+        stream = io.StringIO()
+        assert RecordWriter(JSONL, stream=stream).write_all(ITEMS) == 2
+        assert [json.loads(x) for x in stream.getvalue().splitlines()] == ITEMS
+        stream = io.StringIO()
+        RecordWriter(JSONL, fields=["id", "status.status"], stream=stream).write_all(ITEMS)
+        assert json.loads(stream.getvalue().splitlines()[1]) == {"id": "2", "status.status": "done"}
+
+    def test_csv_tsv(self):
+        stream = io.StringIO()
+        RecordWriter(CSV, fields=["id", "name", "assignees"], stream=stream).write_all(ITEMS)
+        assert stream.getvalue().splitlines() == ["id,name,assignees", '1,"First, task","[{""id"": 9}]"', "2,Second,[]"]
+        stream = io.StringIO()
+        RecordWriter(TSV, default_fields=["id", "status.status"], headers=False, stream=stream).write_all(ITEMS)
+        assert stream.getvalue() == "1\tto do\n2\tdone\n"
+
+    def test_buffered_writer(self):
+        stream = io.StringIO()
+        with BufferedWriter(stream, size=10, interval=60) as writer:
+            writer.write("first\n")  # the first row is written immediately
+            assert stream.getvalue() == "first\n"
+            writer.write("a\n")
+            writer.write("b\n")
+            assert stream.getvalue() == "first\n"
+            writer.write("long line\n")  # buffer full
+            assert stream.getvalue() == "first\na\nb\nlong line\n"
+            writer.write("last\n")
+        assert stream.getvalue().endswith("long line\nlast\n")
+
+    def test_buffered_writer_timer(self):
+        stream = io.StringIO()
+        with BufferedWriter(stream, interval=0.05) as writer:
+            writer.write("first\n")
+            writer.write("second\n")  # no other row arrives, flushed by the timer
+            assert stream.getvalue() == "first\n"
+            deadline = time.monotonic() + 5
+            while stream.getvalue() == "first\n" and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert stream.getvalue() == "first\nsecond\n"
+        assert writer.timer is None
@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+
+import copy
+import json
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from alkemy_workflow import graph as graph_module
+from alkemy_workflow.cli import main, EXIT_SUCCESS
+from alkemy_workflow.config import Config
+from alkemy_workflow.export import Exporter, JsonlSink
+from alkemy_workflow.exceptions import ListNotFound, SpaceNotFound, ThrottlingException
+from alkemy_workflow.planner import PLAN_SELECT, Plan, PlannerClient
+from alkemy_workflow.query import QueryEngine
+from .commons import git_path, git_path_credentials_config, graph, planner_client, FakeAccount
+
+TEAM_ID = "00000000-0000-0000-0000-000000000001"
+PLAN_ID = "P" + "0" * 26 + "1"
+TASK_ID = "T" + "0" * 26 + "1"
+TASK2_ID = "T" + "0" * 26 + "2"
+TASK3_ID = "T" + "0" * 26 + "3"
+DELTA = f"beta/planner/plans/{PLAN_ID}/tasks/delta"
+DELTA_LINK = f"https://graph.microsoft.com/{DELTA}?$deltatoken=1"
+TEAM = {"id": TEAM_ID, "displayName": "Development", "description": "Development team"}
+PLAN = {
+    "id": PLAN_ID,
+    "title": "Backlog",
+    "owner": TEAM_ID,
+    "container": {"containerId": TEAM_ID, "type": "group", "url": f"https://graph.microsoft.com/v1.0/groups/{TEAM_ID}"},
+    "createdDateTime": "2023-01-01T00:00:00Z",
+    "createdBy": {"user": {"id": "u1"}},
+}
+BUCKETS = [
+    {"id": "b1", "name": "to do", "orderHint": "3", "planId": PLAN_ID},
+    {"id": "b2", "name": "in progress", "orderHint": "2", "planId": PLAN_ID},
+    {"id": "b3", "name": "done", "orderHint": "1", "planId": PLAN_ID},
+]
+TASK = {
+    "id": TASK_ID,
+    "title": "Fix login",
+    "planId": PLAN_ID,
+    "bucketId": "b1",
+    "assignments": {},
+    "startDateTime": None,
+    "percentComplete": 0,
+    "@odata.etag": 'W/"etag"',
+}
+
+
+def get_task(task_id, **kwargs):
+    return dict(TASK, id=task_id, title=f"Task {task_id[-1]}", **kwargs)
+
+
+def get_routes():
+    "Graph routes of a team with a plan, its buckets and a task"
+    return copy.deepcopy(
+        {
+            "me/joinedTeams": {"value": [TEAM]},
+            f"groups/{TEAM_ID}/planner/plans": {"value": [PLAN]},
+            f"planner/plans/{PLAN_ID}": PLAN,
+            f"planner/plans/{PLAN_ID}/buckets": {"value": BUCKETS},
+            f"planner/plans/{PLAN_ID}/tasks": {"value": [TASK, get_task(TASK2_ID, bucketId="b3")]},
+            f"planner/tasks/{TASK_ID}": TASK,
+            f"planner/tasks/{TASK2_ID}": get_task(TASK2_ID, bucketId="b3"),
+        }
+    )
+
+
+def make_client(graph, config):
+    "PlannerClient on the fake Microsoft Graph"
+    client = PlannerClient(config)
+    client.__dict__["account"] = FakeAccount(graph)
+    return client
+
+
+@pytest.fixture
+def planner_cmd(graph, monkeypatch):
+    "aw commands using the Planner backend on the fake Microsoft Graph, return the accounts created"
+    with open(Config.get_credentials_path(), "a") as f:
+        f.write("[o365]\ntenant_id = tenant_id\nclient_id = client_id\nclient_secret = client_secret\n")
+    monkeypatch.setenv("AW_TASKS", "planner")
+    graph.routes.update(get_routes())
+    accounts = []
+
+    def get_o365_account(self, interactive=False):
+        accounts.append(FakeAccount(graph))
+        return accounts[-1]
+
+    monkeypatch.setattr(Config, "get_o365_account", get_o365_account)
+    return accounts
+
+
+class TestPlanner:
+    def test_plan_select_container(self, planner_client, graph):
+        assert "container" in PLAN_SELECT.split(",")
+        graph.routes.update(get_routes())
+        plan = planner_client.get_plan_by_id(PLAN_ID)
+        assert plan["group_id"] == TEAM_ID
+        assert plan.get_team()["name"] == "Development"
+        assert planner_client.get_task_by_id(TASK_ID).get_parents()["space"]()["id"] == TEAM_ID
+
+    def test_batch_throttled_not_found(self, planner_client, graph, monkeypatch):
+        monkeypatch.setattr(graph_module.time, "sleep", lambda x: None)
+        graph.routes.update(get_routes())
+        throttled = (429, {"error": {"code": "TooManyRequests", "message": "Too many requests"}})
+        # Still throttled after the retries: raised, not reported as not found
+        graph.routes[f"planner/plans/{PLAN_ID}"] = throttled
+        with pytest.raises(ThrottlingException):
+            planner_client.get_plan_by_id(PLAN_ID)
+        graph.routes[f"planner/tasks/{TASK_ID}"] = throttled
+        with pytest.raises(ThrottlingException):
+            planner_client.get_tasks_by_id([TASK_ID])
+        # Not found (404)
+        del graph.routes[f"planner/plans/{PLAN_ID}"]
+        del graph.routes[f"planner/tasks/{TASK_ID}"]
+        with pytest.raises(ListNotFound):
+            planner_client.get_plan_by_id(PLAN_ID)
+        assert planner_client.get_tasks_by_id([TASK_ID]) == {TASK_ID: None}
+        # Throttled once, then served
+        graph.routes.update(get_routes())
+        graph.routes[f"planner/tasks/{TASK_ID}"] = [throttled, TASK]
+        assert planner_client.get_tasks_by_id([TASK_ID])[TASK_ID]["plan"]["id"] == PLAN_ID
+
+    def test_task_store_delta(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        graph.routes[DELTA] = [
+            {"value": [get_task(TASK_ID), get_task(TASK2_ID)], "@odata.nextLink": f"{DELTA_LINK}&$skiptoken=1"},
+            {"value": [get_task(TASK3_ID)], "@odata.deltaLink": DELTA_LINK},
+            # Changes: a task moved, a task removed
+            {
+                "value": [{"id": TASK_ID, "bucketId": "b2"}, {"id": TASK2_ID, "@removed": {"reason": "deleted"}}],
+                "@odata.deltaLink": DELTA_LINK,
+            },
+            # Delta link expired, full sync
+            (410, {"error": {"code": "SyncStateNotFound", "message": "Gone"}}),
+            {"value": [get_task(TASK2_ID)], "@odata.deltaLink": DELTA_LINK},
+        ]
+        plan = planner_client.get_plan_by_id(PLAN_ID)
+        assert [x["id"] for x in plan.get_tasks()] == [TASK_ID, TASK2_ID, TASK3_ID]
+        assert graph.requests.count(f"GET {DELTA}") == 2
+        # Synced recently: served from the local copy
+        assert len(plan.get_tasks()) == 3
+        assert graph.requests.count(f"GET {DELTA}") == 2
+        planner_client.task_store.max_age = 0
+        tasks = plan.get_tasks()
+        assert [(x["id"], x["title"], x["status"]) for x in tasks] == [
+            (TASK_ID, "Task 1", "in progress"),
+            (TASK3_ID, "Task 3", "to do"),
+        ]
+        tasks = plan.get_tasks()
+        assert [x["id"] for x in tasks] == [TASK2_ID]
+        assert graph.requests.count(f"GET {DELTA}") == 5
+
+    def test_task_store_update(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        graph.routes[DELTA] = [
+            {"value": [get_task(TASK_ID)], "@odata.deltaLink": DELTA_LINK},
+            {"value": [], "@odata.deltaLink": DELTA_LINK},  # the change is not in the delta yet
+        ]
+        graph.routes[f"PATCH planner/tasks/{TASK_ID}"] = (204, None)
+        plan = planner_client.get_plan_by_id(PLAN_ID)
+        task = plan.get_tasks()[0]
+        assert task["status"] == "to do"
+        assert task.update_task(status="in progress")
+        # The update is merged into the local copy, synced again on the next access
+        assert plan.get_tasks()[0]["status"] == "in progress"
+        assert graph.requests.count(f"GET {DELTA}") == 2
+
+    def test_prefetch_buckets_pages(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        next_link = f"https://graph.microsoft.com/v1.0/planner/plans/{PLAN_ID}/buckets?$skiptoken=1"
+        graph.routes[f"planner/plans/{PLAN_ID}/buckets"] = [
+            {"value": BUCKETS[:2], "@odata.nextLink": next_link},
+            {"value": BUCKETS[2:]},
+        ]
+        plan = planner_client.register_plan(planner_client.build(planner_client.planner.plan_constructor, PLAN))
+        with planner_client.batch() as batch:
+            planner_client.bucket_registry.prefetch(plan, batch)
+        assert plan.get_statuses() == ["to do", "in progress", "done"]
+        assert graph.requests.count(f"GET planner/plans/{PLAN_ID}/buckets") == 2
+
+    def test_bucket_registry(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        buckets = f"GET planner/plans/{PLAN_ID}/buckets"
+        o365_plan = planner_client.build(planner_client.planner.plan_constructor, PLAN)
+        # Shared by the Plan instances of the same plan
+        plan, other = Plan(planner_client, o365_plan), Plan(planner_client, o365_plan)
+        assert plan.get_statuses() == ["to do", "in progress", "done"]
+        assert other.get_bucket_id("done") == "b3" and other.get_bucket_name("b2") == "in progress"
+        assert graph.requests.count(buckets) == 1
+        # Unknown bucket: refreshed once
+        graph.routes[f"planner/plans/{PLAN_ID}/buckets"] = {"value": BUCKETS + [dict(BUCKETS[0], id="b4", name="review")]}
+        assert plan.get_bucket_id("review") == "b4"
+        assert plan.get_bucket_id("missing") is None
+        assert graph.requests.count(buckets) == 3
+        planner_client.bucket_registry.invalidate(PLAN_ID)
+        assert other.buckets["b4"] == "review"
+        assert graph.requests.count(buckets) == 4
+
+    def test_tasks_cmd(self, planner_cmd, graph, capsys):
+        assert main(["aw", "tasks", "--space", "Development", "--list", "Backlog"]) == EXIT_SUCCESS
+        rows = [x.split() for x in capsys.readouterr().out.splitlines()[-2:]]
+        assert rows == [["to", "do", TASK_ID, "Fix", "login"], ["done", TASK2_ID, "Task", "2"]]
+        # Buckets fetched with the plan, once for all the tasks
+        assert graph.requests.count(f"GET planner/plans/{PLAN_ID}/buckets") == 1
+
+    def test_plans_identity_map(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        plan = planner_client.get_plan_by_id(PLAN_ID)
+        assert planner_client.get_plan_by_id(PLAN_ID) is plan
+        assert planner_client.load_plans([PLAN_ID, PLAN_ID]) == [plan, plan]
+        # The plans of the tasks and of the team listing are the same instance
+        tasks = planner_client.get_tasks_by_id([TASK_ID, TASK2_ID])
+        assert tasks[TASK_ID]["plan"] is plan and tasks[TASK2_ID]["plan"] is plan
+        assert planner_client.get_team("Development").get_plans()[0] is plan
+        assert graph.requests.count(f"GET planner/plans/{PLAN_ID}") == 1
+
+    def test_index(self, planner_client, graph, monkeypatch):
+        monkeypatch.setenv("AW_NO_CACHE", "")  # persisted
+        graph.routes.update(get_routes())
+        client = make_client(graph, planner_client.config)
+        assert client.get_team("Development")["id"] == TEAM_ID
+        assert client.get_team(TEAM_ID)["name"] == "Development"
+        assert client.get_plan("backlog", team=client.get_team("Development"))["id"] == PLAN_ID
+        assert graph.requests.count("GET me/joinedTeams") == 1
+        assert graph.requests.count(f"GET groups/{TEAM_ID}/planner/plans") == 1
+        # Missing: the teams were already fetched by this run, not fetched again
+        with pytest.raises(SpaceNotFound):
+            client.get_team("Sales")
+        assert graph.requests.count("GET me/joinedTeams") == 1
+        # Next run: served from the persisted index
+        graph.requests = []
+        client = make_client(graph, planner_client.config)
+        assert client.get_team("Development")["id"] == TEAM_ID
+        assert client.index.find_plan(TEAM_ID, lambda x: x["title"] == "Backlog")["id"] == PLAN_ID
+        assert graph.requests == []
+        # Renamed team: found after a refresh (once per run)
+        graph.routes["me/joinedTeams"] = {"value": [dict(TEAM, displayName="R&D")]}
+        assert client.get_team("R&D")["id"] == TEAM_ID
+        with pytest.raises(SpaceNotFound):
+            client.get_team("Sales")
+        assert graph.requests.count("GET me/joinedTeams") == 1
+
+    def test_lazy_account(self, planner_client, graph):
+        accounts = []
+
+        def get_o365_account(interactive=False):
+            time.sleep(0.01)
+            accounts.append(FakeAccount(graph))
+            return accounts[-1]
+
+        config = SimpleNamespace(o365_tenant_id="tenant_id", o365_client_id="client_id", get_o365_account=get_o365_account)
+        client = PlannerClient(config)
+        assert client.get_requests_count() == 0 and accounts == []
+        # Created once, also when used concurrently
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result = list(executor.map(lambda _: client.account, range(8)))
+        assert len(accounts) == 1 and all(x is accounts[0] for x in result)
+
+    def test_account_state(self, planner_client, graph, monkeypatch):
+        monkeypatch.setenv("AW_NO_CACHE", "")  # persisted
+        graph.routes["me"] = {"id": "u1", "displayName": "User"}
+        graph.routes["organization"] = {"value": [{"id": "o1", "displayName": "Org"}]}
+        client = make_client(graph, planner_client.config)
+        with client.batch() as batch:
+            client.prefetch_user(batch)
+        assert client.get_user() == {"id": "u1"}
+        assert client.get_organization()["name"] == "Org"
+        # Next run: no requests
+        graph.requests = []
+        client = make_client(graph, planner_client.config)
+        with client.batch() as batch:
+            client.prefetch_user(batch)
+        assert client.get_user() == {"id": "u1"} and client.get_organization()["id"] == "o1"
+        assert graph.requests == [] and graph.batches == [[{"id": "1", "method": "GET", "url": "/me?$select=id"}]]
+        # Cleared (aw configure)
+        client.clear_account_state()
+        client = make_client(graph, planner_client.config)
+        assert client.get_organization()["id"] == "o1"
+        assert graph.requests == ["GET organization"]
+
+    def test_spaces_cmd(self, planner_cmd, graph, monkeypatch):
+        monkeypatch.setenv("AW_NO_CACHE", "")
+        graph.routes["organization"] = {"value": [{"id": "o1", "displayName": "Org"}]}
+        assert main(["aw", "spaces"]) == EXIT_SUCCESS
+        assert main(["aw", "spaces"]) == EXIT_SUCCESS
+        # The organization is fetched by the first run only
+        assert len(planner_cmd) == 2 and graph.requests.count("GET organization") == 1
+
+    def test_slim_entities(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        graph.routes[f"planner/tasks/{TASK_ID}"] = dict(TASK, orderHint="8585", dueDateTime="2023-02-01T00:00:00Z")
+        task = planner_client.get_task_by_id(TASK_ID)
+        assert sorted(task) == [
+            "assignees",
+            "assignments",
+            "bucket_id",
+            "folder",
+            "id",
+            "label",
+            "list",
+            "name",
+            "percent_complete",
+            "plan",
+            "plan_id",
+            "start_date_time",
+            "status",
+            "task_id",
+            "title",
+            "type",
+        ]
+        assert sorted(task["plan"]) == ["group_id", "id", "label", "name", "title", "type"]
+        # Other attributes read from the O365 objects
+        assert task.order_hint == "8585" and task.due_date_time.year == 2023
+        assert task["plan"].object_id == PLAN_ID
+        with pytest.raises(AttributeError):
+            task._etag_missing
+        # Equal by id
+        other = planner_client.get_tasks_by_id([TASK2_ID])[TASK2_ID]
+        assert task == planner_client.get_task_by_id(TASK_ID) and task != other
+        assert task["plan"] == Plan(planner_client, task["plan"].plan)
+
+    def test_tasks_cmd_jsonl(self, planner_cmd, graph, capsys):
+        args = ["--output", "jsonl", "--fields", "id,status,plan.name"]
+        assert main(["aw", "tasks", "--space", "Development", "--list", "Backlog"] + args) == EXIT_SUCCESS
+        records = [json.loads(x) for x in capsys.readouterr().out.splitlines() if x.startswith("{")]
+        assert records == [
+            {"id": TASK_ID, "status": "to do", "plan.name": "Backlog"},
+            {"id": TASK2_ID, "status": "done", "plan.name": "Backlog"},
+        ]
+
+    def test_walk_plans_by_team(self, planner_client, graph, tmp_path):
+        graph.routes.update(get_routes())
+        team2_id = TEAM_ID[:-1] + "2"
+        graph.routes["me/joinedTeams"] = {"value": [TEAM, dict(TEAM, id=team2_id, displayName="Sales")]}
+        graph.routes[f"groups/{team2_id}/planner/plans"] = {"value": []}
+        rows = list(QueryEngine(planner_client).walk())
+        assert [(x["type"], level) for x, level, _ in rows] == [("Space", 0), ("List", 1), ("Task", 2), ("Task", 2), ("Space", 0)]
+        # The plans of all the teams are listed in a single batch
+        plans = [x for x in graph.batches if any(y["url"].endswith("/planner/plans?$select=" + PLAN_SELECT) for y in x)]
+        assert len(plans) == 1 and len(plans[0]) == 2
+        assert planner_client.index.find_plan(team2_id, lambda x: True) is None
+        # Export: the same single batch
+        graph.batches = []
+        sink = JsonlSink(tmp_path / "snapshot.jsonl")
+        stats = Exporter(planner_client, sink).run()
+        sink.close()
+        assert stats["lists"] == 1 and not stats["failed"]
+        assert [len(x) for x in graph.batches if x[0]["url"].startswith("/groups/")] == [2]
+
+    def test_move_tasks(self, planner_client, graph):
+        graph.routes.update(get_routes())
+        for task_id in (TASK_ID, TASK2_ID):
+            graph.routes[f"PATCH planner/tasks/{task_id}"] = (204, None)
+        tasks = planner_client.get_plan_by_id(PLAN_ID).get_tasks()
+        graph.batches = []
+        moved = planner_client.move_tasks(tasks, "in progress", ordered=True)
+        assert moved == tasks and all(x["status"] == "in progress" and x["bucket_id"] == "b2" for x in tasks)
+        # Buckets already known: the moves are sent in a single batch, one after the other
+        assert len(graph.batches) == 1
+        assert [x["method"] for x in graph.batches[0]] == ["PATCH", "PATCH"]
+        assert graph.batches[0][1]["dependsOn"] == [graph.batches[0][0]["id"]]
+        # Unknown status: nothing moved
+        assert planner_client.move_tasks(tasks, "missing") == []
+
+    def test_index_account_stale_team(self, planner_client, graph, monkeypatch):
+        monkeypatch.setenv("AW_NO_CACHE", "")  # persisted
+        graph.routes.update(get_routes())
+        assert make_client(graph, planner_client.config).get_team("Development")["id"] == TEAM_ID
+        # Other tenant: the index of the first account is not used
+        graph.routes["me/joinedTeams"] = {"value": []}
+        other = make_client(graph, SimpleNamespace(o365_tenant_id="other", o365_client_id="client_id"))
+        with pytest.raises(SpaceNotFound):
+            other.get_team("Development")
+        # Next run, team no longer accessible: checked once per run against Graph when looked up by id
+        graph.requests = []
+        client = make_client(graph, planner_client.config)
+        assert client.get_team("Development")["id"] == TEAM_ID  # by name, served from the index
+        with pytest.raises(SpaceNotFound):
+            client.get_team_by_id(TEAM_ID)
+        with pytest.raises(SpaceNotFound):
+            client.get_team_by_id(TEAM_ID)
+        assert graph.requests == ["GET me/joinedTeams"]
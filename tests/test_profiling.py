@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import json
+from alkemy_workflow.cli import main, EXIT_SUCCESS
+from alkemy_workflow.profiling import Profiler, Span, get_template
+from .commons import git_path, git_path_credentials_config, mock_response
+
+
+def make_span(name, start, end):
+    span = Span("test", name)
+    span.start = start
+    span.end = end
+    return span
+
+
+class TestProfiling:
+    def test_get_template(self):
+        assert get_template("list/30000001/task?include_closed=False") == "list/{id}/task"
+        assert get_template("https://graph.microsoft.com/v1.0/planner/plans/abc1/tasks") == "v1.0/planner/plans/{id}/tasks"
+        assert get_template("repos/OWNER/REPO/pulls") == "repos/OWNER/REPO/pulls"
+
+    def test_summary(self):
+        profiler = Profiler()
+        profiler.start_time = 0
+        # a and b concurrent, c after a, a again after c
+        profiler.spans = [make_span("a", 0, 2), make_span("b", 0, 1), make_span("c", 2, 3), make_span("a", 3, 6)]
+        summary = dict((x["endpoint"], x) for x in profiler.get_summary())
+        assert summary["test a"]["count"] == 2 and summary["test a"]["total"] == 5 and summary["test a"]["p95"] == 3
+        assert [x.name for x in profiler.get_critical_path()] == ["a", "c", "a"]
+        assert len(profiler.get_trace()["traceEvents"]) == 4
+
+    def test_profile_cmd(self, git_path_credentials_config, mock_response, monkeypatch, capsys):
+        monkeypatch.chdir(git_path_credentials_config)
+        trace = git_path_credentials_config / "trace.json"
+        assert main(["aw", "--profile-trace", str(trace), "ls", "--space", "10000001"]) == EXIT_SUCCESS
+        err = capsys.readouterr().err
+        assert "clickup GET space/{id}/folder" in err
+        assert "Critical path" in err
+        events = json.load(trace.open())["traceEvents"]
+        assert set(x["cat"] for x in events) == {"clickup"}
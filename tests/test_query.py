@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+from alkemy_workflow import cli
+from alkemy_workflow.cli import get_navigation
+from alkemy_workflow.utils import Workflow
+from alkemy_workflow.clickup import ClickUpClient
+from alkemy_workflow.query import QueryEngine, NavigationCache, TreeWalker, lookahead
+from .commons import git_path, git_path_credentials_config, mock_response, client, count_requests
+
+
+class TestQuery:
+    def test_query_space(self, client):
+        result = client.query(space="R&D", hierarchy=True)
+        assert [x["type"] for x in result] == ["Workspace", "Space", "Folder"]
+        assert sorted(client.requests) == sorted(
+            ["team", "team/11111111/space", "space/10000001/", "space/10000001/folder", "space/10000001/list"]
+        )
+
+    def test_query_embedded_parents(self, client):
+        # The space and the folder are embedded in the list, not fetched again
+        result = client.query(space="10000001", folder="20000001", lst="30000001", hierarchy=True)
+        assert [x["type"] for x in result][:4] == ["Workspace", "Space", "Folder", "List"]
+        assert "space/10000001/" not in client.requests
+        assert "folder/20000001/" not in client.requests
+
+    def test_query_filter_type(self, client):
+        # Only the fetches producing the filtered type are sent
+        result = client.query(space="10000001", filter_type="Folder")
+        assert [x["type"] for x in result] == ["Folder"]
+        assert "space/10000001/list" not in client.requests
+
+    def test_filter(self, client):
+        items = [{"type": "Space", "name": "R&D"}, {"type": "Space", "name": "Education"}, {"type": "List", "name": "Rest"}]
+        engine = QueryEngine(client)
+        assert engine.filter(items, filter_name="r*") == [items[0], items[2]]
+        assert engine.filter(items, filter_type="Space", filter_name="R*") == [items[0]]
+
+    def test_iterate(self, client):
+        items = QueryEngine(client).iterate(space="10000001", filter_type="Folder")
+        assert client.requests == []  # lazy
+        assert next(items)["type"] == "Folder"
+        assert list(items) == client.query(space="10000001", filter_type="Folder")[1:]
+
+    def test_lookahead(self):
+        assert list(lookahead(x for x in "abc")) == [("a", "b"), ("b", "c"), ("c", None)]
+        assert list(lookahead([])) == []
+
+    def test_name_index(self, client):
+        client.query(space="R&D", folder="Project 1", lst="Backlog")
+        # Second run: names resolved from the persisted index
+        client = count_requests(ClickUpClient(client.config))
+        result = client.query(space="R&D", folder="project 1", lst="Backlog")
+        # The space and the folder are only scopes of the name lookups, the list is not rendered
+        assert client.requests == ["list/30000001/task"]
+        assert all(x["type"] == "Task" for x in result)
+        # Rendered entities are fetched
+        client.requests = []
+        result = client.query(space="R&D", folder="project 1", lst="Backlog", hierarchy=True)
+        assert sorted(client.requests) == sorted(
+            ["team", "space/10000001/", "folder/20000001/", "list/30000001/", "list/30000001/task"]
+        )
+        assert result[0] == client.get_workspace() and "members" in result[0]
+        assert result[3] == client.get_list("30000001") and result[3].get_statuses()
+
+    def test_name_index_full_entities(self, client):
+        space = client.get_space("R&D")
+        folder = client.get_folder("Project 1", space=space)
+        lst = client.get_list("Backlog", space=space, folder=folder)
+        # Resolved by name or by id, the entities are the same
+        assert space == client.get_space("10000001")
+        assert folder == client.get_folder("20000001")
+        assert lst == client.get_list("30000001")
+        assert lst.get_statuses()
+
+    def test_name_index_miss(self, client):
+        client.index.cache.set("folders/10000001", [])  # stale index
+        assert client.get_folder("Project 1", space=client.get_space("10000001"))["id"] == "20000001"
+        assert "space/10000001/folder" in client.requests
+
+    def test_navigation_cache(self, client):
+        with NavigationCache(client) as navigation:
+            result = navigation.get((None, None, None, None))
+            navigation.prefetch(get_navigation(x) for x in result if x["type"] == "Space")
+            navigation.get(("10000001", None, None, None))
+            requests = len(client.requests)
+            # Back to the workspace and to the prefetched space: no new requests
+            assert navigation.get((None, None, None, None)) == result
+            assert navigation.get(("10000001", None, None, None))[1]["name"] == "R&D"
+            assert len(client.requests) == requests
+
+    def test_pick_task(self, client, monkeypatch):
+        picks = iter(["R&D", "Test Team", "R&D", None])
+
+        def pzp(items, **kwargs):
+            name = next(picks)
+            return ([x for x in items if x["name"] == name] + [None])[0]
+
+        monkeypatch.setattr(cli.pzp, "pzp", pzp)
+        wf = Workflow()
+        wf.client = client
+        assert cli.pick_task(wf) is None
+        # Back and forth navigation served from the cache
+        assert client.requests.count("team/11111111/space") == 1
+        assert client.requests.count("space/10000001/folder") == 1
+
+    def test_tree_walker(self):
+        class Item(dict):
+            def get_children(self, deep=False):
+                return {"Item": lambda: [Item(name=f"{self['name']}.{i}") for i in range(2)]}
+
+        rows = list(TreeWalker(depth=3).walk([Item(name="a"), Item(name="b")]))
+        assert [x["name"] for x, _, _ in rows][:5] == ["a", "a.0", "a.0.0", "a.0.1", "a.1"]
+        assert len(rows) == 2 + 4 + 8
+        assert [(level, is_last) for x, level, is_last in rows if x["name"] == "a.0.1"] == [(2, True)]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import time
+import pytest
+import requests
+from benchmarks.payloads import ClickUpPayloads
+from alkemy_workflow.cli import main, EXIT_SUCCESS
+from alkemy_workflow.config import Config
+from alkemy_workflow.clickup import ClickUpClient
+from alkemy_workflow.github import GitHubClient
+from alkemy_workflow.exceptions import ClickUpException
+from .server import DatasetBackend, DataBackend
+from .commons import git_path, git_path_credentials_config, stand_in
+
+
+class TestServer:
+    def test_data_tree(self, stand_in):
+        server = stand_in()
+        assert main(["aw", "ls", "--space", "10000001"]) == EXIT_SUCCESS
+        assert server.stats["requests"] > 0 and server.stats["throttled"] == 0
+        client = ClickUpClient(Config())
+        assert client.server == server.clickup_url
+        assert client.get_user()["id"]
+        assert GitHubClient(Config()).get_ref("https://github.com/OWNER/REPO", "main")["ref"]
+        with pytest.raises(ClickUpException):
+            client.send_request("list/99999999")
+
+    def test_pagination(self, stand_in):
+        payloads = ClickUpPayloads(spaces=1, lists=1, tasks=45)
+        server = stand_in(backend=DatasetBackend(payloads, fallback=DataBackend()), page_size=10)
+        lst = ClickUpClient(Config()).get_list_by_id(payloads.lists[0]["id"])
+        requests_count = server.stats["requests"]
+        assert [x["id"] for x in lst.get_all_tasks()] == [x["id"] for x in payloads.tasks]
+        assert server.stats["requests"] - requests_count == 5
+        # Without subtasks=true only the top level tasks
+        assert all(x.get("parent") is None for x in lst.get_list_tasks())
+        # Subtasks attached to their parents, from all the pages
+        tasks = lst.get_list_tasks(subtasks=True)
+        subtasks = [x for task in tasks for x in task.subtasks]
+        assert len(tasks) + len(subtasks) == len(payloads.tasks)
+        assert all(x.get("parent") is None for x in tasks) and subtasks
+
+    def test_rate_limit(self, stand_in):
+        server = stand_in(rate_limit=2)
+        client = ClickUpClient(Config())
+        client.get_user()
+        response = requests.get(server.clickup_url + "user", headers={"Authorization": client.config.default_clickup_token})
+        assert response.headers["X-RateLimit-Limit"] == "2" and response.headers["X-RateLimit-Remaining"] == "0"
+        with pytest.raises(ClickUpException, match="Rate limit"):
+            client.get_user()
+        assert server.stats["throttled"] == 1
+        response = requests.get(server.url + "user")  # other token
+        assert response.status_code == 200
+
+    def test_throttle_rate_latency(self, stand_in):
+        server = stand_in(throttle_rate=1, latency=0.05)
+        start_time = time.perf_counter()
+        response = requests.get(server.url + "user")
+        assert time.perf_counter() - start_time >= 0.05
+        assert response.status_code == 429 and response.headers["Retry-After"]
+
+    def test_keep_alive(self, stand_in):
+        server = stand_in()
+        with requests.Session() as session:
+            for _ in range(3):
+                assert session.get(server.url + "user").ok
+        assert server.stats["requests"] == 3 and server.stats["connections"] == 1
+
+    def test_github_pagination(self, stand_in):
+        pulls = [{"number": i, "state": "closed", "merged_at": None, "head": {"ref": f"branch-{i}"}} for i in range(150)]
+        backend = DataBackend()
+        get = backend.get
+        backend.get = lambda method, path: pulls if path == "repos/OWNER/REPO/pulls" else get(method, path)
+        server = stand_in(backend=backend)
+        result = GitHubClient(Config()).list_pull_request("https://github.com/OWNER/REPO", state="all")
+        assert [x["number"] for x in result] == list(range(150))
+        assert server.stats["requests"] == 2
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+import requests
+from alkemy_workflow import transport
+from alkemy_workflow.cli import main, EXIT_SUCCESS, EXIT_FAILURE
+from alkemy_workflow.config import Config
+from alkemy_workflow.exceptions import TransportException
+from alkemy_workflow.clickup import ClickUpClient
+from alkemy_workflow.transport import AW_TRANSPORT, AW_CASSETTE, AW_REPLAY_SPEED, CASSETTE_FILE, RECORD, REPLAY
+from .commons import git_path, git_path_credentials_config, mock_response
+
+
+@pytest.fixture
+def cassette(git_path_credentials_config, mock_response, monkeypatch):
+    monkeypatch.chdir(git_path_credentials_config)
+    for name in (AW_TRANSPORT, AW_CASSETTE, AW_REPLAY_SPEED):
+        monkeypatch.setenv(name, "")  # restored after the test (the cli sets them)
+    monkeypatch.setenv("AW_NO_CACHE", "1")
+    return git_path_credentials_config / "cassette"
+
+
+def no_network(*args, **kwargs):
+    raise AssertionError("network request")
+
+
+class TestTransport:
+    def test_record_replay(self, cassette, monkeypatch):
+        monkeypatch.setenv(AW_TRANSPORT, RECORD)
+        monkeypatch.setenv(AW_CASSETTE, str(cassette))
+        result = [dict(x) for x in ClickUpClient(Config()).query(space="10000001", hierarchy=True)]
+        interactions = [json.loads(x) for x in (cassette / CASSETTE_FILE).read_text().splitlines()]
+        assert len(interactions) == 4
+        assert all("headers" in x and "latency" in x for x in interactions)
+        # Replay without network, with the recorded latency scaled
+        delays = []
+        monkeypatch.setattr(requests, "request", no_network)
+        monkeypatch.setattr(transport.time, "sleep", delays.append)
+        monkeypatch.setenv(AW_TRANSPORT, REPLAY)
+        monkeypatch.setenv(AW_REPLAY_SPEED, "2")
+        assert [dict(x) for x in ClickUpClient(Config()).query(space="10000001", hierarchy=True)] == result
+        assert sorted(delays) == sorted(x["latency"] * 2 for x in interactions)
+
+    def test_replay_cmd(self, cassette, monkeypatch):
+        assert main(["aw", "--record", str(cassette), "ls", "--space", "10000001"]) == EXIT_SUCCESS
+        monkeypatch.setattr(requests, "request", no_network)
+        assert main(["aw", "--replay", str(cassette), "--replay-speed", "0", "ls", "--space", "10000001"]) == EXIT_SUCCESS
+        # Not recorded
+        assert main(["aw", "--replay", str(cassette), "ls", "--space", "10000004"]) == EXIT_FAILURE
+
+    def test_replay_payload_changed(self, cassette, monkeypatch):
+        monkeypatch.setenv(AW_TRANSPORT, RECORD)
+        monkeypatch.setenv(AW_CASSETTE, str(cassette))
+        client = ClickUpClient(Config())
+        client.send_request("task/99abcd99/", "PUT", payload={"start_date": 1})
+        client.send_request("task/99abcd99/", "PUT", payload={"start_date": 2})
+        monkeypatch.setattr(requests, "request", no_network)
+        monkeypatch.setenv(AW_TRANSPORT, REPLAY)
+        monkeypatch.setenv(AW_REPLAY_SPEED, "0")
+        replay = transport.get_transport()
+        # Exact body match first, then the unused responses of the same request in recorded order
+        client = ClickUpClient(Config())
+        assert client.send_request("task/99abcd99/", "PUT", payload={"start_date": 2})
+        assert client.send_request("task/99abcd99/", "PUT", payload={"start_date": 3})
+        assert replay.used == {0, 1}
+        with pytest.raises(TransportException):
+            client.send_request("task/99abcd99/", "POST", payload={"start_date": 3})
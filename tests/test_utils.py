@@ -5,8 +5,10 @@ import subprocess
 from pathlib import Path
 import pytest
 from alkemy_workflow.utils import Config, Git
+from alkemy_workflow.git import SubprocessGitBackend, FileSystemGitBackend
 from alkemy_workflow.exceptions import ConfigException, GitException
 from .commons import (
+    git_env,
     git_path,
     git_path_credentials_config,
     write_credentials,
@@ -88,3 +90,95 @@ class TestGit:
         config = Config()
         git = Git(config)
         assert "alkemy_workflow.ini" in git.run("status", "--porcelain")
+
+    def test_filesystem_backend(self, git_path_credentials_config, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        config = Config()
+        git = Git(config)
+        subprocess_backend = SubprocessGitBackend(git)
+        filesystem_backend = FileSystemGitBackend(git)
+        assert filesystem_backend.get_current_branch() == subprocess_backend.get_current_branch() == "main"
+        assert filesystem_backend.get_toplevel() == subprocess_backend.get_toplevel()
+        assert filesystem_backend.get_remote_url() is None
+        git.run("remote", "add", "origin", "git@github.com:OWNER/REPO.git")
+        assert filesystem_backend.get_remote_url() == subprocess_backend.get_remote_url() == "git@github.com:OWNER/REPO.git"
+        git.run("checkout", "-b", "99abcd99-test")
+        assert filesystem_backend.get_current_branch() == "99abcd99-test"
+        git.run("checkout", "--detach")
+        assert filesystem_backend.get_current_branch() == subprocess_backend.get_current_branch() == "HEAD"
+
+    def test_backend_memoize(self, git_path_credentials_config, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        git = Git(Config())
+        assert git.get_current_branch() == "main"
+        git.run("branch", "other")
+        git.checkout("other")
+        assert git.get_current_branch() == "other"
+
+    def test_subprocess_backend(self, git_path_credentials_config, monkeypatch):
+        monkeypatch.setenv("AW_GIT_BACKEND", "subprocess")
+        monkeypatch.chdir(git_path_credentials_config)
+        git = Git(Config())
+        assert isinstance(git.backend, SubprocessGitBackend)
+        assert git.get_current_branch() == "main"
+
+    def test_list_branches(self, git_path_credentials_config, monkeypatch):
+        monkeypatch.chdir(git_path_credentials_config)
+        git = Git(Config())
+        git.run("branch", "99abcd99-test")
+        branches = git.list_branches()
+        assert [x["name"] for x in branches] == ["99abcd99-test", "main"]
+        assert all(x["remote"] is None and x["date"] for x in branches)
+
+    def test_create_branch_fast(self, git_env, git_path_credentials_config, tmp_path_factory, monkeypatch):
+        origin = tmp_path_factory.mktemp("origin") / "origin.git"
+        monkeypatch.chdir(git_path_credentials_config)
+        git = Git(Config())
+        git.run("clone", "--bare", str(git_path_credentials_config), str(origin))
+        git.run("remote", "add", "origin", str(origin))
+        git.run("checkout", "-b", "other")
+        assert git.create_branch("99abcd99-test", fast=True) is False
+        assert git.get_current_branch() == "99abcd99-test"
+        assert git.run("rev-parse", "HEAD") == git.run("rev-parse", "origin/main")
+        assert "99abcd99-test" in git.run("ls-remote", "--heads", "origin")
+        git.checkout("main")
+        assert git.create_branch("99abcd99-test", fast=True) is True
+        assert git.get_current_branch() == "99abcd99-test"
+
+    def test_fetch_depth_full_clone(self, git_env, git_path_credentials_config, tmp_path_factory, monkeypatch):
+        origin = tmp_path_factory.mktemp("origin") / "origin.git"
+        monkeypatch.chdir(git_path_credentials_config)
+        config = Config()
+        config.git_fetch_depth = 1
+        git = Git(config)
+        git.run("clone", "--bare", str(git_path_credentials_config), str(origin))
+        git.run("remote", "add", "origin", str(origin))
+        git.run("fetch", "origin")
+        assert git.create_branch("99abcd99-test", fast=True) is False
+        # The depth is not applied to a full clone
+        assert not git.is_shallow()
+        assert not (git_path_credentials_config / ".git" / "shallow").exists()
+        assert git.run("rev-list", "--count", "origin/main") == "3"
+        # Shallow clone, the depth is applied
+        clone = tmp_path_factory.mktemp("clone") / "clone"
+        git.run("clone", "--depth=1", f"file://{origin}", str(clone))
+        git.config.git_dir = clone
+        git.invalidate()
+        assert git.is_shallow()
+        git.fetch_branch("main", depth=1)
+        assert git.run("rev-list", "--count", "origin/main") == "1"
+
+    def test_create_worktree_full_clone(self, git_env, git_path_credentials_config, tmp_path_factory, monkeypatch):
+        origin = tmp_path_factory.mktemp("origin") / "origin.git"
+        monkeypatch.chdir(git_path_credentials_config)
+        config = Config()
+        config.git_fetch_depth = 1
+        git = Git(config)
+        git.run("clone", "--bare", str(git_path_credentials_config), str(origin))
+        git.run("remote", "add", "origin", str(origin))
+        git.run("fetch", "origin")
+        path, exists = git.create_worktree("99abcd99-test")
+        assert not exists and path.is_dir()
+        # The shared repository stays a full clone
+        assert git.run("rev-parse", "--is-shallow-repository") == "false"
+        assert git.run("rev-list", "--count", "99abcd99-test") == "3"